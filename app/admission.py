@@ -0,0 +1,164 @@
+from __future__ import annotations
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Tuple, TypeVar
+from .config import CFG
+from .metrics import CHAT_ACTIVE, CHAT_COALESCED, CHAT_QUEUE_DEPTH, CHAT_QUEUE_WAIT, CHAT_REJECTED
+
+# Control de admisión para /chat: a lo sumo `max_active` generaciones a la vez, una cola
+# acotada detrás y rechazo inmediato (429 + Retry-After) cuando la cola está llena o la
+# espera supera `queue_timeout`. Requests idénticos en vuelo comparten un solo resultado.
+# Por qué: sin esto cada request toma un hilo y dispara ollama.chat; Ollama los encola
+# por su cuenta y los clientes (ui.py espera 60 s) se cortan antes de recibir nada.
+
+T = TypeVar("T")
+
+class Saturated(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Servidor saturado ({reason}); reintenta en {retry_after} s.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Admission:
+    def __init__(
+        self,
+        max_active: int = CFG.chat_max_active,
+        max_queue: int = CFG.chat_max_queue,
+        queue_timeout: float = CFG.chat_queue_timeout,
+    ):
+        self.max_active = max(1, max_active)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self._service_s = 0.0  # media móvil del tiempo con cupo, para estimar Retry-After
+        self._wait_s = 0.0
+        self._gauges()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Se crea en el loop que lo usa (no al importar el módulo).
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_active)
+        return self._sem
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que se libere lugar: la cola avanza `max_active` por turno."""
+        per = self._service_s or 1.0
+        return max(1, math.ceil(per * (self.waiting + 1) / self.max_active))
+
+    def _reject(self, reason: str) -> Saturated:
+        self.rejected += 1
+        CHAT_REJECTED.inc(reason=reason)
+        return Saturated(reason, self.retry_after())
+
+    def _gauges(self) -> None:
+        CHAT_QUEUE_DEPTH.set(self.waiting)
+        CHAT_ACTIVE.set(self.active)
+
+    def check(self) -> None:
+        """Rechaza ya si no hay cupo ni lugar en la cola. Para respuestas en streaming, que no
+        pueden devolver 429 una vez empezadas; el cupo se toma después con `slot`."""
+        if self._semaphore().locked() and self.waiting >= self.max_queue:
+            raise self._reject("queue_full")
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """Toma un cupo (esperando en la cola si hace falta); entrega los segundos de espera."""
+        sem = self._semaphore()
+        t0 = time.perf_counter()
+        if not sem.locked():
+            await sem.acquire()  # hay cupo libre: no suspende, así el siguiente ya ve el semáforo tomado
+        elif self.waiting >= self.max_queue:
+            raise self._reject("queue_full")
+        else:
+            self.waiting += 1
+            self._gauges()
+            try:
+                await asyncio.wait_for(sem.acquire(), timeout=self.queue_timeout if self.queue_timeout > 0 else None)
+            except asyncio.TimeoutError:
+                raise self._reject("queue_timeout") from None
+            finally:
+                self.waiting -= 1
+                self._gauges()
+        wait = time.perf_counter() - t0
+        CHAT_QUEUE_WAIT.observe(wait)
+        self._wait_s = 0.8 * self._wait_s + 0.2 * wait
+        self.admitted += 1
+        self.active += 1
+        self._gauges()
+        t1 = time.perf_counter()
+        try:
+            yield wait
+        finally:
+            self.active -= 1
+            sem.release()
+            self._gauges()
+            dt = time.perf_counter() - t1
+            self._service_s = dt if not self._service_s else 0.8 * self._service_s + 0.2 * dt
+
+    @contextmanager
+    def thread_slot(self, loop: asyncio.AbstractEventLoop) -> Iterator[float]:
+        """`slot` para código que corre en otro hilo (p. ej. el pool de /chat/batch): el cupo se
+        toma y se libera en `loop`, así comparte límites y cola con los requests async."""
+        cm = self.slot()
+        wait = asyncio.run_coroutine_threadsafe(cm.__aenter__(), loop).result()
+        try:
+            yield wait
+        finally:
+            asyncio.run_coroutine_threadsafe(cm.__aexit__(None, None, None), loop).result()
+
+    async def run(self, key: Hashable, fn: Callable[[float], Awaitable[T]]) -> Tuple[T, bool]:
+        """Ejecuta `fn(espera_s)` con cupo. Si ya hay uno en vuelo con la misma `key`, espera
+        ese resultado en lugar de generar otro. Devuelve (resultado, compartido)."""
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            CHAT_COALESCED.inc()
+            try:
+                return await asyncio.shield(fut), True
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not fut.cancelled() or (task is not None and task.cancelling()):
+                    raise  # cancelaron a este request, no al que generaba
+            # El líder se canceló (p. ej. su cliente se desconectó): este request no tiene por
+            # qué fallar; vuelve a intentar como líder o detrás de uno nuevo.
+            return await self.run(key, fn)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            async with self.slot() as wait:
+                result = await fn(wait)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+                fut.exception()  # marcado como leído: sin seguidores no hay aviso de "never retrieved"
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        fut.set_result(result)
+        return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout,
+            "active": self.active,
+            "waiting": self.waiting,
+            "inflight_keys": len(self._inflight),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "avg_wait_ms": round(self._wait_s * 1000, 1),
+            "avg_service_ms": round(self._service_s * 1000, 1),
+            "retry_after_s": self.retry_after(),
+        }
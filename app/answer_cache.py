@@ -0,0 +1,120 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+from .config import CFG
+from .metrics import CACHE_EVENTS
+
+@dataclass
+class _Entry:
+    scope: Hashable
+    emb: np.ndarray
+    value: Dict[str, Any]
+    created: float
+
+class AnswerCache:
+    """Cache semántico de respuestas de /chat.
+
+    Acierta si una pregunta previa del mismo `scope` (perfil, modelo, temperatura,
+    parámetros de recuperación) tiene similitud coseno >= `min_similarity`.
+    Se vacía solo cuando cambia la versión del índice; desaloja por LRU y TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CFG.answer_cache_max,
+        ttl_s: float = CFG.answer_cache_ttl,
+        min_similarity: float = CFG.answer_cache_min_sim,
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._scopes: Dict[Hashable, Dict[int, None]] = {}
+        self._mats: Dict[Hashable, Tuple[List[int], np.ndarray]] = {}
+        self._next_id = 0
+        self._version: Optional[int] = None
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @staticmethod
+    def _unit(emb: Sequence[float]) -> np.ndarray:
+        v = np.asarray(emb, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _check_version(self, version: int) -> None:
+        if self._version != version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear(); self._scopes.clear(); self._mats.clear()
+            self._version = version
+
+    def _drop(self, eid: int) -> None:
+        e = self._entries.pop(eid)
+        ids = self._scopes.get(e.scope)
+        if ids is not None:
+            ids.pop(eid, None)
+            if not ids:
+                del self._scopes[e.scope]
+        self._mats.pop(e.scope, None)
+
+    def _matrix(self, scope: Hashable) -> Tuple[List[int], Optional[np.ndarray]]:
+        if scope not in self._scopes:
+            return [], None
+        if scope not in self._mats:
+            ids = list(self._scopes[scope])
+            self._mats[scope] = (ids, np.stack([self._entries[i].emb for i in ids]))
+        return self._mats[scope]
+
+    def get(self, scope: Hashable, emb: Sequence[float], version: int) -> Optional[Dict[str, Any]]:
+        q = self._unit(emb)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            ids, mat = self._matrix(scope)
+            if mat is not None and mat.shape[1] == q.shape[0]:
+                sims = mat @ q
+                best = int(np.argmax(sims))
+                eid = ids[best]
+                entry = self._entries[eid]
+                if now - entry.created > self.ttl_s:
+                    self._drop(eid)
+                    self.evictions += 1
+                elif float(sims[best]) >= self.min_similarity:
+                    self._entries.move_to_end(eid)
+                    self.hits += 1
+                    CACHE_EVENTS.inc(cache="answer", result="hit")
+                    return {**entry.value, "similarity": round(float(sims[best]), 4)}
+            self.misses += 1
+            CACHE_EVENTS.inc(cache="answer", result="miss")
+            return None
+
+    def put(self, scope: Hashable, emb: Sequence[float], version: int, value: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            eid = self._next_id; self._next_id += 1
+            self._entries[eid] = _Entry(scope, self._unit(emb), value, time.time())
+            self._scopes.setdefault(scope, {})[eid] = None
+            self._mats.pop(scope, None)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "index_version": self._version,
+            }
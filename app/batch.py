@@ -0,0 +1,93 @@
+from __future__ import annotations
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Sequence
+from .config import CFG
+from .db import Store
+from .llm import chat
+from .profiles import load_profile
+from .prompts import build_system, build_user_prompt
+from .retriever import retrieve_many
+
+@dataclass
+class BatchItem:
+    user_id: str
+    message: str
+    top_k: int = CFG.top_k
+    distance_threshold: float = CFG.distance_threshold
+    temperature: float = 0.3
+    id: Optional[str] = None  # identificador del llamador, se devuelve tal cual
+
+def _error(i: int, item: BatchItem, msg: str) -> Dict[str, Any]:
+    return {"index": i, "id": item.id, "error": msg}
+
+def chat_batch(
+    items: Sequence[BatchItem],
+    store: Optional[Store] = None,
+    concurrency: int = CFG.batch_concurrency,
+    model: str = CFG.chat_model,
+    slot: Optional[Callable[[], ContextManager[Any]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Responde un lote de preguntas y produce un resultado por ítem en orden de finalización.
+
+    Embedding y búsqueda se hacen una vez para todo el lote; las generaciones corren con
+    `concurrency` hilos. Un ítem que falla produce {"index", "id", "error"} sin cortar el resto.
+    Con `slot`, cada generación corre dentro de `slot()` (el server pasa el cupo de /chat).
+    """
+    if not items:
+        return
+    t0 = time.perf_counter()
+    infos: List[Dict[str, Any]] = [{} for _ in items]
+    try:
+        retrieved = retrieve_many(
+            [it.message for it in items],
+            k=[it.top_k for it in items],
+            threshold=[it.distance_threshold for it in items],
+            store=store,
+            infos=infos,
+        )
+    except Exception as e:
+        for i, it in enumerate(items):
+            yield _error(i, it, f"Recuperación falló: {type(e).__name__}: {e}")
+        return
+    retrieval_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    def generate(i: int) -> Dict[str, Any]:
+        it = items[i]
+        context, sources, used = retrieved[i]
+        sys_prompt = build_system(load_profile(it.user_id))
+        user_prompt = build_user_prompt(it.message, context)
+        if used == 0:
+            user_prompt += "\n\nNota: No se encontró contexto relevante."
+        with slot() if slot else nullcontext(0.0) as wait_s:
+            t = time.perf_counter()
+            answer = chat(model, sys_prompt, user_prompt, it.temperature)
+        return {
+            "index": i,
+            "id": it.id,
+            "answer": answer or "Modelo no disponible.",
+            "sources": sources,
+            "used_chunks": used,
+            "meta": {
+                "model": model,
+                "retrieval": infos[i],
+                "batch_retrieval_ms": retrieval_ms,
+                "queue_wait_ms": round(wait_s * 1000, 1),
+                "generation_ms": round((time.perf_counter() - t) * 1000, 1),
+            },
+        }
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-chat")
+    futures = {pool.submit(generate, i): i for i in range(len(items))}
+    try:
+        for fut in as_completed(futures):
+            i = futures[fut]
+            try:
+                yield fut.result()
+            except Exception as e:
+                yield _error(i, items[i], f"Generación falló: {type(e).__name__}: {e}")
+    finally:
+        # Por qué: si el cliente corta el stream no seguimos generando respuestas que nadie leerá.
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from .config import CFG
+from .dedup import get_dedup_index
+from .logging import log
+from .manifest import load_manifest, manifest_path
+
+if TYPE_CHECKING:
+    from .db import Store
+
+# Catálogo por colección: una fila por fuente con sus totales, mantenida por el indexador
+# y por ingest_text. /sources y /health lo leen en vez de recorrer los metadatos de Chroma.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY, chunks INTEGER NOT NULL, bytes INTEGER NOT NULL,
+    content_hash TEXT NOT NULL, indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0), sources INTEGER NOT NULL, chunks INTEGER NOT NULL, bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0, 0);
+"""
+
+@dataclass
+class SourceStats:
+    source: str
+    chunks: int
+    bytes: int
+    content_hash: str  # sha256 de la fuente tal como llegó: el PDF o archivo subido, o el texto enviado
+    indexed_at: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def text_sha256(text: str) -> str:
+    return sha256(text.encode("utf-8")).hexdigest()
+
+class Catalog:
+    """Estadísticas por fuente en SQLite; los totales se actualizan en la misma transacción."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _remove(self, source: str) -> None:
+        row = self._conn.execute("SELECT chunks, bytes FROM sources WHERE source = ?", (source,)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM sources WHERE source = ?", (source,))
+            self._conn.execute(
+                "UPDATE totals SET sources = sources - 1, chunks = chunks - ?, bytes = bytes - ? WHERE id = 0", row
+            )
+
+    def upsert(self, source: str, chunks: int, nbytes: int, content_hash: str, indexed_at: Optional[float] = None) -> None:
+        if chunks <= 0:
+            return self.delete(source)  # una fuente sin fragmentos no está en la colección
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._remove(source)
+            self._conn.execute(
+                "INSERT INTO sources VALUES (?, ?, ?, ?, ?)",
+                (source, chunks, nbytes, content_hash, indexed_at if indexed_at is not None else time.time()),
+            )
+            self._conn.execute(
+                "UPDATE totals SET sources = sources + 1, chunks = chunks + ?, bytes = bytes + ? WHERE id = 0",
+                (chunks, nbytes),
+            )
+            self._conn.execute("COMMIT")
+
+    def delete(self, source: str) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._remove(source)
+            self._conn.execute("COMMIT")
+
+    def get(self, source: str) -> Optional[SourceStats]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM sources WHERE source = ?", (source,)).fetchone()
+        return SourceStats(*row) if row else None
+
+    def sources(self) -> List[SourceStats]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM sources ORDER BY chunks DESC, source").fetchall()
+        return [SourceStats(*r) for r in rows]
+
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            sources, chunks, nbytes = self._conn.execute("SELECT sources, chunks, bytes FROM totals").fetchone()
+        return {"sources": sources, "chunks": chunks, "bytes": nbytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def rebuild_from(
+        self, col, db_path: Path, collection: str, page: int = 5000, linked: Optional[Dict[str, int]] = None
+    ) -> Dict[str, int]:
+        """Recalcula todo desde la colección; bytes y hash salen del manifest si la fuente es un PDF indexado.
+
+        `linked` suma por fuente los casi duplicados enlazados (no están en Chroma).
+        """
+        per: Dict[str, List[Tuple[int, str]]] = {}
+        n = col.count()
+        for off in range(0, n, page):
+            r = col.get(include=["documents", "metadatas"], limit=page, offset=off)
+            for doc, meta in zip(r["documents"], r["metadatas"]):
+                per.setdefault(meta.get("source", "unk"), []).append((int(meta.get("chunk", 0)), doc or ""))
+        _, manifest = load_manifest(manifest_path(db_path, collection))
+        now = time.time()
+        rows = []
+        linked = linked or {}
+        for source in per.keys() | linked.keys():
+            chunks = per.get(source, [])
+            entry = manifest.get(source)
+            if entry:
+                nbytes, digest = entry.size, entry.sha256
+            else:  # sin el original: aproximado con el texto de los fragmentos
+                text = " ".join(doc for _, doc in sorted(chunks))
+                nbytes, digest = len(text.encode("utf-8")), text_sha256(text)
+            rows.append((source, len(chunks) + linked.get(source, 0), nbytes, digest, now))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM sources")
+            self._conn.executemany("INSERT INTO sources VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute(
+                "UPDATE totals SET sources = ?, chunks = ?, bytes = ? WHERE id = 0",
+                (len(rows), sum(r[1] for r in rows), sum(r[2] for r in rows)),
+            )
+            self._conn.execute("COMMIT")
+        totals = self.totals()
+        log(f"Catálogo reconstruido: {totals['sources']} fuentes, {totals['chunks']} fragmentos ({self.path.name})")
+        return totals
+
+def catalog_path(db_path: Path, collection: str) -> Path:
+    return db_path / f"{collection}.catalog.sqlite3"
+
+_CATALOGS: Dict[Tuple[str, str], Catalog] = {}
+_LOCK = threading.Lock()
+
+def get_catalog(db_path: Path = CFG.db_path, collection: str = CFG.collection) -> Catalog:
+    key = (str(db_path), collection)
+    with _LOCK:
+        cat = _CATALOGS.get(key)
+        if cat is None:
+            cat = _CATALOGS[key] = Catalog(catalog_path(db_path, collection))
+        return cat
+
+def close_catalog(db_path: Path, collection: str) -> None:
+    with _LOCK:
+        cat = _CATALOGS.pop((str(db_path), collection), None)
+    if cat is not None:
+        cat.close()
+
+def ensure_catalog(store: "Store") -> bool:
+    """Reconstruye el catálogo de `store` si no cuadra con la colección (fragmentos guardados
+    más los enlazados como casi duplicados). Devuelve si lo reconstruyó.
+
+    Por qué: colecciones indexadas antes del catálogo, o tocadas por otra herramienta,
+    mostrarían 0 fuentes en /sources, /health y las métricas hasta el próximo build.
+    """
+    dedup = get_dedup_index(store.db_path, store.name)
+    linked = dedup.linked_by_source() if dedup else {}
+    catalog = get_catalog(store.db_path, store.name)
+    if catalog.totals()["chunks"] == store.count() + sum(linked.values()):
+        return False
+    catalog.rebuild_from(store.collection, store.db_path, store.name, linked=linked)
+    return True
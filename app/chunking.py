@@ -1,4 +1,134 @@
 from __future__ import annotations
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+# Cambia cuando cambian los cortes: los ids de chunk dependen del texto, así que el
+# indexador reprocesa todo (ver params del manifest).
+CHUNKER_VERSION = 2
+
+_SENT_END = re.compile(r"[.!?…][\"'”»)\]]*(?=\s)")
+_SPACE = re.compile(r"\s+")
+
+@dataclass
+class TextChunk:
+    index: int
+    text: str
+    page_start: int  # páginas 1-based
+    page_end: int
+    char_start: int  # offsets en el texto de las páginas unidas por un espacio
+    char_end: int
+
+    def positions(self) -> Dict[str, int]:
+        return {
+            "page_start": self.page_start,
+            "page_end": self.page_end,
+            "char_start": self.char_start,
+            "char_end": self.char_end,
+        }
+
+def _cut(buf: str, max_chars: int) -> int:
+    """Dónde cortar `buf` (len > max_chars): fin de oración, si no espacio, si no a la fuerza."""
+    lo = max_chars // 2
+    window = buf[: max_chars + 1]  # +1: saber si justo en max_chars hay un espacio
+    best = -1
+    for m in _SENT_END.finditer(window, lo, max_chars):
+        best = m.end()
+    if best > 0:
+        return best
+    for m in _SPACE.finditer(window, lo):
+        best = m.start()
+    return best if best > 0 else max_chars
+
+def chunk_pages(
+    pages: Iterable[str],
+    max_chars: int = 2800,
+    overlap_chars: int = 400,
+    min_tail_merge: int = 300,
+) -> Iterator[TextChunk]:
+    """Trocea páginas a medida que llegan, sin unir el documento entero.
+
+    El buffer nunca pasa de ~`max_chars` + 1 caracteres: cada página se agrega por
+    tramos y se emite un chunk en cuanto hay material suficiente. Los cortes prefieren
+    el fin de una oración (en la segunda mitad de la ventana), luego un espacio. El
+    siguiente chunk arranca `overlap_chars` antes del corte, en inicio de palabra.
+    Un resto final menor a `min_tail_merge` se suma al último chunk.
+    """
+    if max_chars <= 0 or not (0 <= overlap_chars < max_chars):
+        raise ValueError("Parámetros de chunking inválidos.")
+    buf = ""
+    buf_start = 0  # offset del documento donde empieza `buf`
+    doc_len = 0
+    marks: Deque[Tuple[int, int]] = deque()  # (offset donde empieza la página, número de página)
+    pending: Optional[TextChunk] = None  # se retiene uno para poder sumarle la cola
+    index = 0
+
+    def page_at(pos: int) -> int:
+        page = marks[0][1]
+        for off, no in marks:
+            if off > pos:
+                break
+            page = no
+        return page
+
+    def make(text_end: int) -> Optional[TextChunk]:
+        raw = buf[:text_end]
+        text = raw.strip()
+        if not text:
+            return None
+        start = buf_start + len(raw) - len(raw.lstrip())
+        end = start + len(text)
+        return TextChunk(index, text, page_at(start), page_at(end - 1), start, end)
+
+    def emit() -> Iterator[TextChunk]:
+        nonlocal buf, buf_start, pending, index
+        while len(buf) > max_chars:
+            cut = _cut(buf, max_chars)
+            chunk = make(cut)
+            nxt = max(1, cut - overlap_chars)
+            if not buf[nxt - 1].isspace() and (m := _SPACE.search(buf, nxt, cut)):
+                nxt = m.end()  # el solapamiento arranca en una palabra entera
+            buf, buf_start = buf[nxt:], buf_start + nxt
+            while len(marks) > 1 and marks[1][0] <= buf_start:
+                marks.popleft()
+            if chunk is None:
+                continue
+            if pending is not None:
+                yield pending
+            pending = chunk
+            index += 1
+
+    for page_no, page in enumerate(pages, start=1):
+        page = page.strip()
+        if not page:
+            continue
+        if doc_len:
+            buf += " "
+            doc_len += 1
+        marks.append((doc_len, page_no))
+        doc_len += len(page)
+        pos = 0
+        while pos < len(page):
+            room = max(1, max_chars + 1 - len(buf))
+            buf += page[pos : pos + room]
+            pos += room
+            yield from emit()
+
+    # Cola: lo que queda después del último chunk emitido.
+    if pending is not None:
+        novel = buf[max(0, pending.char_end - buf_start) :]
+        if not novel.strip():
+            yield pending
+            return
+        if len(novel.strip()) < min_tail_merge:
+            text = pending.text + novel.rstrip()
+            end = pending.char_start + len(text)
+            yield TextChunk(pending.index, text, pending.page_start, page_at(end - 1), pending.char_start, end)
+            return
+        yield pending
+    if marks and (last := make(len(buf))) is not None:
+        yield last
 
 def chunk_text(
     text: str,
@@ -8,13 +138,4 @@ def chunk_text(
 ) -> list[str]:
     if not text:
         return []
-    if max_chars <= 0 or not (0 <= overlap_chars < max_chars):
-        raise ValueError("Parámetros de chunking inválidos.")
-    chunks: list[str] = []
-    step = max_chars - overlap_chars
-    for i in range(0, len(text), step):
-        chunks.append(text[i : i + max_chars].strip())
-    if len(chunks) >= 2 and len(chunks[-1]) < min_tail_merge:
-        chunks[-2] = (chunks[-2] + " " + chunks[-1]).strip()
-        chunks.pop()
-    return [c for c in chunks if c]
\ No newline at end of file
+    return [c.text for c in chunk_pages([text], max_chars, overlap_chars, min_tail_merge)]
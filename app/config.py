@@ -8,7 +8,9 @@ class Config:
     db_path: Path = Path(os.getenv("DB_PATH", "./chroma_db"))
     docs_path: Path = Path(os.getenv("DOCS_PATH", "./materiales"))
     profiles_path: Path = Path(os.getenv("PROFILES_PATH", "./perfiles"))
+    cache_path: Path = Path(os.getenv("CACHE_PATH", "./.cache"))
     collection: str = os.getenv("COLLECTION", "capacitacion")
+    ollama_host: str = os.getenv("OLLAMA_HOST", "127.0.0.1:11434")
     chat_model: str = os.getenv("CHAT_MODEL", "phi3")
     embed_model: str = os.getenv("EMBED_MODEL", "nomic-embed-text")
     max_words: int = int(os.getenv("MAX_WORDS", "180"))
@@ -16,5 +18,55 @@ class Config:
     distance_threshold: float = float(os.getenv("DIST_THRESHOLD", "0.4"))
     max_chars: int = int(os.getenv("MAX_CHARS", "2800"))
     overlap_chars: int = int(os.getenv("OVERLAP_CHARS", "400"))
+    embed_batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+    embed_workers: int = int(os.getenv("EMBED_WORKERS", "4"))
+    embed_retries: int = int(os.getenv("EMBED_RETRIES", "3"))
+    embed_cache: bool = os.getenv("EMBED_CACHE", "1") != "0"
+    embed_cache_max: int = int(os.getenv("EMBED_CACHE_MAX", "200000"))
+    pdf_workers: int = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+    pdf_pages_per_task: int = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+    pdf_page_timeout: float = float(os.getenv("PDF_PAGE_TIMEOUT", "30"))
+    query_cache_max: int = int(os.getenv("QUERY_CACHE_MAX", "2048"))
+    query_cache_disk: bool = os.getenv("QUERY_CACHE_DISK", "1") != "0"
+    answer_cache: bool = os.getenv("ANSWER_CACHE", "1") != "0"
+    answer_cache_max: int = int(os.getenv("ANSWER_CACHE_MAX", "512"))
+    answer_cache_ttl: float = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    answer_cache_min_sim: float = float(os.getenv("ANSWER_CACHE_MIN_SIM", "0.97"))
+    lexical: bool = os.getenv("LEXICAL", "1") != "0"
+    lexical_min_coverage: float = float(os.getenv("LEXICAL_MIN_COVERAGE", "0.5"))
+    rrf_k: int = int(os.getenv("RRF_K", "60"))
+    dedup: bool = os.getenv("DEDUP", "1") != "0"  # casi duplicados (MinHash/LSH) se enlazan en vez de embeberse
+    dedup_threshold: float = float(os.getenv("DEDUP_THRESHOLD", "0.9"))  # Jaccard estimado sobre 3-gramas
+    embed_budget_ms: float = float(os.getenv("EMBED_BUDGET_MS", "2000"))  # 0 = sin límite
+    context_tokens: int = int(os.getenv("CONTEXT_TOKENS", "2000"))  # presupuesto del contexto en el prompt; 0 = sin límite
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "4"))  # generaciones simultáneas en /chat/batch
+    batch_max_items: int = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+    chat_max_active: int = int(os.getenv("CHAT_MAX_ACTIVE", "2"))  # /chat simultáneos; ~OLLAMA_NUM_PARALLEL
+    chat_max_queue: int = int(os.getenv("CHAT_MAX_QUEUE", "16"))  # en espera; más allá → 429
+    chat_queue_timeout: float = float(os.getenv("CHAT_QUEUE_TIMEOUT", "20"))  # s en cola antes del 429; 0 = sin límite
+    ready_interval: float = float(os.getenv("READY_INTERVAL", "15"))
+    warmup: bool = os.getenv("WARMUP", "1") != "0"  # cargar modelos en segundo plano al arrancar
+    warmup_interval: float = float(os.getenv("WARMUP_INTERVAL", "240"))  # s entre keep-alive; 0 = solo al arrancar
+    ollama_keep_alive: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    search_backend: str = os.getenv("SEARCH_BACKEND", "chroma")  # chroma | numpy
+    quantization: str = os.getenv("QUANTIZATION", "none")  # none | int8 | binary (solo backend numpy)
+    rerank_candidates: int = int(os.getenv("RERANK_CANDIDATES", "200"))
+    snapshot_keep: int = int(os.getenv("SNAPSHOT_KEEP", "2"))
+    snapshot_recheck_s: float = float(os.getenv("SNAPSHOT_RECHECK_S", "1"))  # cada cuánto se relee CURRENT
+    blue_green: bool = os.getenv("BLUE_GREEN", "1") != "0"  # rebuilds en una generación nueva + cambio de alias
+    keep_generations: int = int(os.getenv("KEEP_GENERATIONS", "2"))  # vigente + anteriores que se conservan
+    ingest_workers: int = int(os.getenv("INGEST_WORKERS", "2"))  # trabajos de ingesta procesados a la vez
+    ingest_max_attempts: int = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))  # reintentos ante fallos transitorios
+    ingest_stale_s: float = float(os.getenv("INGEST_STALE_S", "60"))  # "running" sin latido por más de esto → a la cola
+    ingest_wait_timeout: float = float(os.getenv("INGEST_WAIT_TIMEOUT", "300"))  # tope de ?wait=true, en s
+    upload_max_mb: float = float(os.getenv("UPLOAD_MAX_MB", "50"))
+    jobs_keep: int = int(os.getenv("JOBS_KEEP", "1000"))  # trabajos terminados que se conservan
+    upsert_batch: int = int(os.getenv("UPSERT_BATCH", "256"))
+    pipeline_queue: int = int(os.getenv("PIPELINE_QUEUE", "4"))
+
+    @property
+    def ollama_url(self) -> str:
+        host = self.ollama_host.rstrip("/")
+        return host if host.startswith(("http://", "https://")) else f"http://{host}"
 
 CFG = Config()
\ No newline at end of file
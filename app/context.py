@@ -0,0 +1,119 @@
+from __future__ import annotations
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .config import CFG
+
+# Empaquetado del contexto: los chunks vecinos de una misma fuente comparten `overlap_chars`
+# de texto; se fusionan sin repetirlo y se llena el prompt por relevancia hasta el presupuesto.
+
+_CHARS_PER_TOKEN = 3.5  # aproximación para español con los tokenizadores de phi3/llama
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+@dataclass
+class Hit:
+    source: Any
+    chunk: Any
+    text: str
+
+    @property
+    def tag(self) -> str:
+        return f"[{self.source}#{self.chunk}]"
+
+@dataclass
+class _Span:
+    source: Any
+    rank: int  # mejor posición (relevancia) entre sus chunks
+    hits: List[Hit] = field(default_factory=list)
+
+def _overlap(a: str, b: str, limit: int) -> int:
+    """Largo del sufijo de `a` que es prefijo de `b` (buscado en los últimos `limit` caracteres)."""
+    probe = b[: min(32, len(b))]
+    if not probe:
+        return 0
+    start = max(0, len(a) - limit)
+    while (i := a.find(probe, start)) != -1:
+        if b.startswith(a[i:]):
+            return len(a) - i
+        start = i + 1
+    return 0
+
+def _adjacent(a: Hit, b: Hit) -> bool:
+    return a.source == b.source and isinstance(a.chunk, int) and isinstance(b.chunk, int) and b.chunk == a.chunk + 1
+
+def _render(span: _Span, overlap_limit: int) -> str:
+    parts: List[str] = []
+    prev: Optional[Hit] = None
+    for h in span.hits:
+        text = h.text
+        if prev is not None and _adjacent(prev, h):
+            text = text[_overlap(prev.text, text, overlap_limit) :].lstrip()
+        if text:
+            parts.append(f"{h.tag} {text}")
+        prev = h
+    return " ".join(parts)
+
+def _spans(selected: List[Tuple[int, Hit]]) -> List[_Span]:
+    """Agrupa por fuente los chunks contiguos (por número de chunk); orden por relevancia del mejor."""
+    by_source: Dict[Any, List[Tuple[int, Hit]]] = {}
+    for rank, h in selected:
+        by_source.setdefault(h.source, []).append((rank, h))
+    spans: List[_Span] = []
+    for source, items in by_source.items():
+        items.sort(key=lambda x: (not isinstance(x[1].chunk, int), x[1].chunk if isinstance(x[1].chunk, int) else 0))
+        cur: Optional[_Span] = None
+        for rank, h in items:
+            if cur is not None and _adjacent(cur.hits[-1], h):
+                cur.hits.append(h)
+                cur.rank = min(cur.rank, rank)
+            else:
+                cur = _Span(source, rank, [h])
+                spans.append(cur)
+    spans.sort(key=lambda s: s.rank)
+    return spans
+
+def pack_context(
+    hits: Sequence[Hit],
+    max_tokens: int = CFG.context_tokens,
+    overlap_chars: int = CFG.overlap_chars,
+    info: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, List[str]]:
+    """`hits` en orden de relevancia → (contexto, etiquetas citables en el orden del contexto).
+
+    Chunks consecutivos de la misma fuente se unen en un solo bloque sin el solapamiento;
+    cada parte conserva su `[source#chunk]` delante del texto que le pertenece. Con
+    `max_tokens` > 0 se agregan hits por relevancia mientras el total estimado quepa; si
+    ni el primero cabe, se recorta.
+    """
+    limit = overlap_chars + 64  # margen: strip() en los bordes puede correr el solapamiento
+    seen, unique = set(), []
+    for h in hits:
+        if h.tag not in seen:
+            seen.add(h.tag)
+            unique.append(h)
+
+    def build(sel: List[Tuple[int, Hit]]) -> Tuple[str, List[str]]:
+        spans = _spans(sel)
+        return "\n\n".join(_render(s, limit) for s in spans), [h.tag for s in spans for h in s.hits]
+
+    selected: List[Tuple[int, Hit]] = []
+    context, tags = "", []
+    dropped = 0
+    for rank, h in enumerate(unique):
+        ctx, tg = build(selected + [(rank, h)])
+        if max_tokens > 0 and estimate_tokens(ctx) > max_tokens:
+            if not selected:  # el más relevante no cabe solo: se recorta
+                cut = int(max_tokens * _CHARS_PER_TOKEN) - len(h.tag) - 1
+                selected.append((rank, Hit(h.source, h.chunk, h.text[: max(0, cut)].rstrip())))
+                context, tags = build(selected)
+            else:
+                dropped += 1
+            continue
+        selected.append((rank, h))
+        context, tags = ctx, tg
+    if info is not None:
+        info["context_tokens"] = estimate_tokens(context)
+        info["context_dropped"] = dropped
+    return context, tags
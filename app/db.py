@@ -1,12 +1,197 @@
 from __future__ import annotations
-from typing import Any
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Optional, Set, Tuple
 from pathlib import Path
-import chromadb
-from chromadb.config import Settings
+from .config import CFG
+from .logging import log
+
+if TYPE_CHECKING:
+    import chromadb
 
 def get_client(db_path: Path) -> chromadb.ClientAPI:
+    # Por qué: importar chromadb toma ~0.7 s; se paga al abrir la primera colección, no al arrancar.
+    import chromadb
+    from chromadb.config import Settings
+
     db_path.mkdir(parents=True, exist_ok=True)
     return chromadb.PersistentClient(path=str(db_path), settings=Settings(anonymized_telemetry=False))
 
 def get_collection(client: chromadb.ClientAPI, name: str):
-    return client.get_or_create_collection(name)
\ No newline at end of file
+    return client.get_or_create_collection(name)
+
+def version_path(db_path: Path, collection: str) -> Path:
+    return db_path / f"{collection}.version"
+
+def read_index_version(db_path: Path, collection: str) -> int:
+    """Versión del contenido de la colección; cambia cada vez que alguien la modifica."""
+    try:
+        return int(version_path(db_path, collection).read_text(encoding="utf-8").strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def bump_index_version(db_path: Path, collection: str, floor: int = 0) -> int:
+    # Por qué: basada en reloj además de +1, para que dos procesos (server e indexer)
+    # que escriben a la vez no terminen publicando el mismo número. `floor`: al publicar
+    # una generación nueva su versión debe superar la de la generación que reemplaza.
+    v = max(read_index_version(db_path, collection) + 1, floor + 1, time.time_ns() // 1000)
+    path = version_path(db_path, collection)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(str(v), encoding="utf-8")
+    os.replace(tmp, path)
+    return v
+
+# Alias de colección (blue/green): <db>/<alias>.alias.json apunta a la generación vigente
+# (p. ej. "capacitacion" → "capacitacion__g7"). Sin archivo, el alias es la colección misma.
+
+def alias_path(db_path: Path, alias: str) -> Path:
+    return db_path / f"{alias}.alias.json"
+
+_ALIASES: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_ALIASES_LOCK = threading.Lock()
+
+def read_alias(db_path: Path, alias: str) -> Optional[Dict[str, Any]]:
+    """Contenido del alias (collection, generation, version, switched_at) o None. Un stat por llamada."""
+    path = alias_path(db_path, alias)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _ALIASES_LOCK:
+        cached = _ALIASES.get(str(path))
+    if cached and cached[0] == stamp:
+        return cached[1]
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return cached[1] if cached else None
+    with _ALIASES_LOCK:
+        _ALIASES[str(path)] = (stamp, data)
+    return data
+
+@contextmanager
+def alias_lock(db_path: Path, alias: str, shared: bool = False) -> Iterator[None]:
+    """Lock entre procesos sobre el alias: las ingestas lo toman compartido mientras
+    escriben en la generación vigente y el indexador exclusivo para publicar otra.
+
+    Por qué: sin él, una ingesta que termina entre el último catch_up y el cambio de
+    alias queda solo en la generación vieja y se pierde.
+    """
+    db_path.mkdir(parents=True, exist_ok=True)
+    with open(db_path / f"{alias}.alias.lock", "a+") as fh:
+        fcntl.flock(fh, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def resolve_collection(db_path: Path, name: str) -> str:
+    data = read_alias(db_path, name)
+    return data["collection"] if data else name
+
+def write_alias(db_path: Path, alias: str, collection: str, generation: int, version: int) -> None:
+    path = alias_path(db_path, alias)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    data = {"collection": collection, "generation": generation, "version": version, "switched_at": time.time()}
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)  # Por qué: los lectores ven el alias viejo o el nuevo, nunca uno a medias.
+
+class Store:
+    """Cliente y colección de Chroma abiertos una vez y compartidos por todo el proceso.
+
+    La apertura es perezosa y protegida con lock; las operaciones de Chroma ya son
+    seguras entre hilos, así que los endpoints del threadpool pueden usarla a la vez.
+    """
+
+    def __init__(self, db_path: Path, name: str):
+        self.db_path = db_path
+        self.name = name
+        self._lock = threading.Lock()
+        self._client: Optional[chromadb.ClientAPI] = None
+        self._col = None
+
+    @property
+    def client(self) -> chromadb.ClientAPI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = get_client(self.db_path)
+        return self._client
+
+    @property
+    def collection(self):
+        if self._col is None:
+            client = self.client
+            with self._lock:
+                if self._col is None:
+                    self._col = get_collection(client, self.name)
+        return self._col
+
+    def count(self) -> int:
+        col = self.collection
+        try:
+            return col.count()
+        except Exception:
+            return len(col.get(include=[]).get("ids", []))
+
+    def version(self) -> int:
+        return read_index_version(self.db_path, self.name)
+
+    def bump_version(self, floor: int = 0) -> int:
+        return bump_index_version(self.db_path, self.name, floor)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                log(f"Cerrando colección {self.name} ({self.db_path})")
+            self._col = None
+            self._client = None
+
+_STORES: Dict[Tuple[str, str], Store] = {}
+_STORES_LOCK = threading.Lock()
+
+def get_store(db_path: Path = CFG.db_path, collection: str = CFG.collection) -> Store:
+    """Store de `collection`; si es un alias, el de la generación a la que apunta ahora.
+
+    Se resuelve en cada llamada: tras un rebuild blue/green los lectores pasan a la
+    generación nueva sin reiniciar. `Store.name` es siempre el nombre físico.
+    """
+    name = resolve_collection(db_path, collection)
+    key = (str(db_path), name)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = Store(db_path, name)
+        return store
+
+def drop_store(db_path: Path, collection: str) -> None:
+    with _STORES_LOCK:
+        store = _STORES.pop((str(db_path), collection), None)
+    if store is not None:
+        store.close()
+
+def close_stores() -> None:
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+        _STORES.clear()
+    for s in stores:
+        s.close()
+
+def existing_ids(col, source: str) -> Set[str]:
+    try:
+        return set(col.get(where={"source": source}, include=[]).get("ids", []))
+    except Exception:
+        return set()
+
+def delete_ids(col, ids: Iterable[str], batch: int = 5000) -> int:
+    ids = list(ids)
+    for i in range(0, len(ids), batch):
+        col.delete(ids=ids[i : i + batch])
+    return len(ids)
@@ -0,0 +1,299 @@
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass
+from hashlib import blake2b
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from .config import CFG
+from .embeddings import embed_texts
+from .lexical import LexicalIndex, tokenize
+from .logging import log
+from .metrics import DEDUP_BYTES, DEDUP_CHUNKS, INDEXED_CHUNKS
+
+# Casi duplicados al indexar: cada chunk guardado tiene una firma MinHash (Jaccard sobre
+# 3-gramas de tokens) indexada por bandas LSH. Un chunk nuevo cuya similitud estimada con
+# uno ya guardado supera DEDUP_THRESHOLD no se embebe ni se sube a Chroma: queda como
+# enlace a ese chunk "canónico" (con su texto y metadatos, por si hay que promoverlo).
+# Si el canónico se borra, el primer enlace huérfano pasa a ser un chunk normal.
+
+NUM_PERM = 128
+BANDS, ROWS = 16, 8  # umbral implícito de candidatos ≈ (1/16)^(1/8) ≈ 0.71: pensado para DEDUP_THRESHOLD ≥ 0.75
+SHINGLE = 3
+
+# Semilla fija: las firmas se guardan y tienen que ser comparables entre corridas.
+_rng = np.random.default_rng(20240607)
+_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+_SQL_VARS = 500
+
+def _h64(data: bytes) -> int:
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), "little")
+
+def minhash(text: str) -> np.ndarray:
+    """Firma MinHash (uint32 × NUM_PERM) de los 3-gramas de tokens normalizados del texto."""
+    toks = tokenize(text)
+    grams = {" ".join(toks[i : i + SHINGLE]) for i in range(max(1, len(toks) - SHINGLE + 1))} or {""}
+    hv = np.fromiter((_h64(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+    # Hash multiply-shift por permutación; el desborde de uint64 es parte de la construcción.
+    with np.errstate(over="ignore"):
+        h = (hv[:, None] * _A[None, :] + _B[None, :]) >> _SHIFT
+    return h.min(axis=0).astype(np.uint32)
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard estimado: fracción de permutaciones con el mismo mínimo."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+def band_keys(sig: np.ndarray) -> List[int]:
+    return [_h64(sig[i * ROWS : (i + 1) * ROWS].tobytes()) - 2**63 for i in range(BANDS)]  # con signo: INTEGER de SQLite
+
+@dataclass
+class Link:
+    id: str
+    source: str
+    canonical: str
+    similarity: float
+    document: str
+    meta: Dict
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sigs (id TEXT PRIMARY KEY, source TEXT NOT NULL, sig BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS sigs_source ON sigs(source);
+CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, key INTEGER NOT NULL, id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS bands_key ON bands(band, key);
+CREATE INDEX IF NOT EXISTS bands_id ON bands(id);
+CREATE TABLE IF NOT EXISTS links (
+    id TEXT PRIMARY KEY, source TEXT NOT NULL, canonical TEXT NOT NULL, similarity REAL NOT NULL,
+    document TEXT NOT NULL, meta TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS links_canonical ON links(canonical);
+CREATE INDEX IF NOT EXISTS links_source ON links(source);
+"""
+
+class DedupIndex:
+    """Firmas MinHash/LSH de los chunks guardados y enlaces de los duplicados (SQLite, junto a la colección)."""
+
+    def __init__(self, path: Path, threshold: float = CFG.dedup_threshold):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    # -- firmas de chunks guardados --
+    def _delete(self, table: str, ids: Sequence[str]) -> None:
+        for i in range(0, len(ids), _SQL_VARS):
+            part = ids[i : i + _SQL_VARS]
+            self._conn.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(part))})", part)
+
+    def add(self, ids: Sequence[str], sources: Sequence[str], sigs: Sequence[np.ndarray]) -> None:
+        rows = [(cid, src, sig.tobytes()) for cid, src, sig in zip(ids, sources, sigs)]
+        bands = [(b, k, cid) for cid, sig in zip(ids, sigs) for b, k in enumerate(band_keys(sig))]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._delete("bands", list(ids))
+            self._conn.executemany("INSERT OR REPLACE INTO sigs VALUES (?, ?, ?)", rows)
+            self._conn.executemany("INSERT INTO bands VALUES (?, ?, ?)", bands)
+            self._conn.execute("COMMIT")
+
+    def delete_ids(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for table in ("sigs", "bands", "links"):
+                self._delete(table, ids)
+            self._conn.execute("COMMIT")
+
+    def delete_source(self, source: str, keep: Iterable[str] = ()) -> None:
+        """Borra firmas y enlaces de `source`, salvo los ids en `keep` (chunks vigentes)."""
+        keep = set(keep)
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute("SELECT id FROM sigs WHERE source = ?", (source,))]
+            ids += [r[0] for r in self._conn.execute("SELECT id FROM links WHERE source = ?", (source,))]
+        self.delete_ids(i for i in ids if i not in keep)
+
+    def candidates(self, sig: np.ndarray) -> List[Tuple[str, str, np.ndarray]]:
+        keys = band_keys(sig)
+        where = " OR ".join("(b.band = ? AND b.key = ?)" for _ in keys)
+        args = [x for b, k in enumerate(keys) for x in (b, k)]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT s.id, s.source, s.sig FROM bands b JOIN sigs s ON s.id = b.id WHERE {where}", args
+            ).fetchall()
+        return [(cid, src, np.frombuffer(blob, dtype=np.uint32)) for cid, src, blob in rows]
+
+    # -- enlaces de duplicados --
+    def link(self, links: Sequence[Link]) -> None:
+        if not links:
+            return
+        rows = [(lk.id, lk.source, lk.canonical, lk.similarity, lk.document, json.dumps(lk.meta, ensure_ascii=False)) for lk in links]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            # Un chunk que antes se guardaba y ahora es duplicado deja de ser canónico posible.
+            for table in ("sigs", "bands"):
+                self._delete(table, [lk.id for lk in links])
+            self._conn.executemany("INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+        DEDUP_CHUNKS.inc(len(links))
+        DEDUP_BYTES.inc(sum(len(lk.document.encode("utf-8")) for lk in links))
+
+    def orphans(self) -> List[Link]:
+        """Enlaces cuyo canónico ya no está guardado."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM links WHERE canonical NOT IN (SELECT id FROM sigs) ORDER BY canonical, id"
+            ).fetchall()
+        return [Link(r[0], r[1], r[2], r[3], r[4], json.loads(r[5])) for r in rows]
+
+    def relink(self, mapping: Dict[str, str]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._delete("links", list(mapping.values()))  # el nuevo canónico deja de ser enlace
+            self._conn.executemany("UPDATE links SET canonical = ? WHERE canonical = ?", [(n, o) for o, n in mapping.items()])
+            self._conn.execute("COMMIT")
+
+    def linked_by_source(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT source, COUNT(*) FROM links GROUP BY source").fetchall())
+
+    def totals(self) -> Dict[str, int]:
+        """Enlaces vigentes = embeddings y vectores que la colección se ahorra; bytes de texto no embebido."""
+        with self._lock:
+            n, nbytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(document AS BLOB))), 0) FROM links").fetchone()
+        return {"links": n, "bytes": nbytes}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sigs").fetchone()[0]
+
+    # -- copia entre generaciones --
+    def export(self, keep: Callable[[str], bool]) -> Tuple[List[Tuple], List[Tuple]]:
+        with self._lock:
+            sigs = [r for r in self._conn.execute("SELECT * FROM sigs") if keep(r[1])]
+            links = [r for r in self._conn.execute("SELECT * FROM links") if keep(r[1])]
+        return sigs, links
+
+    def load(self, sigs: Sequence[Tuple], links: Sequence[Tuple]) -> None:
+        bands = [(b, k, cid) for cid, _, blob in sigs for b, k in enumerate(band_keys(np.frombuffer(blob, dtype=np.uint32)))]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._delete("bands", [r[0] for r in sigs])
+            self._conn.executemany("INSERT OR REPLACE INTO sigs VALUES (?, ?, ?)", sigs)
+            self._conn.executemany("INSERT INTO bands VALUES (?, ?, ?)", bands)
+            self._conn.executemany("INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?)", links)
+            self._conn.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def rebuild_from(self, col, page: int = 2000) -> int:
+        """Recalcula las firmas de todos los chunks guardados; los enlaces se conservan."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM bands")
+            self._conn.execute("DELETE FROM sigs")
+            self._conn.execute("COMMIT")
+        n = col.count()
+        for off in range(0, n, page):
+            r = col.get(include=["documents", "metadatas"], limit=page, offset=off)
+            sources = [(m or {}).get("source", "unk") for m in r["metadatas"]]
+            self.add(r["ids"], sources, [minhash(d or "") for d in r["documents"]])
+        log(f"Dedup: firmas recalculadas para {n} fragmentos ({self.path.name})")
+        return n
+
+class DedupSession:
+    """Detección durante una ingesta: compara contra lo guardado y contra lo aceptado en
+    esta misma corrida que todavía no llegó al upsert (boilerplate repetido entre PDFs
+    de un mismo build). `commit` persiste las firmas una vez subidos los chunks."""
+
+    def __init__(self, index: DedupIndex):
+        self.index = index
+        self.threshold = index.threshold
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[str, np.ndarray]] = {}
+        self._bands: Dict[Tuple[int, int], List[str]] = {}
+
+    def check(self, cid: str, source: str, text: str, allow: Callable[[str, str], bool]) -> Tuple[Optional[Tuple[str, float]], np.ndarray]:
+        """(canónico, similitud) si `text` es casi duplicado de un chunk aceptado por `allow(id, source)`,
+        o None; en ese caso el chunk queda registrado como candidato para los siguientes."""
+        sig = minhash(text)
+        keys = band_keys(sig)
+        with self._lock:
+            mem = {i for b, k in enumerate(keys) for i in self._bands.get((b, k), ())}
+            cands = [(i, *self._pending[i]) for i in mem]
+        cands += self.index.candidates(sig)
+        best: Optional[Tuple[str, float]] = None
+        for other, src, osig in cands:
+            if other == cid or not allow(other, src):
+                continue
+            s = similarity(sig, osig)
+            if s >= self.threshold and (best is None or s > best[1]):
+                best = (other, s)
+        if best is None:
+            with self._lock:
+                self._pending[cid] = (source, sig)
+                for b, k in enumerate(keys):
+                    self._bands.setdefault((b, k), []).append(cid)
+        return best, sig
+
+    def commit(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            rows = [(i, *self._pending.pop(i)) for i in ids if i in self._pending]
+            for cid, _, sig in rows:  # desde ahora los encuentra `candidates` en SQLite
+                for key in enumerate(band_keys(sig)):
+                    self._bands[key].remove(cid)
+        if rows:
+            self.index.add([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+
+def promote_orphans(
+    col, dedup: DedupIndex, lexical: Optional[LexicalIndex] = None, embed_model: str = CFG.embed_model
+) -> int:
+    """Sube a la colección un enlace por cada canónico borrado y reapunta el resto a él."""
+    orphans = dedup.orphans()
+    if not orphans:
+        return 0
+    heads: Dict[str, Link] = {}
+    for lk in orphans:
+        heads.setdefault(lk.canonical, lk)
+    new = list(heads.values())
+    docs = [lk.document for lk in new]
+    embs = embed_texts(docs, embed_model)
+    ids, metas = [lk.id for lk in new], [lk.meta for lk in new]
+    col.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=embs)
+    if lexical:
+        lexical.add(ids, metas, docs)
+    INDEXED_CHUNKS.inc(len(ids))
+    dedup.add(ids, [lk.source for lk in new], [minhash(d) for d in docs])
+    dedup.relink({old: lk.id for old, lk in heads.items()})
+    log(f"Dedup: {len(new)} fragmento(s) promovidos al borrarse su canónico")
+    return len(new)
+
+def dedup_path(db_path: Path, collection: str) -> Path:
+    return db_path / f"{collection}.dedup.sqlite3"
+
+_INDEXES: Dict[Tuple[str, str], DedupIndex] = {}
+_LOCK = threading.Lock()
+
+def get_dedup_index(db_path: Path = CFG.db_path, collection: str = CFG.collection) -> Optional[DedupIndex]:
+    """Índice de duplicados compartido del proceso; None si DEDUP=0."""
+    if not CFG.dedup:
+        return None
+    key = (str(db_path), collection)
+    with _LOCK:
+        idx = _INDEXES.get(key)
+        if idx is None:
+            idx = _INDEXES[key] = DedupIndex(dedup_path(db_path, collection))
+        return idx
+
+def close_dedup_index(db_path: Path, collection: str) -> None:
+    with _LOCK:
+        idx = _INDEXES.pop((str(db_path), collection), None)
+    if idx is not None:
+        idx.close()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+import sqlite3
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from .config import CFG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    key TEXT NOT NULL,
+    vec BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, key)
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used);
+"""
+_SQL_VARS = 500  # margen bajo el límite de parámetros de SQLite
+
+def text_key(text: str) -> str:
+    return sha256(text.encode("utf-8")).hexdigest()
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+class EmbeddingCache:
+    """Cache en disco (SQLite) de embeddings por (modelo, sha256 del texto), con desalojo LRU."""
+
+    def __init__(self, path: Path, max_entries: int = CFG.embed_cache_max):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        keys = [text_key(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            uniq = list(dict.fromkeys(keys))
+            for i in range(0, len(uniq), _SQL_VARS):
+                part = uniq[i : i + _SQL_VARS]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE model = ? AND key IN ({marks})", (model, *part)
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                    [(now, model, k) for k in found],
+                )
+            out = [found.get(k) for k in keys]
+            hits = sum(1 for v in out if v is not None)
+            self.stats.hits += hits
+            self.stats.misses += len(out) - hits
+        return out
+
+    def put_many(self, model: str, texts: Sequence[str], vecs: Sequence[Sequence[float]]) -> None:
+        if not texts:
+            return
+        now = time.time()
+        rows = [(model, text_key(t), array("f", v).tobytes(), now) for t, v in zip(texts, vecs)]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.max_entries <= 0:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count <= self.max_entries:
+            return
+        # Por qué: desalojar un 10% extra evita pagar el DELETE en cada inserción.
+        drop = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (drop,),
+        )
+        self.stats.evictions += drop
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_CACHE: Optional[EmbeddingCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Cache compartido del proceso; None si EMBED_CACHE=0."""
+    global _CACHE
+    if not CFG.embed_cache:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = EmbeddingCache(CFG.cache_path / "embeddings.sqlite3", CFG.embed_cache_max)
+        return _CACHE
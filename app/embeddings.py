@@ -1,11 +1,22 @@
 from __future__ import annotations
-from typing import List, Tuple
-import ollama
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence, Tuple
 import requests
+from .config import CFG
+from .embed_cache import get_embedding_cache
+from .logging import log
+from .metrics import CACHE_EVENTS, EMBEDDED_TEXTS, timed
+
+# None = aún no sabemos si el servidor expone /api/embed (multi-input).
+_EMBED_API_OK: bool | None = None
 
 def ensure_ollama_ready(embed_model: str, chat_model: str) -> Tuple[int, bool]:
+    import ollama
+
     try:
-        requests.get("http://127.0.0.1:11434/api/tags", timeout=3)
+        requests.get(f"{CFG.ollama_url}/api/tags", timeout=3)
     except Exception as e:
         raise RuntimeError(f"No pude conectar con Ollama: {e}. Ejecuta `ollama serve`.") from e
     try:
@@ -24,8 +35,86 @@ def ensure_ollama_ready(embed_model: str, chat_model: str) -> Tuple[int, bool]:
         chat_ok = False
     return dim, chat_ok
 
+def _normalize(vec: List[float]) -> List[float]:
+    # Por qué: /api/embed devuelve vectores unitarios; igualamos el camino legado
+    # para que documentos y consultas vivan en el mismo espacio.
+    n = math.sqrt(sum(x * x for x in vec))
+    return [x / n for x in vec] if n else list(vec)
+
+def _embed_call(batch: Sequence[str], model: str) -> List[List[float]]:
+    import ollama  # diferido: el server arranca sin pagar el import (ver llm.py)
+
+    global _EMBED_API_OK
+    if _EMBED_API_OK is not False:
+        try:
+            r = ollama.embed(model=model, input=list(batch))
+            embs = [list(e) for e in r["embeddings"]]
+            if len(embs) != len(batch):
+                raise RuntimeError(f"/api/embed devolvió {len(embs)} vectores para {len(batch)} textos.")
+            _EMBED_API_OK = True
+            return embs
+        except ollama.ResponseError as ex:
+            if ex.status_code != 404 or _EMBED_API_OK:
+                raise
+            log("Ollama sin /api/embed; uso /api/embeddings (un texto por llamada).")
+            _EMBED_API_OK = False
+    return [_normalize(ollama.embeddings(model=model, prompt=t)["embedding"]) for t in batch]
+
+def _embed_with_retries(batch: Sequence[str], model: str, retries: int) -> List[List[float]]:
+    for attempt in range(retries + 1):
+        try:
+            return _embed_call(batch, model)
+        except Exception as ex:
+            if attempt >= retries:
+                raise RuntimeError(f"Error creando embeddings con '{model}': {ex}") from ex
+            delay = 0.5 * (2 ** attempt)
+            log(f"Embeddings: reintento {attempt + 1}/{retries} en {delay:.1f}s ({type(ex).__name__}: {ex})")
+            time.sleep(delay)
+    return []
+
+def embed_texts(
+    texts: Sequence[str],
+    model: str,
+    batch_size: int = CFG.embed_batch_size,
+    workers: int = CFG.embed_workers,
+    retries: int = CFG.embed_retries,
+    use_cache: bool = True,
+) -> List[List[float]]:
+    """Embeddings en lotes, con hasta `workers` lotes en vuelo y reintentos por lote.
+
+    Con `use_cache`, solo se piden al servidor los textos que no están en el cache en disco.
+    """
+    if not texts:
+        return []
+    t0 = time.perf_counter()
+    cache = get_embedding_cache() if use_cache else None
+    cached = cache.get_many(model, texts) if cache else [None] * len(texts)
+    todo = [i for i, v in enumerate(cached) if v is None]
+    if cache:
+        CACHE_EVENTS.inc(len(texts) - len(todo), cache="embeddings", result="hit")
+        CACHE_EVENTS.inc(len(todo), cache="embeddings", result="miss")
+    pending = [texts[i] for i in todo]
+    batches = [pending[i : i + batch_size] for i in range(0, len(pending), max(1, batch_size))]
+    with timed("embed"):
+        if len(batches) <= 1 or workers <= 1:
+            results = [_embed_with_retries(b, model, retries) for b in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+                results = list(pool.map(lambda b: _embed_with_retries(b, model, retries), batches))
+    EMBEDDED_TEXTS.inc(len(pending))
+    fresh = [e for r in results for e in r]
+    if cache and fresh:
+        cache.put_many(model, pending, fresh)
+    embs: List[List[float]] = list(cached)  # type: ignore[arg-type]
+    for i, e in zip(todo, fresh):
+        embs[i] = e
+    dt = time.perf_counter() - t0
+    if len(texts) > 1:
+        log(
+            f"Embeddings: {len(texts)} fragmentos en {dt:.2f}s ({len(texts) / max(dt, 1e-9):.1f} chunks/s, "
+            f"cache={len(texts) - len(todo)}/{len(texts)})"
+        )
+    return embs
+
 def embed_text(text: str, model: str) -> List[float]:
-    try:
-        return ollama.embeddings(model=model, prompt=text)["embedding"]
-    except Exception as ex:
-        raise RuntimeError(f"Error creando embedding con '{model}': {ex}") from ex
+    return embed_texts([text], model)[0]
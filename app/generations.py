@@ -0,0 +1,176 @@
+from __future__ import annotations
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+from .catalog import catalog_path, close_catalog, get_catalog
+from .config import CFG
+from .db import Store, drop_store, read_alias, write_alias, version_path
+from .dedup import close_dedup_index, dedup_path, get_dedup_index, promote_orphans
+from .embeddings import embed_texts
+from .lexical import close_lexical_index, get_lexical_index, lexical_path
+from .logging import log
+from .manifest import manifest_path
+from .vector_index import close_index, snapshot_root
+
+# Rebuild blue/green: el indexador escribe en una generación nueva (`<alias>__g<n>`) que
+# nadie lee, y al final cambia el alias de forma atómica. La colección original sin
+# alias cuenta como generación 0.
+
+def generation_name(alias: str, generation: int) -> str:
+    return f"{alias}__g{generation}"
+
+def current_generation(db_path: Path, alias: str) -> int:
+    data = read_alias(db_path, alias)
+    return int(data.get("generation", 0)) if data else 0
+
+def list_generations(client, alias: str) -> List[Tuple[int, str]]:
+    """(generación, nombre) de las colecciones de `alias` que existen en Chroma, de la más vieja a la más nueva."""
+    pat = re.compile(rf"^{re.escape(alias)}__g(\d+)$")
+    out = []
+    for c in client.list_collections():
+        name = getattr(c, "name", c)
+        if name == alias:
+            out.append((0, name))
+        elif m := pat.match(name):
+            out.append((int(m.group(1)), name))
+    return sorted(out)
+
+def _copy_pages(src: Store, dst: Store, keep, page: int, reembed: bool = False) -> int:
+    lexical = get_lexical_index(dst.db_path, dst.name)
+    n, copied = src.count(), 0
+    for off in range(0, n, page):
+        r = src.collection.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=off)
+        sel = [i for i, m in enumerate(r["metadatas"]) if keep((m or {}).get("source"))]
+        if not sel:
+            continue
+        ids = [r["ids"][i] for i in sel]
+        docs = [r["documents"][i] for i in sel]
+        metas = [r["metadatas"][i] for i in sel]
+        embs = embed_texts(docs, CFG.embed_model, use_cache=False) if reembed else [r["embeddings"][i] for i in sel]
+        dst.collection.upsert(ids=ids, embeddings=embs, documents=docs, metadatas=metas)
+        if lexical:
+            lexical.add(ids, metas, docs)
+        copied += len(ids)
+    return copied
+
+def _copy_dedup(src: Store, dst: Store, keep) -> None:
+    src_dd, dst_dd = get_dedup_index(src.db_path, src.name), get_dedup_index(dst.db_path, dst.name)
+    if src_dd and dst_dd:
+        dst_dd.load(*src_dd.export(keep))
+
+def clone_generation(src: Store, dst: Store, exclude: Set[str], page: int = 5000, reembed: bool = False) -> int:
+    """Copia a `dst` los chunks (con sus vectores: no se re-embebe nada), las firmas y enlaces
+    de duplicados y las filas del catálogo de toda fuente de `src` que no esté en `exclude`.
+    Con `reembed` los textos se vuelven a embeber con el modelo actual (las firmas no
+    dependen del modelo y se copian igual). Devuelve los chunks copiados."""
+    copied = _copy_pages(src, dst, lambda s: s not in exclude, page, reembed)
+    _copy_dedup(src, dst, lambda s: s not in exclude)
+    src_cat, dst_cat = get_catalog(src.db_path, src.name), get_catalog(dst.db_path, dst.name)
+    for s in src_cat.sources():
+        if s.source not in exclude:
+            dst_cat.upsert(s.source, s.chunks, s.bytes, s.content_hash, s.indexed_at)
+    return copied
+
+def catch_up(src: Store, dst: Store, since: float, exclude: Set[str], page: int = 5000, reembed: bool = False) -> List[str]:
+    """Vuelve a copiar las fuentes que cambiaron en `src` (p. ej. /ingest_text) después de `since`."""
+    src_cat, dst_cat = get_catalog(src.db_path, src.name), get_catalog(dst.db_path, dst.name)
+    changed = {s.source: s for s in src_cat.sources() if s.indexed_at >= since and s.source not in exclude}
+    if not changed:
+        return []
+    lexical = get_lexical_index(dst.db_path, dst.name)
+    dedup = get_dedup_index(dst.db_path, dst.name)
+    for name in changed:
+        ids = dst.collection.get(where={"source": name}, include=[]).get("ids", [])
+        if ids:
+            dst.collection.delete(ids=ids)
+        if lexical:
+            lexical.delete_source(name)
+        if dedup:
+            dedup.delete_source(name)
+    _copy_pages(src, dst, lambda s: s in changed, page, reembed)
+    _copy_dedup(src, dst, lambda s: s in changed)
+    if dedup:
+        promote_orphans(dst.collection, dedup, lexical)
+    for s in changed.values():
+        dst_cat.upsert(s.source, s.chunks, s.bytes, s.content_hash, s.indexed_at)
+    log(f"Generación {dst.name}: {len(changed)} fuente(s) actualizadas durante el rebuild → recopiadas")
+    return sorted(changed)
+
+def publish(db_path: Path, alias: str, dst: Store, generation: int) -> None:
+    """Apunta el alias a `dst`: desde el próximo request los lectores usan la generación nueva."""
+    write_alias(db_path, alias, dst.name, generation, dst.version())
+    log(f"Alias {alias} → {dst.name} (v{dst.version()})")
+
+_SEEN: Dict[Tuple[str, str], List[str]] = {}  # (db, alias) → generaciones usadas por este proceso, la vigente al final
+_SEEN_LOCK = threading.Lock()
+
+def release_retired(db_path: Path, alias: str, current: str) -> List[str]:
+    """Cierra en este proceso el store y los índices laterales (BM25, catálogo, duplicados,
+    snapshot) de las generaciones que ya no son ni la vigente ni la anterior. No borra archivos.
+
+    Por qué la anterior no: un request que resolvió el alias justo antes del cambio
+    todavía puede estar usándola (igual que en gc_generations).
+    """
+    with _SEEN_LOCK:
+        seen = _SEEN.setdefault((str(db_path), alias), [])
+        if seen and seen[-1] == current:
+            return []
+        if current in seen:
+            seen.remove(current)
+        seen.append(current)
+        retired, seen[:] = seen[:-2], seen[-2:]
+    for name in retired:
+        drop_store(db_path, name)
+        close_lexical_index(db_path, name)
+        close_catalog(db_path, name)
+        close_dedup_index(db_path, name)
+        close_index(db_path, name)
+    if retired:
+        log(f"Generaciones liberadas en este proceso: {', '.join(retired)}")
+    return retired
+
+def drop_generation(db_path: Path, name: str, client=None) -> None:
+    """Borra la colección de Chroma y sus archivos laterales (BM25, catálogo, duplicados, manifest, versión, snapshots)."""
+    drop_store(db_path, name)
+    close_lexical_index(db_path, name)
+    close_catalog(db_path, name)
+    close_dedup_index(db_path, name)
+    if client is not None:
+        try:
+            client.delete_collection(name)
+        except Exception:
+            pass  # no existía (p. ej. resto de un rebuild que no llegó a crearla)
+    for base in (lexical_path(db_path, name), catalog_path(db_path, name), dedup_path(db_path, name)):
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{base}{suffix}").unlink(missing_ok=True)
+    manifest_path(db_path, name).unlink(missing_ok=True)
+    version_path(db_path, name).unlink(missing_ok=True)
+    shutil.rmtree(snapshot_root(db_path, name), ignore_errors=True)
+
+def gc_generations(db_path: Path, alias: str, client, keep: int = CFG.keep_generations) -> List[str]:
+    """Borra las generaciones viejas; conserva la vigente y las `keep - 1` anteriores.
+
+    Por qué conservar la anterior: un request que resolvió el alias justo antes del cambio
+    todavía puede estar leyéndola. Las generaciones más nuevas que la vigente no se tocan
+    (podría ser un rebuild en curso de otro proceso).
+    """
+    current = current_generation(db_path, alias)
+    old = [(g, n) for g, n in list_generations(client, alias) if g <= current]
+    dropped = []
+    for g, name in old[: max(0, len(old) - max(1, keep))]:
+        if g == current:
+            continue
+        drop_generation(db_path, name, client)
+        dropped.append(name)
+    if dropped:
+        log(f"Generaciones eliminadas: {', '.join(dropped)}")
+    return dropped
+
+def next_generation(db_path: Path, alias: str, client) -> Tuple[int, str]:
+    """Número y nombre de la próxima generación; borra restos de un rebuild interrumpido con ese número."""
+    gen = current_generation(db_path, alias) + 1
+    name = generation_name(alias, gen)
+    drop_generation(db_path, name, client)
+    return gen, name
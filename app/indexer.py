@@ -1,34 +1,44 @@
 from __future__ import annotations
+import time
 from dataclasses import dataclass
 from hashlib import sha256
 from pathlib import Path
-from typing import Iterable, Tuple, List
+from typing import List, Tuple
+from .chunking import CHUNKER_VERSION
 from .config import CFG
 from .logging import log
-from .pdf import find_pdfs, load_pdf_text
-from .chunking import chunk_text
-from .embeddings import embed_text
-from .db import get_client, get_collection
+from .metrics import COLLECTION_CHUNKS, STAGE_SECONDS
+from .manifest import FileEntry, file_sha256, load_manifest, manifest_path, save_manifest
+from .pdf import extract_pdfs, find_pdfs
+from .pipeline import IngestPipeline, SourceResult
+from .embeddings import embed_texts
+from .catalog import ensure_catalog, get_catalog
+from .dedup import get_dedup_index, promote_orphans
+from .generations import catch_up, clone_generation, gc_generations, next_generation, publish
+from .lexical import get_lexical_index
+from .vector_index import export_snapshot, snapshot_version
+from .db import alias_lock, delete_ids, existing_ids, get_store
 
 @dataclass
 class IndexStats:
     files: int
     chunks: int
     total_after: int
+    skipped: int = 0
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    chunks_deleted: int = 0
+    dedup_chunks: int = 0  # casi duplicados enlazados: embeddings que no se pidieron
+    dedup_bytes: int = 0
 
 def _hash_id(source: str, idx: int, content: str) -> str:
     h = sha256()
     h.update(source.encode()); h.update(f"#{idx}".encode()); h.update(content.encode())
     return h.hexdigest()
 
-def _embed_batch(texts: List[str], batch_size: int = 16, model: str = CFG.embed_model) -> List[List[float]]:
-    embs: List[List[float]] = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-        log(f"Embeddings {i}-{i+len(batch)-1}…")
-        for t in batch:
-            embs.append(embed_text(t, model))
-    return embs
+def _embed_batch(texts: List[str], batch_size: int = CFG.embed_batch_size, model: str = CFG.embed_model) -> List[List[float]]:
+    return embed_texts(texts, model, batch_size=batch_size)
 
 def build_index(
     docs_path: Path = CFG.docs_path,
@@ -36,35 +46,145 @@ def build_index(
     collection: str = CFG.collection,
     max_chars: int = CFG.max_chars,
     overlap_chars: int = CFG.overlap_chars,
+    force: bool = False,
+    workers: int = CFG.pdf_workers,
+    blue_green: bool = CFG.blue_green,
 ) -> IndexStats:
+    t0 = time.perf_counter()
     if not docs_path.is_dir():
         raise FileNotFoundError(f"No existe la carpeta de materiales: {docs_path}")
     pdfs = find_pdfs(docs_path)
     if not pdfs:
         raise FileNotFoundError("No se encontraron PDFs para indexar.")
-    client = get_client(db_path); col = get_collection(client, collection)
-    total_chunks = 0
+    live = get_store(db_path, collection)  # si `collection` es un alias: la generación vigente
+    params = {
+        "max_chars": max_chars,
+        "overlap_chars": overlap_chars,
+        "embed_model": CFG.embed_model,
+        "chunker": CHUNKER_VERSION,
+    }
+    prev_params, manifest = load_manifest(manifest_path(db_path, live.name))
+    current = {pdf.name for pdf in pdfs}
+    # Antes de descartar el manifest: es el registro de qué fuentes vinieron de esta carpeta
+    # (el catálogo también tiene las de /ingest_text, que no se deben podar).
+    removed = sorted(set(manifest) - current)
+    known = set(manifest)  # para contar como "actualizados" también los que se rehacen desde cero
+    fresh = force or prev_params != params
+    if fresh:
+        manifest = {}  # Por qué: otros parámetros generan otros chunks/vectores; nada es reutilizable.
+    stats = IndexStats(files=len(pdfs), chunks=0, total_after=0)
+
+    todo: List[Tuple[Path, FileEntry]] = []
     for pdf in pdfs:
-        log(f"Extrayendo: {pdf.name}")
-        text = load_pdf_text(pdf)
-        if not text:
-            log(f"Saltando (sin texto): {pdf.name}")
+        st = pdf.stat()
+        prev = manifest.get(pdf.name)
+        if prev and prev.size == st.st_size and prev.mtime == st.st_mtime:
+            stats.skipped += 1
+            continue
+        digest = file_sha256(pdf)
+        entry = FileEntry(path=str(pdf), size=st.st_size, mtime=st.st_mtime, sha256=digest)
+        if prev and prev.sha256 == digest:
+            entry.chunks = prev.chunks
+            manifest[pdf.name] = entry
+            stats.skipped += 1
             continue
-        chunks = chunk_text(text, max_chars=max_chars, overlap_chars=overlap_chars)
-        log(f"{pdf.name}: {len(chunks)} fragmentos")
-        try:
-            col.delete(where={"source": pdf.name})
-        except Exception:
-            pass
-        ids = [_hash_id(pdf.name, i, c) for i, c in enumerate(chunks)]
-        metas = [{"source": pdf.name, "chunk": i} for i, _ in enumerate(chunks)]
-        embs = _embed_batch(chunks, batch_size=16, model=CFG.embed_model)
-        if not (len(ids) == len(chunks) == len(embs) == len(metas)):
-            raise RuntimeError("Desalineación ids/docs/embeddings/metadatas.")
-        col.upsert(ids=ids, documents=chunks, metadatas=metas, embeddings=embs)
-        total_chunks += len(chunks)
-    try:
-        count = col.count()
-    except Exception:
-        count = len(col.get().get("ids", []))
-    return IndexStats(files=len(pdfs), chunks=total_chunks, total_after=count)
+        todo.append((pdf, entry))
+
+    # Blue/green: con cambios se arma una generación nueva (copia de la vigente sin las fuentes
+    # eliminadas) y se procesa ahí; /chat sigue leyendo la vigente hasta el cambio de alias.
+    generation = None
+    if blue_green and (removed or todo):
+        generation, target = next_generation(db_path, collection, live.client)
+        store = get_store(db_path, target)
+        since = time.time()
+        if fresh:
+            # Otros parámetros o modelo: los vectores vigentes no sirven. Los PDFs se procesan
+            # todos de nuevo; de la vigente solo se traen (re-embebidas) las fuentes de /ingest_text.
+            copied = clone_generation(live, store, exclude=current | set(removed), reembed=True)
+        else:
+            copied = clone_generation(live, store, exclude=set(removed))
+        log(f"Generación {target}: {copied} fragmentos copiados de {live.name}")
+    else:
+        store = live
+    col = store.collection
+    lexical = get_lexical_index(db_path, store.name)
+    catalog = get_catalog(db_path, store.name)
+    dedup = get_dedup_index(db_path, store.name)
+    mpath = manifest_path(db_path, store.name)
+
+    live_catalog = get_catalog(db_path, live.name)
+    for name in removed:
+        log(f"Eliminado de materiales: {name}")
+        if generation is None:
+            stats.chunks_deleted += delete_ids(col, existing_ids(col, name))
+            if lexical:
+                lexical.delete_source(name)
+            if dedup:
+                dedup.delete_source(name)
+            catalog.delete(name)
+        else:
+            gone = live_catalog.get(name)  # no se copió: basta con contarlos
+            stats.chunks_deleted += gone.chunks if gone else 0
+        manifest.pop(name, None)
+        stats.removed += 1
+    if dedup and removed:
+        promote_orphans(col, dedup, lexical)  # duplicados cuyo canónico era de una fuente eliminada
+    save_manifest(mpath, params, manifest)
+
+    entries = dict(todo)
+
+    def on_done(res: SourceResult) -> None:
+        entry = entries[res.key]
+        if res.chunks == 0:
+            log(f"Saltando (sin texto): {res.source}")
+        if res.source not in known and not res.had_previous:
+            stats.added += 1
+        else:
+            stats.updated += 1
+        stats.chunks += res.new
+        stats.chunks_deleted += res.deleted
+        entry.chunks = res.chunks
+        catalog.upsert(res.source, res.chunks, entry.size, entry.sha256)
+        manifest[res.source] = entry
+        save_manifest(mpath, params, manifest)
+
+    if todo:
+        log(f"Extrayendo {len(todo)} PDF(s) con {max(1, workers)} proceso(s)…")
+        docs = ((pdf, pdf.name, pages) for pdf, pages in extract_pdfs([p for p, _ in todo], workers=workers))
+        pstats = IngestPipeline(
+            col, _hash_id, max_chars=max_chars, overlap_chars=overlap_chars, on_source_done=on_done,
+            lexical=lexical, dedup=dedup, reuse=not fresh,
+        ).run(docs)
+        stats.dedup_chunks, stats.dedup_bytes = pstats.linked, pstats.linked_bytes
+
+    if generation is not None:
+        # Las fuentes que este build reprocesó (o eliminó) mandan sobre lo que entró a la vigente.
+        rebuilt = {pdf.name for pdf in entries} | set(removed)
+        synced = time.time()
+        catch_up(live, store, since, exclude=rebuilt, reembed=fresh)
+    if lexical and lexical.count() != store.count():
+        lexical.rebuild_from(col)  # primera vez, o el índice BM25 quedó desalineado
+    if dedup and dedup.count() != store.count():
+        dedup.rebuild_from(col)  # colección indexada antes de DEDUP, o firmas desalineadas
+    ensure_catalog(store)  # cuenta los fragmentos de cada fuente, guardados o enlazados
+
+    if stats.chunks or stats.chunks_deleted or generation is not None:
+        store.bump_version(floor=live.version())  # monótona también entre generaciones
+    version = store.version()
+    snapshots = CFG.search_backend == "numpy"  # con Chroma nadie lee el snapshot: no se exporta
+    if snapshots and snapshot_version(db_path, store.name) != version:
+        export_snapshot(col, db_path, store.name, version)
+    if generation is not None:
+        # Con las ingestas en pausa: lo que entró a la vigente desde el catch_up anterior
+        # se copia y el alias cambia sin que otra ingesta se cuele en el medio.
+        with alias_lock(db_path, collection):
+            if catch_up(live, store, synced, exclude=rebuilt, reembed=fresh):
+                version = store.bump_version(floor=live.version())
+                if snapshots:
+                    export_snapshot(col, db_path, store.name, version)
+            publish(db_path, collection, store, generation)
+        gc_generations(db_path, collection, store.client)
+    stats.total_after = store.count()
+    COLLECTION_CHUNKS.set(stats.total_after)
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="index.build")
+    return stats
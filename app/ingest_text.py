@@ -1,13 +1,21 @@
-# file: app/ingest.py
+# file: app/ingest_text.py
 from __future__ import annotations
 from dataclasses import dataclass
 from hashlib import sha256
-from typing import List
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
 
-from app.config import CFG
-from app.db import get_client, get_collection
-from app.chunking import chunk_text
-from app.embeddings import embed_text
+from .config import CFG
+from .catalog import get_catalog, text_sha256
+from .db import Store, get_store
+from .dedup import DedupSession, Link, get_dedup_index, promote_orphans
+from .chunking import TextChunk, chunk_pages
+from .embeddings import embed_texts
+from .lexical import get_lexical_index
+from .manifest import file_sha256
+from .metrics import INDEXED_CHUNKS, timed
+from .pdf import extract_pdfs, get_pdf_pool, join_pages
+from .vector_index import export_snapshot
 
 def _hash_id(source: str, idx: int, content: str) -> str:
     h = sha256()
@@ -19,39 +27,125 @@ class IngestResult:
     source: str
     chunks: int
     total_after: int
+    linked: int = 0  # casi duplicados enlazados a otro chunk (sin embedding propio)
 
-def ingest_text(source_name: str, text: str) -> IngestResult:
+Progress = Callable[[int, int], None]  # (chunks embebidos, chunks totales)
+
+def _embed_with_progress(chunks: List[str], progress: Optional[Progress]) -> List[List[float]]:
+    if progress is None:
+        return embed_texts(chunks, CFG.embed_model)
+    # Por qué: de a `batch * workers` textos se conserva el paralelismo de embed_texts y,
+    # entre tramos, quien encoló el trabajo ve avanzar el contador.
+    step = max(1, CFG.embed_batch_size * max(1, CFG.embed_workers))
+    embs: List[List[float]] = []
+    progress(0, len(chunks))
+    for i in range(0, len(chunks), step):
+        embs.extend(embed_texts(chunks[i : i + step], CFG.embed_model))
+        progress(len(embs), len(chunks))
+    return embs
+
+def ingest_pages(
+    source_name: str,
+    pages: Sequence[str],
+    store: Optional[Store] = None,
+    nbytes: Optional[int] = None,
+    progress: Optional[Progress] = None,
+    content_hash: Optional[str] = None,
+) -> IngestResult:
+    """Reemplaza `source_name` en la colección por los fragmentos de `pages` (texto por página).
+
+    `nbytes` y `content_hash` describen la fuente tal como llegó (bytes y sha256 del archivo o
+    del texto enviado), igual que el manifest de build_index para los PDFs; por defecto se
+    calculan sobre el texto de `pages`.
+    """
     if not source_name or len(source_name) < 3:
         raise ValueError("source_name inválido (min 3).")
-    if not text or len(text.strip()) < 50:
+    text = join_pages(pages)
+    if len(text) < 50:
         raise ValueError("Texto demasiado corto (min 50 chars).")
 
-    client = get_client(CFG.db_path)
-    col = get_collection(client, CFG.collection)
+    store = store or get_store()
+    col = store.collection
 
-    chunks: List[str] = chunk_text(text.strip(), max_chars=CFG.max_chars, overlap_chars=CFG.overlap_chars)
+    pieces: List[TextChunk] = list(chunk_pages(pages, max_chars=CFG.max_chars, overlap_chars=CFG.overlap_chars))
+    chunks = [c.text for c in pieces]
     if not chunks:
         raise ValueError("No se generaron fragmentos (revisa el texto).")
 
-    # limpiar previos de este source
-    try:
-        col.delete(where={"source": source_name})
-    except Exception:
-        pass
-
     ids = [_hash_id(source_name, i, c) for i, c in enumerate(chunks)]
-    metas = [{"source": source_name, "chunk": i} for i, _ in enumerate(chunks)]
-    embs = [embed_text(c, CFG.embed_model) for c in chunks]
+    metas = [{"source": source_name, "chunk": c.index, **c.positions()} for c in pieces]
+    dedup = get_dedup_index(store.db_path, store.name)
+    session = DedupSession(dedup) if dedup else None
+    links: List[Link] = []
+    if session is not None:
+        keep, seen = [], set()
+        allow = lambda other, src: src != source_name or other in seen  # noqa: E731 — la versión previa se reemplaza
+        for cid, chunk, meta in zip(ids, chunks, metas):
+            seen.add(cid)
+            hit, _ = session.check(cid, source_name, chunk, allow)
+            if hit is None:
+                keep.append((cid, chunk, meta))
+            else:
+                links.append(Link(cid, source_name, hit[0], hit[1], chunk, meta))
+        ids, chunks, metas = [k[0] for k in keep], [k[1] for k in keep], [k[2] for k in keep]
+    embs = _embed_with_progress(chunks, progress) if chunks else []
 
     if not (len(ids) == len(chunks) == len(embs) == len(metas)):
         raise RuntimeError("Desalineación ids/docs/embeddings/metadatas.")
 
-    col.upsert(ids=ids, documents=chunks, metadatas=metas, embeddings=embs)
-
+    # limpiar previos de este source (después de embeber: si Ollama falla, la versión anterior sigue)
     try:
-        total = col.count()
+        col.delete(where={"source": source_name})
     except Exception:
-        total = len(col.get().get("ids", []))
+        pass
+    lexical = get_lexical_index(store.db_path, store.name)
+    if lexical:
+        lexical.delete_source(source_name)
+    if dedup:
+        dedup.delete_source(source_name)
 
-    return IngestResult(source=source_name, chunks=len(chunks), total_after=total)
+    if ids:
+        with timed("index.upsert"):
+            col.upsert(ids=ids, documents=chunks, metadatas=metas, embeddings=embs)
+        INDEXED_CHUNKS.inc(len(ids))
+        if lexical:
+            lexical.add(ids, metas, chunks)
+    if dedup and session is not None:
+        session.commit(ids)
+        dedup.link(links)
+        promote_orphans(col, dedup, lexical)  # otras fuentes enlazadas a chunks de la versión anterior
+    get_catalog(store.db_path, store.name).upsert(
+        source_name,
+        len(pieces),
+        nbytes if nbytes is not None else len(text.encode("utf-8")),
+        content_hash or text_sha256(text),
+    )
+    version = store.bump_version()
+    if CFG.search_backend == "numpy":
+        export_snapshot(col, store.db_path, store.name, version)
+
+    return IngestResult(source=source_name, chunks=len(pieces), total_after=store.count(), linked=len(links))
+
+def ingest_text(
+    source_name: str, text: str, store: Optional[Store] = None, progress: Optional[Progress] = None
+) -> IngestResult:
+    if not text or len(text.strip()) < 50:
+        raise ValueError("Texto demasiado corto (min 50 chars).")
+    return ingest_pages(
+        source_name, [text], store=store, nbytes=len(text.encode("utf-8")), progress=progress,
+        content_hash=text_sha256(text),
+    )
 
+def ingest_file(
+    path: Path, source_name: str, store: Optional[Store] = None, progress: Optional[Progress] = None
+) -> IngestResult:
+    """PDF (texto por página) o texto plano (.txt/.md) subido por la API."""
+    if path.suffix.lower() == ".pdf":
+        # Por qué: en procesos aparte, con límite por rango de páginas; un PDF pesado no frena al server.
+        # El pool es uno solo para todas las subidas (ver PdfPool), no uno por archivo.
+        pages = [p for _, it in extract_pdfs([path], shared=get_pdf_pool()) for p in it]
+    else:
+        pages = [path.read_text(encoding="utf-8", errors="replace")]
+    return ingest_pages(
+        source_name, pages, store=store, nbytes=path.stat().st_size, progress=progress, content_hash=file_sha256(path)
+    )
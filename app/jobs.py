@@ -0,0 +1,351 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from .config import CFG
+from .db import alias_lock, get_store
+from .ingest_text import IngestResult, ingest_file, ingest_text
+from .logging import log
+from .metrics import INGEST_JOBS, INGEST_JOBS_PENDING, timed
+
+# Cola de ingesta persistente: /ingest_text y /ingest_file encolan y responden al instante
+# con un id; un pool de workers procesa los trabajos (embeddings en lotes) y /jobs/{id}
+# muestra el avance. La cola vive en SQLite junto a la colección, así que sobrevive reinicios.
+# Cada trabajo "running" lleva el dueño (host:pid) y un latido; si el latido se corta (el
+# proceso se cayó), cualquier proceso lo devuelve a "queued". Con varios workers de uvicorn
+# compartiendo la cola, nadie le quita a otro un trabajo vivo.
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY, kind TEXT NOT NULL, source TEXT NOT NULL, status TEXT NOT NULL,
+    text TEXT, path TEXT, bytes INTEGER NOT NULL DEFAULT 0,
+    chunks_total INTEGER, chunks_done INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT, result TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL,
+    run_after REAL NOT NULL DEFAULT 0, owner TEXT, heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+_COLUMNS = (
+    "id, kind, source, status, path, bytes, chunks_total, chunks_done, attempts, error, result, "
+    "created_at, started_at, finished_at"
+)
+
+@dataclass
+class Job:
+    id: str
+    kind: str  # text | file
+    source: str
+    status: str
+    path: Optional[str]
+    bytes: int
+    chunks_total: Optional[int]
+    chunks_done: int
+    attempts: int
+    error: Optional[str]
+    result: Optional[str]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d.pop("path")
+        d["result"] = json.loads(self.result) if self.result else None
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        d["progress"] = round(self.chunks_done / self.chunks_total, 3) if self.chunks_total else (1.0 if self.status == DONE else 0.0)
+        d["queue_wait_ms"] = round(((self.started_at or end) - self.created_at) * 1000, 1)
+        d["elapsed_ms"] = round(elapsed * 1000, 1)
+        d["chunks_per_s"] = round(self.chunks_done / elapsed, 1) if elapsed > 0 else None
+        return d
+
+class JobQueue:
+    """Trabajos de ingesta en SQLite; `claim` toma el más viejo de forma atómica."""
+
+    def __init__(self, path: Path, max_attempts: int = CFG.ingest_max_attempts):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.uploads = path.parent / "uploads"
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    def _migrate(self) -> None:
+        cols = {r[1] for r in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, decl in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+            if name not in cols:
+                try:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+                except sqlite3.OperationalError:
+                    pass  # otro proceso la agregó al mismo tiempo
+
+    def _row(self, where: str, args: Tuple = ()) -> Optional[Job]:
+        row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE {where}", args).fetchone()
+        return Job(*row) if row else None
+
+    def submit(self, kind: str, source: str, text: Optional[str] = None, path: Optional[Path] = None, nbytes: int = 0) -> Job:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, source, status, text, path, bytes, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, source, QUEUED, text, str(path) if path else None, nbytes, time.time()),
+            )
+            job = self._row("id = ?", (job_id,))
+        INGEST_JOBS.inc(status=QUEUED)
+        return job  # type: ignore[return-value]
+
+    def claim(self) -> Optional[Tuple[Job, Optional[str]]]:
+        """Marca como "running" el trabajo en cola más viejo y lo devuelve junto con su texto.
+
+        Por qué se saltan fuentes con un trabajo en curso: dos ingestas del mismo
+        `source` a la vez intercalarían borrado y upsert y mezclarían versiones.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = self._row(
+                    "status = ? AND run_after <= ? AND source NOT IN (SELECT source FROM jobs WHERE status = ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, time.time(), RUNNING),
+                )
+                if job is None:
+                    return None
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, error = NULL, "
+                    "owner = ?, heartbeat_at = ? WHERE id = ?",
+                    (RUNNING, now, self.owner, now, job.id),
+                )
+                text = self._conn.execute("SELECT text FROM jobs WHERE id = ?", (job.id,)).fetchone()[0]
+                job = self._row("id = ?", (job.id,))
+            finally:
+                self._conn.execute("COMMIT")
+        return job, text  # type: ignore[return-value]
+
+    def progress(self, job_id: str, done: int, total: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET chunks_done = ?, chunks_total = ?, heartbeat_at = ? WHERE id = ? AND owner = ?",
+                (done, total, time.time(), job_id, self.owner),
+            )
+
+    def heartbeat(self) -> int:
+        """Renueva el latido de los trabajos que este proceso tiene en curso."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?", (time.time(), RUNNING, self.owner)
+            ).rowcount
+
+    def finish(self, job: Job, res: IngestResult) -> None:
+        result = json.dumps({"source": res.source, "chunks": res.chunks, "total_after": res.total_after, "linked": res.linked})
+        with self._lock:
+            n = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, text = NULL, chunks_done = ?, chunks_total = ?, finished_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (DONE, result, res.chunks, res.chunks, time.time(), job.id, RUNNING, self.owner),
+            ).rowcount
+        if not n:
+            log(f"Ingesta {job.id[:8]}: el trabajo se reencoló mientras corría; se descarta este resultado")
+            return
+        self._drop_upload(job)
+        INGEST_JOBS.inc(status=DONE)
+
+    def fail(self, job: Job, error: str, retry: bool, backoff_s: float = 2.0) -> bool:
+        """Registra el error; si `retry` y quedan intentos, el trabajo vuelve a la cola con espera
+        exponencial (Ollama reiniciando no agota los intentos en un segundo). Devuelve si se reintenta."""
+        again = retry and job.attempts < self.max_attempts
+        mine = "id = ? AND status = ? AND owner = ?"
+        with self._lock:
+            if again:
+                n = self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, chunks_done = 0, started_at = NULL, owner = NULL, run_after = ? "
+                    f"WHERE {mine}",
+                    (QUEUED, error, time.time() + backoff_s * 2 ** (job.attempts - 1), job.id, RUNNING, self.owner),
+                ).rowcount
+            else:
+                n = self._conn.execute(
+                    f"UPDATE jobs SET status = ?, error = ?, text = NULL, finished_at = ? WHERE {mine}",
+                    (FAILED, error, time.time(), job.id, RUNNING, self.owner),
+                ).rowcount
+        if not n:
+            return False  # ya no es nuestro: otro proceso lo reencoló por latido vencido
+        if not again:
+            self._drop_upload(job)
+        INGEST_JOBS.inc(status="retried" if again else FAILED)
+        return again
+
+    def _drop_upload(self, job: Job) -> None:
+        if job.path:
+            Path(job.path).unlink(missing_ok=True)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._row("id = ?", (job_id,))
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Job]:
+        where, args = ("status = ?", (status,)) if status else ("1 = 1", ())
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE {where} ORDER BY created_at DESC LIMIT ?", (*args, limit)
+            ).fetchall()
+        return [Job(*r) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def recover(self, stale_s: float = CFG.ingest_stale_s) -> int:
+        """Devuelve a la cola los "running" de otros procesos sin latido en `stale_s` segundos
+        (el proceso se cayó o se detuvo a mitad). Los de procesos vivos no se tocan."""
+        with self._lock:
+            n = self._conn.execute(
+                "UPDATE jobs SET status = ?, chunks_done = 0, started_at = NULL, owner = NULL "
+                "WHERE status = ? AND (owner IS NULL OR owner != ?) AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (QUEUED, RUNNING, self.owner, time.time() - stale_s),
+            ).rowcount
+        if n:
+            log(f"Ingesta: {n} trabajo(s) interrumpidos vuelven a la cola")
+        return n
+
+    def prune(self, keep: int = CFG.jobs_keep) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND id NOT IN "
+                "(SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY finished_at DESC LIMIT ?)",
+                (DONE, FAILED, DONE, FAILED, keep),
+            ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def jobs_path(db_path: Path) -> Path:
+    return db_path / "ingest_jobs.sqlite3"
+
+_QUEUES: Dict[str, JobQueue] = {}
+_LOCK = threading.Lock()
+
+def get_job_queue(db_path: Path = CFG.db_path) -> JobQueue:
+    key = str(db_path)
+    with _LOCK:
+        q = _QUEUES.get(key)
+        if q is None:
+            q = _QUEUES[key] = JobQueue(jobs_path(db_path))
+        return q
+
+def run_job(queue: JobQueue, job: Job, text: Optional[str]) -> None:
+    progress = lambda done, total: queue.progress(job.id, done, total)  # noqa: E731
+    try:
+        # Lock compartido: un rebuild blue/green no cambia el alias a mitad de esta ingesta.
+        with alias_lock(CFG.db_path, CFG.collection, shared=True), timed("ingest.job"):
+            store = get_store()  # resuelto con el lock tomado: la generación vigente
+            if job.kind == "file":
+                res = ingest_file(Path(job.path or ""), job.source, store=store, progress=progress)
+            else:
+                res = ingest_text(job.source, text or "", store=store, progress=progress)
+    except (ValueError, FileNotFoundError) as e:
+        # Entrada inválida (texto corto, PDF sin texto, archivo ausente): reintentar no cambia nada.
+        queue.fail(job, f"{type(e).__name__}: {e}", retry=False)
+        log(f"Ingesta {job.id[:8]} ({job.source}) falló: {e}")
+        return
+    except Exception as e:
+        again = queue.fail(job, f"{type(e).__name__}: {e}", retry=True)
+        log(f"Ingesta {job.id[:8]} ({job.source}) falló: {type(e).__name__}: {e}" + (" → reintento" if again else ""))
+        return
+    queue.finish(job, res)
+    log(f"Ingesta {job.id[:8]} ({job.source}): {res.chunks} fragmentos")
+
+class JobWorkers:
+    """`workers` tareas asyncio que toman trabajos de la cola y los corren en hilos."""
+
+    def __init__(self, queue: JobQueue, workers: int = CFG.ingest_workers, idle_s: float = 1.0):
+        self.queue = queue
+        self.workers = max(1, workers)
+        self.idle_s = idle_s
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def notify(self) -> None:
+        """Despierta a un worker ocioso (se puede llamar desde cualquier hilo)."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _worker(self) -> None:
+        assert self._wake is not None
+        errors = 0
+        while True:
+            try:
+                claimed = await asyncio.to_thread(self.queue.claim)
+                if claimed is None:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=self.idle_s)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await asyncio.to_thread(run_job, self.queue, *claimed)
+                errors = 0
+            except Exception as e:
+                # Por qué: un error de la cola (p. ej. SQLite bloqueado) no debe matar al worker
+                # en silencio; se registra y se vuelve a intentar con espera creciente.
+                errors += 1
+                wait = min(30.0, self.idle_s * 2 ** min(errors, 5))
+                log(f"Worker de ingesta: {type(e).__name__}: {e} → reintento en {wait:.0f}s")
+                await asyncio.sleep(wait)
+
+    async def _heartbeat(self) -> None:
+        # Latido de los trabajos propios y rescate de los ajenos abandonados, cada stale/4.
+        every = max(1.0, CFG.ingest_stale_s / 4)
+        while True:
+            await asyncio.sleep(every)
+            try:
+                await asyncio.to_thread(self.queue.heartbeat)
+                if await asyncio.to_thread(self.queue.recover):
+                    self.notify()
+            except Exception as e:
+                log(f"Latido de ingesta: {type(e).__name__}: {e}")
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.queue.recover()
+        self.queue.prune()
+        counts = lambda: {(s,): float(n) for s, n in self.queue.counts().items() if s in (QUEUED, RUNNING)}  # noqa: E731
+        INGEST_JOBS_PENDING.set_function(counts)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self) -> None:
+        # Un trabajo a mitad sigue en su hilo hasta terminar; si el proceso sale antes,
+        # queda "running" sin latido y `recover` lo reencola pasados INGEST_STALE_S.
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
@@ -0,0 +1,189 @@
+from __future__ import annotations
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from .config import CFG
+from .logging import log
+
+_WORD = re.compile(r"\w+")
+
+# Palabras vacías del español (sin tildes, ya normalizadas).
+STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes como con contra cual cuales cuando de del desde donde
+durante e el ella ellas ellos en entre era eran es esa esas ese eso esos esta estan estas este esto estos fue
+fueron ha han hay la las le les lo los mas me mi mis muy no nos o otra otras otro otros para pero por porque
+que quien quienes se sea segun ser si sin sobre son su sus tambien te tiene tienen todo todos tu tus un una
+unas uno unos y ya yo cual cuanto cuantos hace hacer puede pueden debe deben
+""".split())
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFD", text.casefold())
+    return "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+
+def _stem(tok: str) -> str:
+    # Por qué: basta con unificar plurales ("metas"→"meta", "procesos"→"proceso");
+    # siglas y palabras cortas (CSAT, NPS, SLA) quedan intactas.
+    if len(tok) > 5 and tok.endswith("es") and tok[-3] not in "aeiou":
+        return tok[:-2]
+    if len(tok) > 4 and tok.endswith("s") and tok[-2] in "aeiou":
+        return tok[:-1]
+    return tok
+
+def tokenize(text: str) -> List[str]:
+    """Tokens en español: minúsculas, sin tildes, sin palabras vacías y con plurales simples recortados."""
+    return [_stem(t) for t in _WORD.findall(_fold(text)) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id TEXT PRIMARY KEY, source TEXT NOT NULL, chunk INTEGER NOT NULL, len INTEGER NOT NULL, text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_source ON docs(source);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_id ON postings(id);
+"""
+_SQL_VARS = 500
+
+@dataclass
+class LexicalHit:
+    id: str
+    source: str
+    chunk: int
+    text: str
+    score: float
+    coverage: float  # fracción de términos de la consulta presentes en el chunk
+
+class LexicalIndex:
+    """Índice invertido BM25 persistente (SQLite), mantenido junto a la colección."""
+
+    def __init__(self, path: Path, k1: float = 1.2, b: float = 0.75):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.k1, self.b = k1, b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, ids: Sequence[str], metas: Sequence[Dict], texts: Sequence[str]) -> None:
+        docs, posts = [], []
+        for cid, meta, text in zip(ids, metas, texts):
+            toks = tokenize(text)
+            docs.append((cid, meta.get("source", "unk"), int(meta.get("chunk", 0)), len(toks), text))
+            posts += [(term, cid, tf) for term, tf in Counter(toks).items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._delete(ids)
+            self._conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?, ?)", docs)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", posts)
+            self._conn.execute("COMMIT")
+
+    def _delete(self, ids: Sequence[str]) -> None:
+        ids = list(ids)
+        for i in range(0, len(ids), _SQL_VARS):
+            part = ids[i : i + _SQL_VARS]
+            marks = ",".join("?" * len(part))
+            self._conn.execute(f"DELETE FROM postings WHERE id IN ({marks})", part)
+            self._conn.execute(f"DELETE FROM docs WHERE id IN ({marks})", part)
+
+    def delete_ids(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._delete(list(ids))
+            self._conn.execute("COMMIT")
+
+    def delete_source(self, source: str) -> None:
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute("SELECT id FROM docs WHERE source = ?", (source,))]
+            self._conn.execute("BEGIN")
+            self._delete(ids)
+            self._conn.execute("COMMIT")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def rebuild_from(self, col, page: int = 2000) -> int:
+        """Reconstruye todo desde los documentos de la colección Chroma."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("COMMIT")
+        n = col.count()
+        for off in range(0, n, page):
+            r = col.get(include=["documents", "metadatas"], limit=page, offset=off)
+            self.add(r["ids"], r["metadatas"], r["documents"])
+        log(f"BM25: índice reconstruido con {n} fragmentos ({self.path.name})")
+        return n
+
+    def search(self, query: str, k: int = 8) -> List[LexicalHit]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k <= 0:
+            return []
+        with self._lock:
+            n_docs, avgdl = self._conn.execute("SELECT COUNT(*), AVG(len) FROM docs").fetchone()
+            if not n_docs:
+                return []
+            marks = ",".join("?" * len(terms))
+            rows = self._conn.execute(
+                f"SELECT p.term, p.id, p.tf, d.len FROM postings p JOIN docs d ON d.id = p.id WHERE p.term IN ({marks})",
+                terms,
+            ).fetchall()
+        df = Counter(term for term, _, _, _ in rows)
+        scores: Dict[str, float] = {}
+        matched: Dict[str, int] = {}
+        avgdl = avgdl or 1.0
+        for term, cid, tf, dl in rows:
+            idf = math.log(1 + (n_docs - df[term] + 0.5) / (df[term] + 0.5))
+            scores[cid] = scores.get(cid, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / avgdl))
+            matched[cid] = matched.get(cid, 0) + 1
+        top = sorted(scores.items(), key=lambda x: -x[1])[:k]
+        if not top:
+            return []
+        with self._lock:
+            marks = ",".join("?" * len(top))
+            docs = {
+                r[0]: r[1:]
+                for r in self._conn.execute(f"SELECT id, source, chunk, text FROM docs WHERE id IN ({marks})", [c for c, _ in top])
+            }
+        return [
+            LexicalHit(cid, *docs[cid], score=s, coverage=matched[cid] / len(terms))
+            for cid, s in top
+            if cid in docs
+        ]
+
+def lexical_path(db_path: Path, collection: str) -> Path:
+    return db_path / f"{collection}.bm25.sqlite3"
+
+_INDEXES: Dict[Tuple[str, str], LexicalIndex] = {}
+_LOCK = threading.Lock()
+
+def get_lexical_index(db_path: Path = CFG.db_path, collection: str = CFG.collection) -> Optional[LexicalIndex]:
+    """Índice BM25 compartido del proceso; None si LEXICAL=0."""
+    if not CFG.lexical:
+        return None
+    key = (str(db_path), collection)
+    with _LOCK:
+        idx = _INDEXES.get(key)
+        if idx is None:
+            idx = _INDEXES[key] = LexicalIndex(lexical_path(db_path, collection))
+        return idx
+
+def close_lexical_index(db_path: Path, collection: str) -> None:
+    with _LOCK:
+        idx = _INDEXES.pop((str(db_path), collection), None)
+    if idx is not None:
+        idx.close()
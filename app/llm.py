@@ -1,13 +1,78 @@
 from __future__ import annotations
-from typing import Dict, Any
-import ollama
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+from .metrics import LLM_TOKENS, STAGE_SECONDS, timed
+
+if TYPE_CHECKING:
+    import ollama
+
+_ASYNC_CLIENT: Optional[ollama.AsyncClient] = None
+
+def _messages(system_prompt: str, user_prompt: str) -> List[Dict[str, str]]:
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
 
 def chat(model: str, system_prompt: str, user_prompt: str, temperature: float = 0.3) -> str:
     # Por qué: centralizamos llamada para poder interceptar/streaming luego.
-    r: Dict[str, Any] = ollama.chat(
+    import ollama
+
+    with timed("llm.generate"):
+        r: Dict[str, Any] = ollama.chat(
+            model=model,
+            messages=_messages(system_prompt, user_prompt),
+            options={"temperature": temperature},
+        )
+    _count_tokens(r or {})
+    return (r or {}).get("message", {}).get("content", "").strip()
+
+def _count_tokens(part: Dict[str, Any]) -> None:
+    LLM_TOKENS.inc(part.get("prompt_eval_count") or 0, kind="prompt")
+    LLM_TOKENS.inc(part.get("eval_count") or 0, kind="completion")
+
+def _async_client() -> ollama.AsyncClient:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        import ollama
+
+        _ASYNC_CLIENT = ollama.AsyncClient()
+    return _ASYNC_CLIENT
+
+def _ms(ns: Any) -> Optional[float]:
+    return round(ns / 1e6, 1) if isinstance(ns, (int, float)) else None
+
+async def chat_stream(
+    model: str, system_prompt: str, user_prompt: str, temperature: float = 0.3
+) -> AsyncIterator[Dict[str, Any]]:
+    """Genera tokens sin bloquear el event loop.
+
+    Produce {"type": "token", "content": str} por fragmento y un último
+    {"type": "done", "usage": {...}, "timings": {...}} con los contadores de Ollama.
+    """
+    stream = await _async_client().chat(
         model=model,
-        messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+        messages=_messages(system_prompt, user_prompt),
         options={"temperature": temperature},
+        stream=True,
     )
-    return (r or {}).get("message", {}).get("content", "").strip()
-
+    async for part in stream:
+        content = (part.get("message") or {}).get("content") or ""
+        if content:
+            yield {"type": "token", "content": content}
+        if part.get("done"):
+            _count_tokens(part)
+            if isinstance(part.get("total_duration"), (int, float)):
+                STAGE_SECONDS.observe(part["total_duration"] / 1e9, stage="llm.stream")
+            prompt_tokens = part.get("prompt_eval_count") or 0
+            completion_tokens = part.get("eval_count") or 0
+            yield {
+                "type": "done",
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+                "timings": {
+                    "total_ms": _ms(part.get("total_duration")),
+                    "load_ms": _ms(part.get("load_duration")),
+                    "prompt_eval_ms": _ms(part.get("prompt_eval_duration")),
+                    "eval_ms": _ms(part.get("eval_duration")),
+                },
+            }
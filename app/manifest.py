@@ -0,0 +1,45 @@
+from __future__ import annotations
+import json
+import os
+from dataclasses import asdict, dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict, Tuple
+from .logging import log
+
+@dataclass
+class FileEntry:
+    path: str
+    size: int
+    mtime: float
+    sha256: str
+    chunks: int = 0
+
+def manifest_path(db_path: Path, collection: str) -> Path:
+    return db_path / f"{collection}.manifest.json"
+
+def file_sha256(fp: Path, block: int = 1 << 20) -> str:
+    h = sha256()
+    with open(fp, "rb") as f:
+        for buf in iter(lambda: f.read(block), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+def load_manifest(path: Path) -> Tuple[Dict[str, Any], Dict[str, FileEntry]]:
+    """Devuelve (parámetros con los que se indexó, entradas por source)."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        files = {k: FileEntry(**v) for k, v in data.get("files", {}).items()}
+        return data.get("params", {}), files
+    except FileNotFoundError:
+        return {}, {}
+    except Exception as e:
+        log(f"Manifest ilegible ({path.name}): {e}. Se reindexa todo.")
+        return {}, {}
+
+def save_manifest(path: Path, params: Dict[str, Any], files: Dict[str, FileEntry]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    data = {"params": params, "files": {k: asdict(v) for k, v in sorted(files.items())}}
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)  # Por qué: reemplazo atómico; un corte no deja el manifest a medias.
@@ -0,0 +1,230 @@
+from __future__ import annotations
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Métricas en proceso con salida en formato de texto de Prometheus (sin dependencias).
+# `timed(stage)` alimenta el histograma por etapa y, si hay una traza activa en el
+# request (`trace_request`), también los tiempos que /chat puede devolver en meta.
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: etiquetas {sorted(labels)} != {sorted(self.labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def _labels(self, key: LabelKey, extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labels, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelKey, float] = {} if self.labels else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelKey, float] = {}
+        self._fn: Optional[Callable[[], Dict[LabelKey, float]]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_function(self, fn: Callable[[], float | Dict[LabelKey, float]]) -> None:
+        """Valor calculado al momento del scrape (p. ej. tamaño de la colección)."""
+
+        def wrapped() -> Dict[LabelKey, float]:
+            v = fn()
+            return v if isinstance(v, dict) else {(): float(v)}
+
+        self._fn = wrapped
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._fn is not None:
+            try:
+                values.update(self._fn())
+            except Exception:
+                pass  # un scrape no debe fallar porque la colección no esté disponible
+        return [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in sorted(values.items())]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = _DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}  # (conteos por bucket, [suma, total])
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, acc = self._series.setdefault(key, ([0] * len(self.buckets), [0.0, 0.0]))
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+                    break
+            acc[0] += value
+            acc[1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = {k: (list(c), list(a)) for k, (c, a) in self._series.items()}
+        out = []
+        for key, (counts, (total, n)) in sorted(series.items()):
+            cum = 0
+            for b, c in zip(self.buckets, counts):
+                cum += c
+                le = 'le="' + _fmt(b) + '"'
+                out.append(f"{self.name}_bucket{self._labels(key, le)} {cum}")
+            out.append(f"{self.name}_sum{self._labels(key)} {_fmt(total)}")
+            out.append(f"{self.name}_count{self._labels(key)} {_fmt(n)}")
+        return out
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for m in self._metrics for line in m.render()) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "asistente_stage_seconds", "Duración por etapa (chat, chat_stream, retrieve.*, embed, llm.*, index.*).", ["stage"]
+))
+HTTP_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "asistente_http_request_seconds", "Duración de los requests HTTP hasta el inicio de la respuesta.",
+    ["method", "route", "status"],
+))
+CACHE_EVENTS: Counter = REGISTRY.register(Counter(
+    "asistente_cache_events_total", "Aciertos y fallos por cache.", ["cache", "result"]
+))
+LLM_TOKENS: Counter = REGISTRY.register(Counter(
+    "asistente_llm_tokens_total", "Tokens procesados por el modelo de chat.", ["kind"]
+))
+EMBEDDED_TEXTS: Counter = REGISTRY.register(Counter(
+    "asistente_embedded_texts_total", "Textos enviados al modelo de embeddings."
+))
+INDEXED_CHUNKS: Counter = REGISTRY.register(Counter(
+    "asistente_indexed_chunks_total", "Fragmentos escritos en la colección."
+))
+DEDUP_CHUNKS: Counter = REGISTRY.register(Counter(
+    "asistente_dedup_chunks_total", "Fragmentos casi duplicados enlazados en vez de embebidos."
+))
+DEDUP_BYTES: Counter = REGISTRY.register(Counter(
+    "asistente_dedup_bytes_total", "Bytes de texto de los fragmentos enlazados (no embebidos ni guardados)."
+))
+ERRORS: Counter = REGISTRY.register(Counter(
+    "asistente_errors_total", "Errores por etapa o endpoint.", ["where"]
+))
+COLLECTION_CHUNKS: Gauge = REGISTRY.register(Gauge(
+    "asistente_collection_chunks", "Fragmentos en la colección (según el catálogo)."
+))
+COLLECTION_SOURCES: Gauge = REGISTRY.register(Gauge(
+    "asistente_collection_sources", "Fuentes en la colección (según el catálogo)."
+))
+CACHE_ENTRIES: Gauge = REGISTRY.register(Gauge(
+    "asistente_cache_entries", "Entradas en memoria por cache.", ["cache"]
+))
+CHAT_ACTIVE: Gauge = REGISTRY.register(Gauge(
+    "asistente_chat_active", "Requests de /chat con cupo de generación."
+))
+CHAT_QUEUE_DEPTH: Gauge = REGISTRY.register(Gauge(
+    "asistente_chat_queue_depth", "Requests de /chat esperando cupo."
+))
+CHAT_QUEUE_WAIT: Histogram = REGISTRY.register(Histogram(
+    "asistente_chat_queue_wait_seconds", "Espera en la cola de /chat hasta obtener cupo."
+))
+CHAT_REJECTED: Counter = REGISTRY.register(Counter(
+    "asistente_chat_rejected_total", "Requests de /chat rechazados con 429.", ["reason"]
+))
+CHAT_COALESCED: Counter = REGISTRY.register(Counter(
+    "asistente_chat_coalesced_total", "Requests de /chat que compartieron una generación idéntica en vuelo."
+))
+INGEST_JOBS: Counter = REGISTRY.register(Counter(
+    "asistente_ingest_jobs_total", "Trabajos de ingesta por resultado (queued, done, failed, retried).", ["status"]
+))
+INGEST_JOBS_PENDING: Gauge = REGISTRY.register(Gauge(
+    "asistente_ingest_jobs", "Trabajos de ingesta en cola o en proceso.", ["status"]
+))
+
+_TRACE: ContextVar[Optional[Dict[str, float]]] = ContextVar("asistente_trace", default=None)
+
+@contextmanager
+def trace_request() -> Iterator[Dict[str, float]]:
+    """Activa la traza del request actual: `timed` acumula ahí ms por etapa."""
+    trace: Dict[str, float] = {}
+    token = _TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        _TRACE.reset(token)
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(where=stage)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage=stage)
+        trace = _TRACE.get()
+        if trace is not None:
+            trace[stage] = round(trace.get(stage, 0.0) + dt * 1000, 2)
@@ -1,26 +1,257 @@
 from __future__ import annotations
 import glob
+import multiprocessing
+import signal
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List
+from typing import Deque, Iterator, List, Optional, Sequence, Tuple
 from pypdf import PdfReader
+from .config import CFG
 from .logging import log
 
 def find_pdfs(path: Path) -> List[Path]:
     pdfs = set(glob.glob(str(path / "*.pdf"))) | set(glob.glob(str(path / "*.PDF")))
     return sorted(Path(p) for p in pdfs)
 
-def load_pdf_text(fp: Path) -> str:
+class _PageTimeout(Exception):
+    pass
+
+def _on_alarm(signum, frame):
+    raise _PageTimeout()
+
+@contextmanager
+def _time_limit(seconds: float):
+    # Por qué: SIGALRM solo existe en POSIX y solo se puede armar desde el hilo principal;
+    # en otro caso la página corre sin límite (el pool aplica un límite por tarea).
+    if seconds <= 0 or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    old = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old)
+
+def _page_text(reader: PdfReader, i: int, name: str, page_timeout: float) -> str:
+    try:
+        with _time_limit(page_timeout):
+            txt = reader.pages[i].extract_text() or ""
+    except _PageTimeout:
+        log(f"Advertencia: la página {i} de {name} superó {page_timeout:.0f}s; se omite.")
+        txt = ""
+    except Exception as e:
+        log(f"Advertencia: no pude extraer texto de la página {i} en {name}: {e}")
+        txt = ""
+    return " ".join(txt.split())
+
+def _extract_pages(fp: str, start: int, end: int, page_timeout: float) -> List[str]:
+    name = Path(fp).name
+    try:
+        reader = PdfReader(fp)
+    except Exception as e:
+        log(f"Error leyendo {name}: {e}")
+        return [""] * (end - start)
+    return [_page_text(reader, i, name, page_timeout) for i in range(start, end)]
+
+def iter_pdf_pages(fp: Path, page_timeout: float = CFG.pdf_page_timeout) -> Iterator[str]:
+    """Texto por página, de a una: en memoria queda solo la página actual."""
     try:
         reader = PdfReader(str(fp))
-        texts = []
-        for i, page in enumerate(reader.pages):
-            try:
-                txt = page.extract_text() or ""
-            except Exception as e:
-                log(f"Advertencia: no pude extraer texto de la página {i} en {fp.name}: {e}")
-                txt = ""
-            texts.append(txt)
-        return " ".join(" ".join(t.split()) for t in texts).strip()
     except Exception as e:
         log(f"Error leyendo {fp.name}: {e}")
-        return ""
\ No newline at end of file
+        return
+    for i in range(len(reader.pages)):
+        yield _page_text(reader, i, fp.name, page_timeout)
+
+def _page_count(fp: Path) -> int:
+    try:
+        return len(PdfReader(str(fp)).pages)
+    except Exception as e:
+        log(f"Error leyendo {fp.name}: {e}")
+        return 0
+
+def join_pages(pages: Sequence[str]) -> str:
+    return " ".join(pages).strip()
+
+def load_pdf_pages(fp: Path, page_timeout: float = CFG.pdf_page_timeout) -> List[str]:
+    """Texto por página, con espacios normalizados."""
+    return list(iter_pdf_pages(fp, page_timeout))
+
+def load_pdf_text(fp: Path) -> str:
+    return join_pages(load_pdf_pages(fp))
+
+def _kill_pool(pool: ProcessPoolExecutor) -> None:
+    """Cierra el pool sin esperar: un worker colgado en una página no termina nunca por su cuenta."""
+    procs = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for proc in procs:
+        if proc.is_alive():
+            proc.kill()
+
+class PdfPool:
+    """Pool de procesos de larga vida, compartido por los hilos que extraen PDFs subidos por la API.
+
+    Por qué: un ProcessPoolExecutor por archivo hace fork del server (con todos sus hilos) en
+    cada subida. Este se crea una vez, con procesos `spawn`, y solo se reemplaza cuando hay
+    que matarlo por un rango de páginas colgado.
+    """
+
+    def __init__(self, workers: int = CFG.pdf_workers):
+        self.workers = max(1, workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def replace(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Mata `broken` si sigue siendo el vigente; si otro hilo ya lo reemplazó, usa el nuevo."""
+        with self._lock:
+            if self._pool is broken:
+                _kill_pool(broken)
+                self._pool = None
+        return self.get()
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            _kill_pool(pool)
+
+_PDF_POOL: Optional[PdfPool] = None
+_PDF_POOL_LOCK = threading.Lock()
+
+def get_pdf_pool() -> PdfPool:
+    global _PDF_POOL
+    with _PDF_POOL_LOCK:
+        if _PDF_POOL is None:
+            _PDF_POOL = PdfPool()
+        return _PDF_POOL
+
+def close_pdf_pool() -> None:
+    global _PDF_POOL
+    with _PDF_POOL_LOCK:
+        pool, _PDF_POOL = _PDF_POOL, None
+    if pool is not None:
+        pool.close()
+
+def extract_pdfs(
+    paths: Sequence[Path],
+    workers: int = CFG.pdf_workers,
+    pages_per_task: int = CFG.pdf_pages_per_task,
+    page_timeout: float = CFG.pdf_page_timeout,
+    shared: Optional[PdfPool] = None,
+) -> Iterator[Tuple[Path, Iterator[str]]]:
+    """Produce (pdf, páginas) en el mismo orden de `paths`, repartiendo rangos de páginas en procesos.
+
+    Las páginas de cada PDF se entregan a medida que llegan sus rangos; hay que consumirlas
+    antes de pedir el siguiente PDF. Como mucho hay `2 * workers` rangos en vuelo, así que
+    la memoria no crece con el tamaño de los documentos ni del corpus.
+
+    Con `workers=1` también se usa un proceso aparte: el límite por página (SIGALRM) solo
+    funciona en el hilo principal, y quien consume suele ser un hilo del pipeline o del
+    server. `workers=0` extrae en este proceso, sin límite fuera del hilo principal.
+    Con `shared` se usan los procesos de ese pool (y su tamaño) en lugar de crear uno.
+    """
+    if shared is not None:
+        workers = shared.workers
+    elif workers <= 0:
+        for fp in paths:
+            yield fp, iter_pdf_pages(fp, page_timeout)
+        return
+
+    def plan() -> Iterator[Tuple[Path, int, int, bool]]:
+        for fp in paths:
+            n = _page_count(fp)
+            if n == 0:
+                yield fp, 0, 0, True
+            for start in range(0, n, pages_per_task):
+                end = min(n, start + pages_per_task)
+                yield fp, start, end, end == n
+
+    tasks = plan()
+    pool = shared.get() if shared is not None else ProcessPoolExecutor(max_workers=workers)
+    inflight: Deque = deque()
+
+    def submit(fp: Path, start: int, end: int):
+        return pool.submit(_extract_pages, str(fp), start, end, page_timeout) if end > start else None
+
+    def fill() -> None:
+        while len(inflight) < 2 * workers:
+            nxt = next(tasks, None)
+            if nxt is None:
+                return
+            fp, start, end, last = nxt
+            inflight.append((fp, start, end, last, submit(fp, start, end)))
+
+    def restart() -> None:
+        # El rango vencido sigue ocupando un proceso: se mata el pool y los rangos en vuelo
+        # que no habían terminado se reenvían a uno nuevo.
+        nonlocal pool
+        if shared is not None:
+            pool = shared.replace(pool)
+        else:
+            _kill_pool(pool)
+            pool = ProcessPoolExecutor(max_workers=workers)
+        for k, (fp, start, end, last, fut) in enumerate(inflight):
+            if fut is not None and not (fut.done() and not fut.cancelled() and fut.exception() is None):
+                inflight[k] = (fp, start, end, last, submit(fp, start, end))
+
+    def pages_of() -> Iterator[str]:
+        retried = False
+        while inflight:
+            fp, start, end, last, fut = inflight.popleft()
+            pages: List[str] = []
+            if fut is not None:
+                try:
+                    # Límite de respaldo por tarea (p. ej. Windows, sin SIGALRM en el worker).
+                    pages = fut.result(timeout=page_timeout * (end - start) + 30 if page_timeout > 0 else None)
+                except (BrokenProcessPool, CancelledError) as e:
+                    if shared is None or retried:
+                        log(f"Advertencia: falló la extracción de páginas {start}-{end - 1} de {fp.name}: {e!r}")
+                        pages = [""] * (end - start)
+                    else:
+                        # Otro hilo mató el pool compartido (una página colgada suya): lo que corría
+                        # falla con BrokenProcessPool y lo que esperaba turno queda cancelado. Se reenvía una vez.
+                        inflight.appendleft((fp, start, end, last, fut))
+                        restart()
+                        retried = True
+                        continue
+                except FutureTimeout:
+                    log(f"Advertencia: páginas {start}-{end - 1} de {fp.name} excedieron el tiempo; se omiten.")
+                    pages = [""] * (end - start)
+                    restart()
+                except Exception as e:
+                    log(f"Advertencia: falló la extracción de páginas {start}-{end - 1} de {fp.name}: {e}")
+                    pages = [""] * (end - start)
+            retried = False
+            fill()
+            yield from pages
+            if last:
+                return
+
+    try:
+        fill()
+        while inflight:
+            it = pages_of()
+            yield inflight[0][0], it
+            for _ in it:  # si el consumidor no terminó este PDF, se descarta el resto
+                pass
+    finally:
+        if shared is not None:
+            for *_, fut in inflight:  # el pool es de todos: solo se descartan los rangos propios
+                if fut is not None:
+                    fut.cancel()
+        elif inflight:
+            _kill_pool(pool)  # cancelado a mitad: no esperar rangos que ya nadie va a leer
+        else:
+            pool.shutdown()
@@ -0,0 +1,301 @@
+from __future__ import annotations
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+from .chunking import chunk_pages
+from .config import CFG
+from .db import delete_ids, existing_ids
+from .dedup import DedupIndex, DedupSession, Link, promote_orphans
+from .embeddings import embed_texts
+from .lexical import LexicalIndex
+from .logging import log
+from .metrics import INDEXED_CHUNKS, timed
+
+# Etapas: extraer → trocear → embeber → upsert, unidas por colas acotadas.
+# Cada etapa es un hilo; la memoria queda limitada por el tamaño de las colas.
+
+@dataclass
+class SourceResult:
+    key: Any
+    source: str
+    chunks: int = 0
+    new: int = 0
+    deleted: int = 0
+    linked: int = 0  # casi duplicados: enlazados a otro chunk, sin embedding propio
+    had_previous: bool = False
+
+@dataclass
+class PipelineStats:
+    sources: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    upserted: int = 0
+    deleted: int = 0
+    linked: int = 0
+    linked_bytes: int = 0
+    seconds: float = 0.0
+    results: List[SourceResult] = field(default_factory=list)
+
+@dataclass
+class _Chunk:
+    id: str
+    text: str
+    meta: dict
+    emb: Optional[List[float]] = None
+
+@dataclass
+class _SourceEnd:
+    result: SourceResult
+    stale: set
+    seen: set
+
+@dataclass
+class _SourceStart:
+    key: Any
+    source: str
+
+class _Cancelled(Exception):
+    pass
+
+_EOF = object()
+_SOURCE_PAGES_END = object()
+
+class IngestPipeline:
+    """Ingesta en etapas solapadas: mientras se embebe la fuente N ya se extrae la N+1.
+
+    `docs` produce tuplas (key, source, pages); las páginas pueden ser un iterador y viajan
+    de a una hasta el chunker, así que un manual grande nunca se junta entero en memoria.
+    Para cada fuente solo se embeben y suben los ids que no existen aún en la colección
+    (con `reuse=False` se re-embebe todo, sin pasar por el cache de embeddings: cambió el
+    modelo o se forzó el rebuild),
+    y al terminarla se borran los obsoletos y se llama `on_source_done(result)` (p. ej.
+    para guardar el manifest). Con `dedup`, los casi duplicados de un chunk ya aceptado
+    se enlazan a él en vez de embeberse.
+    """
+
+    def __init__(
+        self,
+        col,
+        id_fn: Callable[[str, int, str], str],
+        max_chars: int = CFG.max_chars,
+        overlap_chars: int = CFG.overlap_chars,
+        embed_model: str = CFG.embed_model,
+        upsert_batch: int = CFG.upsert_batch,
+        queue_size: int = CFG.pipeline_queue,
+        on_source_done: Optional[Callable[[SourceResult], None]] = None,
+        lexical: Optional[LexicalIndex] = None,
+        dedup: Optional[DedupIndex] = None,
+        reuse: bool = True,
+    ):
+        self.col = col
+        self.reuse = reuse
+        self.lexical = lexical
+        self.dedup = dedup
+        self._session = DedupSession(dedup) if dedup else None
+        self.id_fn = id_fn
+        self.max_chars = max_chars
+        self.overlap_chars = overlap_chars
+        self.embed_model = embed_model
+        self.upsert_batch = max(1, upsert_batch)
+        self.embed_group = max(1, CFG.embed_batch_size * CFG.embed_workers)
+        self.on_source_done = on_source_done
+        self.stats = PipelineStats()
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._q_pages: queue.Queue = queue.Queue(maxsize=max(1, queue_size) * CFG.pdf_pages_per_task)
+        self._q_chunks: queue.Queue = queue.Queue(maxsize=queue_size * self.embed_group)
+        self._q_embedded: queue.Queue = queue.Queue(maxsize=queue_size * self.upsert_batch)
+
+    # -- utilidades de colas que respetan la cancelación --
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        while True:
+            if self._stop.is_set():
+                raise _Cancelled()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue) -> Any:
+        while True:
+            if self._stop.is_set():
+                raise _Cancelled()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _stage(self, name: str, fn: Callable, *args) -> threading.Thread:
+        def run() -> None:
+            try:
+                fn(*args)
+            except _Cancelled:
+                pass
+            except BaseException as e:  # noqa: BLE001 — se re-lanza en run()
+                self._errors.append(e)
+                self._stop.set()
+        t = threading.Thread(target=run, name=f"ingest-{name}", daemon=True)
+        t.start()
+        return t
+
+    # -- etapas --
+    def _extract(self, docs: Iterable[Tuple[Any, str, Iterable[str]]]) -> None:
+        try:
+            for key, source, pages in docs:
+                self._put(self._q_pages, _SourceStart(key, source))
+                for page in pages:
+                    self._put(self._q_pages, page)
+                self._put(self._q_pages, _SOURCE_PAGES_END)
+            self._put(self._q_pages, _EOF)
+        finally:
+            close = getattr(docs, "close", None)
+            if close:
+                close()  # cierra el pool de extracción si se cancela a mitad
+
+    def _pages(self) -> Iterator[str]:
+        while (page := self._get(self._q_pages)) is not _SOURCE_PAGES_END:
+            yield page
+
+    def _chunk(self) -> None:
+        while (item := self._get(self._q_pages)) is not _EOF:
+            source = item.source
+            old = existing_ids(self.col, source)
+            res = SourceResult(key=item.key, source=source, had_previous=bool(old))
+            seen: set = set()
+            stored: set = set()  # ids que quedan guardados en la colección tras esta fuente
+            # Por qué: los chunks previos de la misma fuente que no reaparecen se van a borrar;
+            # no pueden ser canónicos de la versión nueva.
+            allow = lambda other, src: src != source or other in seen  # noqa: E731
+            for c in chunk_pages(self._pages(), max_chars=self.max_chars, overlap_chars=self.overlap_chars):
+                cid = self.id_fn(source, c.index, c.text)
+                seen.add(cid)
+                res.chunks += 1
+                if self.reuse and cid in old:
+                    stored.add(cid)
+                    continue
+                meta = {"source": source, "chunk": c.index, **c.positions()}
+                if self._session is not None:
+                    hit, _ = self._session.check(cid, source, c.text, allow)
+                    if hit is not None:
+                        res.linked += 1
+                        self._put(self._q_chunks, Link(cid, source, hit[0], hit[1], c.text, meta))
+                        continue
+                res.new += 1
+                stored.add(cid)
+                self._put(self._q_chunks, _Chunk(cid, c.text, meta))
+            self._put(self._q_chunks, _SourceEnd(res, old - stored, seen))
+        self._put(self._q_chunks, _EOF)
+
+    def _embed(self) -> None:
+        pending: List[_Chunk] = []
+        links: List[Link] = []
+
+        def flush() -> None:
+            if pending:
+                embs = embed_texts([c.text for c in pending], self.embed_model, use_cache=self.reuse)
+                if len(embs) != len(pending):
+                    raise RuntimeError("Desalineación ids/docs/embeddings/metadatas.")
+                for c, e in zip(pending, embs):
+                    c.emb = e
+                    self._put(self._q_embedded, c)
+                self.stats.embedded += len(pending)
+                pending.clear()
+            # Por qué después: el canónico de un enlace puede ser un chunk de este mismo lote.
+            for link in links:
+                self._put(self._q_embedded, link)
+            links.clear()
+
+        while (item := self._get(self._q_chunks)) is not _EOF:
+            if isinstance(item, _SourceEnd):
+                flush()  # Por qué: todo chunk de la fuente debe llegar al upsert antes que su marcador.
+                self._put(self._q_embedded, item)
+                continue
+            if isinstance(item, Link):
+                links.append(item)
+                continue
+            pending.append(item)
+            if len(pending) >= self.embed_group:
+                flush()
+        flush()
+        self._put(self._q_embedded, _EOF)
+
+    def _upsert(self) -> None:
+        buf: List[_Chunk] = []
+        links: List[Link] = []
+
+        def flush() -> None:
+            if buf:
+                upsert()
+            if links and self.dedup is not None:
+                self.dedup.link(links)
+                self.stats.linked += len(links)
+                self.stats.linked_bytes += sum(len(lk.document.encode("utf-8")) for lk in links)
+            links.clear()
+
+        def upsert() -> None:
+            with timed("index.upsert"):
+                self.col.upsert(
+                    ids=[c.id for c in buf],
+                    documents=[c.text for c in buf],
+                    metadatas=[c.meta for c in buf],
+                    embeddings=[c.emb for c in buf],
+                )
+                if self.lexical:
+                    self.lexical.add([c.id for c in buf], [c.meta for c in buf], [c.text for c in buf])
+            if self._session is not None:
+                self._session.commit(c.id for c in buf)
+            INDEXED_CHUNKS.inc(len(buf))
+            self.stats.upserted += len(buf)
+            buf.clear()
+
+        while (item := self._get(self._q_embedded)) is not _EOF:
+            if isinstance(item, _SourceEnd):
+                flush()
+                res = item.result
+                res.deleted = delete_ids(self.col, item.stale)
+                if self.lexical and item.stale:
+                    self.lexical.delete_ids(item.stale)
+                if self.dedup is not None:
+                    self.dedup.delete_source(res.source, keep=item.seen)
+                    self.stats.upserted += promote_orphans(self.col, self.dedup, self.lexical, self.embed_model)
+                self.stats.sources += 1
+                self.stats.chunks += res.chunks
+                self.stats.deleted += res.deleted
+                self.stats.results.append(res)
+                dups = f", {res.linked} casi duplicados" if res.linked else ""
+                log(f"{res.source}: {res.chunks} fragmentos ({res.new} nuevos, {res.deleted} obsoletos{dups})")
+                if self.on_source_done:
+                    self.on_source_done(res)
+                continue
+            if isinstance(item, Link):
+                links.append(item)
+                continue
+            buf.append(item)
+            if len(buf) >= self.upsert_batch:
+                flush()
+        flush()
+
+    def run(self, docs: Iterable[Tuple[Any, str, Iterable[str]]]) -> PipelineStats:
+        t0 = time.perf_counter()
+        threads = [
+            self._stage("extract", self._extract, docs),
+            self._stage("chunk", self._chunk),
+            self._stage("embed", self._embed),
+            self._stage("upsert", self._upsert),
+        ]
+        for t in threads:
+            t.join()
+        self.stats.seconds = time.perf_counter() - t0
+        if self._errors:
+            raise self._errors[0]
+        if self.stats.embedded:
+            log(
+                f"Pipeline: {self.stats.embedded} fragmentos embebidos en {self.stats.seconds:.2f}s "
+                f"({self.stats.embedded / max(self.stats.seconds, 1e-9):.1f} chunks/s)"
+            )
+        if self.stats.linked:
+            log(f"Dedup: {self.stats.linked} casi duplicados enlazados ({self.stats.linked_bytes / 1024:.0f} KB sin embeber)")
+        return self.stats
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+import requests
+from .config import CFG
+from .logging import log
+
+def _has_model(names: List[str], model: str) -> bool:
+    return model in names or f"{model}:latest" in names
+
+def check_models(embed_model: str = CFG.embed_model, chat_model: str = CFG.chat_model) -> Dict[str, Any]:
+    """Chequeo barato: solo /api/tags (sin embeber ni generar)."""
+    r = requests.get(f"{CFG.ollama_url}/api/tags", timeout=3)
+    r.raise_for_status()
+    names = [m.get("name", "") for m in r.json().get("models", [])]
+    return {
+        "ollama": True,
+        "embed_model": _has_model(names, embed_model),
+        "chat_model": _has_model(names, chat_model),
+    }
+
+class ReadinessMonitor:
+    """Refresca el estado de los modelos en segundo plano; las sondas solo leen el último resultado."""
+
+    def __init__(self, interval_s: float = CFG.ready_interval, extra: Optional[Callable[[], Dict[str, Any]]] = None):
+        self.interval_s = interval_s
+        self.extra = extra
+        self._task: Optional[asyncio.Task] = None
+        self._state: Dict[str, Any] = {"ready": False, "status": "pending", "checked_at": None, "checks": {}}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self._state)
+
+    def _check(self) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            checks = check_models()
+            if self.extra:
+                checks.update(self.extra())
+            ready = all(v for v in checks.values() if isinstance(v, bool))
+            state = {"ready": ready, "status": "ready" if ready else "degraded", "checks": checks}
+        except Exception as e:
+            state = {"ready": False, "status": "unavailable", "checks": {"ollama": False}, "error": f"{type(e).__name__}: {e}"}
+        state["checked_at"] = time.time()
+        state["check_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return state
+
+    async def refresh(self) -> Dict[str, Any]:
+        state = await asyncio.to_thread(self._check)
+        if state["status"] != self._state.get("status"):
+            log(f"Readiness: {self._state.get('status')} → {state['status']}")
+        self._state = state
+        return state
+
+    async def _loop(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval_s)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
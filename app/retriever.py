@@ -1,46 +1,327 @@
 from __future__ import annotations
-from typing import List, Tuple
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextvars import copy_context
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 from .config import CFG
-from .embeddings import embed_text
-from .db import get_client, get_collection
+from .context import Hit, pack_context
+from .embed_cache import get_embedding_cache
+from .embeddings import embed_texts
+from .db import Store, get_store
+from .lexical import get_lexical_index
+from .logging import log
+from .metrics import CACHE_EVENTS, timed
+from .vector_index import NumpyIndex, load_index
+
+_PUNCT = re.compile(r"[^\w\s]")
+
+def normalize_query(query: str) -> str:
+    """Minúsculas, sin tildes ni puntuación y con espacios colapsados: '¿Qué es  CSAT?' == 'que es csat'.
+
+    La ñ se conserva: 'año' y 'ano' no son la misma consulta.
+    """
+    text = unicodedata.normalize("NFKD", query.casefold())
+    text = "".join(
+        ch for i, ch in enumerate(text) if not unicodedata.combining(ch) or (ch == "\u0303" and text[i - 1 : i] == "n")
+    )
+    return " ".join(_PUNCT.sub(" ", unicodedata.normalize("NFC", text)).split())
+
+class QueryEmbeddingCache:
+    """LRU en memoria de embeddings de consultas, opcionalmente respaldado por el cache en disco."""
+
+    _DISK_PREFIX = "\x00query:"  # espacio de claves propio dentro del cache de embeddings
+
+    def __init__(self, max_entries: int = CFG.query_cache_max, use_disk: bool = CFG.query_cache_disk):
+        self.max_entries = max_entries
+        self.use_disk = use_disk
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self.memory_hits = self.disk_hits = self.misses = 0
+        self._miss_ms = 0.0
+
+    def get(self, query: str, model: str = CFG.embed_model) -> Tuple[List[float], str]:
+        """Devuelve (embedding, origen) con origen en {"memory", "disk", "model"}."""
+        return self.get_many([query], model)[0]
+
+    def get_many(self, queries: Sequence[str], model: str = CFG.embed_model) -> List[Tuple[List[float], str]]:
+        """Como `get` para varias consultas: los fallos de memoria y disco van juntos en un solo lote al modelo."""
+        norms = [normalize_query(q) or q for q in queries]
+        out: List[Optional[Tuple[List[float], str]]] = [None] * len(queries)
+        with self._lock:
+            for i, norm in enumerate(norms):
+                emb = self._lru.get((model, norm))
+                if emb is not None:
+                    self._lru.move_to_end((model, norm))
+                    self.memory_hits += 1
+                    CACHE_EVENTS.inc(cache="query", result="memory")
+                    out[i] = (emb, "memory")
+        pending: Dict[str, str] = {}  # norm → texto original (consultas repetidas se embeben una vez)
+        for i, norm in enumerate(norms):
+            if out[i] is None:
+                pending.setdefault(norm, queries[i])
+        if not pending:
+            return out  # type: ignore[return-value]
+        found: Dict[str, Tuple[List[float], str]] = {}
+        disk = get_embedding_cache() if self.use_disk else None
+        if disk:
+            keys = list(pending)
+            for norm, emb in zip(keys, disk.get_many(model, [self._DISK_PREFIX + n for n in keys])):
+                if emb is not None:
+                    found[norm] = (emb, "disk")
+        misses = [n for n in pending if n not in found]
+        elapsed = 0.0
+        if misses:
+            t0 = time.perf_counter()
+            embs = embed_texts([pending[n] for n in misses], model, use_cache=False)
+            elapsed = (time.perf_counter() - t0) * 1000
+            if disk:
+                disk.put_many(model, [self._DISK_PREFIX + n for n in misses], embs)
+            found.update((n, (e, "model")) for n, e in zip(misses, embs))
+        CACHE_EVENTS.inc(len(found) - len(misses), cache="query", result="disk")
+        CACHE_EVENTS.inc(len(misses), cache="query", result="miss")
+        with self._lock:
+            self.misses += len(misses)
+            self._miss_ms += elapsed
+            self.disk_hits += len(found) - len(misses)
+            for norm, (emb, _) in found.items():
+                self._lru[(model, norm)] = emb
+                self._lru.move_to_end((model, norm))
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+        for i, norm in enumerate(norms):
+            if out[i] is None:
+                out[i] = found[norm]
+        return out  # type: ignore[return-value]
+
+    def peek(self, query: str, model: str = CFG.embed_model) -> Optional[List[float]]:
+        """Solo memoria, sin E/S: para el camino rápido antes de ir al pool."""
+        key = (model, normalize_query(query) or query)
+        with self._lock:
+            emb = self._lru.get(key)
+            if emb is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                CACHE_EVENTS.inc(cache="query", result="memory")
+            return emb
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            avg_miss = self._miss_ms / self.misses if self.misses else 0.0
+            return {
+                "entries": len(self._lru),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "avg_embed_ms": round(avg_miss, 2),
+                "saved_ms_est": round(hits * avg_miss, 1),
+            }
+
+query_cache = QueryEmbeddingCache()
+_POOL = ThreadPoolExecutor(max_workers=max(4, 2 * CFG.embed_workers), thread_name_prefix="retrieve")
+_INFLIGHT: Dict[Tuple[str, str], "Future[Tuple[List[float], str]]"] = {}
+_INFLIGHT_LOCK = threading.RLock()  # RLock: si el futuro ya terminó, el callback corre dentro del `with`
+
+def embed_query(query: str, model: str = CFG.embed_model) -> Tuple[List[float], str]:
+    return query_cache.get(query, model)
+
+def embed_query_future(query: str, model: str = CFG.embed_model) -> "Future[Tuple[List[float], str]]":
+    """Embedding de la consulta en segundo plano; consultas iguales en vuelo comparten el mismo futuro."""
+    hit = query_cache.peek(query, model)
+    if hit is not None:
+        done: Future = Future()
+        done.set_result((hit, "memory"))
+        return done
+    key = (model, normalize_query(query) or query)
+    with _INFLIGHT_LOCK:
+        fut = _INFLIGHT.get(key)
+        if fut is None:
+            fut = _INFLIGHT[key] = _POOL.submit(embed_query, query, model)
+            fut.add_done_callback(lambda f: _forget_inflight(key, f))
+        return fut
+
+def _forget_inflight(key: Tuple[str, str], fut: Future) -> None:
+    with _INFLIGHT_LOCK:
+        if _INFLIGHT.get(key) is fut:  # otro pedido pudo haber registrado un futuro nuevo
+            del _INFLIGHT[key]
+
+def embed_query_within(query: str, budget_ms: float = CFG.embed_budget_ms) -> Tuple[Optional[List[float]], str]:
+    """Como embed_query, pero devuelve (None, "timeout") si tarda más de `budget_ms` (0 = sin límite)."""
+    try:
+        return embed_query_future(query).result(timeout=budget_ms / 1000 if budget_ms > 0 else None)
+    except FutureTimeout:
+        return None, "timeout"
+
+_warned_versions: set = set()
+
+def _numpy_index(store: Store) -> Optional[NumpyIndex]:
+    idx = load_index(store.db_path, store.name)
+    version = store.version()
+    if idx is not None and idx.version == version:
+        return idx
+    # Por qué: un snapshot viejo respondería sin los últimos ingest; mejor Chroma hasta reexportar.
+    if version not in _warned_versions:
+        _warned_versions.add(version)
+        log(f"Snapshot NumPy ausente o desactualizado (índice v{version}); uso Chroma.")
+    return None
+
+def _search(
+    store: Store, idx: Optional[NumpyIndex], q_emb: List[float], k: int
+) -> Tuple[List[str], List[str], List[Dict[str, Any]], List[float]]:
+    if idx is not None:
+        r = idx.query(q_emb, k)
+        return r["ids"], r["documents"], r["metadatas"], r["distances"]
+    res = store.collection.query(query_embeddings=[q_emb], n_results=k, include=["documents", "metadatas", "distances"])
+    return (
+        res.get("ids", [[]])[0] or [],
+        res.get("documents", [[]])[0] or [],
+        res.get("metadatas", [[]])[0] or [],
+        res.get("distances", [[]])[0] or [],
+    )
+
+def _lexical_search(lexical, query: str, k: int):
+    with timed("retrieve.lexical"):
+        return lexical.search(query, k)
+
+def _search_many(
+    store: Store, idx: Optional[NumpyIndex], q_embs: List[List[float]], k: int
+) -> List[Tuple[List[str], List[str], List[Dict[str, Any]], List[float]]]:
+    """Una sola consulta a Chroma con varios `query_embeddings` (o una pasada por vector en NumPy)."""
+    if idx is not None or not q_embs:
+        return [_search(store, idx, q, k) for q in q_embs]
+    res = store.collection.query(query_embeddings=q_embs, n_results=k, include=["documents", "metadatas", "distances"])
+    cols = [res.get(f) or [[]] * len(q_embs) for f in ("ids", "documents", "metadatas", "distances")]
+    return [tuple(c[i] or [] for c in cols) for i in range(len(q_embs))]  # type: ignore[misc]
 
 def retrieve(
     query: str,
     k: int = max(8, CFG.top_k),                 # ↑ recall por defecto
     threshold: float = max(0.95, CFG.distance_threshold),  # ↑ umbral (cosine distance: menor = mejor)
     fallback_if_empty: bool = True,             # si nada pasa el umbral, usa el mejor vecino
+    store: Optional[Store] = None,
+    q_emb: Optional[List[float]] = None,        # embedding ya calculado de `query`
+    info: Optional[Dict[str, Any]] = None,      # se completa con el modo usado (vector/hybrid/lexical_only)
+    embed_budget_ms: Optional[float] = None,    # None = CFG.embed_budget_ms; 0 = esperar siempre
 ) -> Tuple[str, List[str], int]:
-    client = get_client(CFG.db_path); col = get_collection(client, CFG.collection)
-    try:
-        total = col.count()
-    except Exception:
-        total = len(col.get().get("ids", []))
+    store = store or get_store()
+    info = {} if info is None else info
+    idx = _numpy_index(store) if CFG.search_backend == "numpy" else None
+    total = len(idx) if idx is not None else store.count()
     if total == 0:
+        info["mode"] = "empty"
         return "", [], 0
 
     k = min(k, total)
-    q_emb = embed_text(query, CFG.embed_model)
-    res = col.query(query_embeddings=[q_emb], n_results=k, include=["documents", "metadatas", "distances"])
-    docs0 = res.get("documents", [[]])[0] or []
-    metas0 = res.get("metadatas", [[]])[0] or []
-    dists0 = res.get("distances", [[]])[0] or []
-
-    ctx_parts, sources, used = [], [], 0
-    for doc, meta, dist in zip(docs0, metas0, dists0):
-        if dist is not None and dist <= threshold:
-            tag = f"[{meta.get('source', 'unk')}#{meta.get('chunk', '?')}]"
-            ctx_parts.append(f"{tag} {doc}")
-            sources.append(tag)
-            used += 1
+    # BM25 corre en paralelo con el embedding de la consulta.
+    lexical = get_lexical_index(store.db_path, store.name)
+    lex_future = _POOL.submit(copy_context().run, _lexical_search, lexical, query, k) if lexical else None
+    emb_future = None
+    if q_emb is None:
+        budget = CFG.embed_budget_ms if embed_budget_ms is None else embed_budget_ms
+        emb_future = embed_query_future(query)
+        try:
+            with timed("retrieve.embed_wait"):
+                q_emb, _ = emb_future.result(timeout=budget / 1000 if budget > 0 else None)
+        except FutureTimeout:
+            info["embed_timeout"] = True
+    lex_hits = [h for h in (lex_future.result() if lex_future else []) if h.coverage >= CFG.lexical_min_coverage]
+
+    if q_emb is None:
+        if lex_hits:
+            # Modo degradado: el embedding excedió el presupuesto; respondemos con BM25.
+            info["mode"] = "lexical_only"
+            with timed("retrieve.pack"):
+                context, tags = pack_context([Hit(h.source, h.chunk, h.text) for h in lex_hits], info=info)
+            return context, tags, len(tags)
+        with timed("retrieve.embed_wait"):
+            q_emb, _ = emb_future.result()
+    with timed("retrieve.vector_search"):
+        hits = _search(store, idx, q_emb, k)
+    return _assemble(hits, lex_hits, k, threshold, fallback_if_empty, info)
+
+def _assemble(
+    hits: Tuple[List[str], List[str], List[Dict[str, Any]], List[float]],
+    lex_hits: List[Any],
+    k: int,
+    threshold: float,
+    fallback_if_empty: bool,
+    info: Dict[str, Any],
+) -> Tuple[str, List[str], int]:
+    ids0, docs0, metas0, dists0 = hits
+    # Fusión por rango recíproco (RRF) de los vecinos que pasan el umbral y los aciertos BM25.
+    fused: Dict[str, float] = {}
+    entries: Dict[str, Tuple[Any, Any, str]] = {}
+    for rank, (cid, doc, meta, dist) in enumerate(
+        (x for x in zip(ids0, docs0, metas0, dists0) if x[3] is not None and x[3] <= threshold)
+    ):
+        fused[cid] = fused.get(cid, 0.0) + 1.0 / (CFG.rrf_k + rank + 1)
+        entries[cid] = (meta.get("source", "unk"), meta.get("chunk", "?"), doc)
+    for rank, h in enumerate(lex_hits):
+        fused[h.id] = fused.get(h.id, 0.0) + 1.0 / (CFG.rrf_k + rank + 1)
+        entries.setdefault(h.id, (h.source, h.chunk, h.text))
+    info["mode"] = "hybrid" if lex_hits else "vector"
+
+    hits = [Hit(*entries[cid]) for cid in sorted(fused, key=lambda c: -fused[c])[:k]]
 
     # Fallback: usa el mejor vecino aunque supere el umbral
-    if used == 0 and fallback_if_empty and docs0:
+    low_conf = not hits and fallback_if_empty and bool(docs0)
+    if low_conf:
         best_idx = min(range(len(docs0)), key=lambda i: (dists0[i] if dists0[i] is not None else 1e9))
-        best_doc = docs0[best_idx]
         best_meta = metas0[best_idx]
-        tag = f"[{best_meta.get('source','unk')}#{best_meta.get('chunk','?')}]"
-        ctx_parts.append(f"{tag} {best_doc}")
-        sources.append(tag + " (low_conf)")
-        used = 1
+        hits = [Hit(best_meta.get("source", "unk"), best_meta.get("chunk", "?"), docs0[best_idx])]
 
-    return ("\n\n".join(ctx_parts), sources, used)
+    with timed("retrieve.pack"):
+        context, sources = pack_context(hits, info=info)
+    if low_conf:
+        sources = [f"{t} (low_conf)" for t in sources]
+    return context, sources, len(sources)
+
+def retrieve_many(
+    queries: Sequence[str],
+    k: Union[int, Sequence[int]] = max(8, CFG.top_k),
+    threshold: Union[float, Sequence[float]] = max(0.95, CFG.distance_threshold),
+    fallback_if_empty: bool = True,
+    store: Optional[Store] = None,
+    infos: Optional[List[Dict[str, Any]]] = None,
+) -> List[Tuple[str, List[str], int]]:
+    """`retrieve` para un lote: un embedding por lotes y una sola búsqueda vectorial para todas las consultas.
+
+    `k` y `threshold` pueden ser un valor común o uno por consulta. Sin presupuesto de
+    embedding: en lote siempre se espera al vector.
+    """
+    n = len(queries)
+    ks = [k] * n if isinstance(k, int) else list(k)
+    ths = [threshold] * n if isinstance(threshold, (int, float)) else list(threshold)
+    infos = [{} for _ in range(n)] if infos is None else infos
+    if not n:
+        return []
+    store = store or get_store()
+    idx = _numpy_index(store) if CFG.search_backend == "numpy" else None
+    total = len(idx) if idx is not None else store.count()
+    if total == 0:
+        for info in infos:
+            info["mode"] = "empty"
+        return [("", [], 0)] * n
+    ks = [min(x, total) for x in ks]
+    lexical = get_lexical_index(store.db_path, store.name)
+    lex_future = (
+        _POOL.submit(copy_context().run, lambda: [_lexical_search(lexical, q, kq) for q, kq in zip(queries, ks)])
+        if lexical else None
+    )
+    with timed("retrieve.embed_batch"):
+        q_embs = [emb for emb, _ in query_cache.get_many(queries)]
+    with timed("retrieve.vector_search_batch"):
+        results = _search_many(store, idx, q_embs, max(ks))
+    lex_all = lex_future.result() if lex_future else [[] for _ in queries]
+    out = []
+    for hits, lex, kq, th, info in zip(results, lex_all, ks, ths, infos):
+        hits = tuple(col[:kq] for col in hits)
+        lex = [h for h in lex if h.coverage >= CFG.lexical_min_coverage]
+        out.append(_assemble(hits, lex, kq, th, fallback_if_empty, info))
+    return out
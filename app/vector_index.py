@@ -0,0 +1,248 @@
+from __future__ import annotations
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .config import CFG
+from .logging import log
+
+# Snapshot en disco: <db>/snapshots/<colección>/<versión>/{vectors.npy, sqnorms.npy, rows.sqlite3, meta.json}
+# y un puntero CURRENT con la versión vigente. Los vectores se abren con mmap, así que
+# todos los workers de uvicorn comparten las mismas páginas del page cache. Ids, textos y
+# metadatos van en rows.sqlite3 (fila i = vector i) y se leen solo para los k resultados.
+
+def snapshot_root(db_path: Path, collection: str) -> Path:
+    return db_path / "snapshots" / collection
+
+def _space(col) -> str:
+    try:
+        return (col.configuration_json or {}).get("hnsw", {}).get("space") or "l2"
+    except Exception:
+        return (getattr(col, "metadata", None) or {}).get("hnsw:space", "l2")
+
+def export_snapshot(col, db_path: Path, collection: str, version: int, page: int = 5000, keep: int = CFG.snapshot_keep) -> Path:
+    """Vuelca ids, documentos, metadatos y vectores (float32 contiguo) de la colección."""
+    root = snapshot_root(db_path, collection)
+    out = root / str(version)
+    tmp = root / f".{version}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    n = col.count()
+    rows = sqlite3.connect(tmp / "rows.sqlite3")
+    rows.execute("CREATE TABLE rows (i INTEGER PRIMARY KEY, id TEXT NOT NULL, document TEXT, metadata TEXT)")
+    vecs = None
+    for off in range(0, n, page):
+        r = col.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=off)
+        emb = np.asarray(r["embeddings"], dtype=np.float32)
+        if vecs is None:
+            vecs = np.lib.format.open_memmap(tmp / "vectors.npy", mode="w+", dtype=np.float32, shape=(n, emb.shape[1]))
+        vecs[off : off + len(emb)] = emb
+        rows.executemany(
+            "INSERT INTO rows VALUES (?, ?, ?, ?)",
+            ((off + j, cid, doc, json.dumps(meta or {}, ensure_ascii=False))
+             for j, (cid, doc, meta) in enumerate(zip(r["ids"], r["documents"], r["metadatas"]))),
+        )
+    rows.commit()
+    rows.close()
+    if vecs is None:
+        vecs = np.zeros((0, 0), dtype=np.float32)
+        np.save(tmp / "vectors.npy", vecs)
+    np.save(tmp / "sqnorms.npy", np.einsum("ij,ij->i", vecs, vecs).astype(np.float32))
+    _export_quantized(vecs, tmp)
+    dim = int(vecs.shape[1])
+    if isinstance(vecs, np.memmap):
+        vecs.flush()
+    del vecs
+    meta = {"version": version, "space": _space(col), "dim": dim, "count": n}
+    (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    cur_tmp = root / f".CURRENT.{os.getpid()}.{threading.get_ident()}"  # pid + hilo: el server exporta desde varios
+    cur_tmp.write_text(str(version), encoding="utf-8")
+    os.replace(cur_tmp, root / "CURRENT")
+    _CHECKED.pop(str(root), None)  # este proceso ve la versión nueva ya, sin esperar SNAPSHOT_RECHECK_S
+    for old in sorted((p for p in root.iterdir() if p.is_dir() and p.name.isdigit()), key=lambda p: int(p.name))[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    log(f"Snapshot NumPy v{version}: {n} vectores dim={dim} ({meta['space']}) → {out}")
+    return out
+
+def _export_quantized(vecs: np.ndarray, out: Path, block: int = 8192) -> None:
+    """int8 escalar (escala por vector) y bits de signo empaquetados, para el escaneo previo."""
+    n, dim = vecs.shape
+    if n == 0:
+        np.save(out / "vectors_i8.npy", np.zeros((0, dim), dtype=np.int8))
+        np.save(out / "vectors_bits.npy", np.zeros((0, (dim + 7) // 8), dtype=np.uint8))
+        np.save(out / "scales.npy", np.zeros(0, dtype=np.float32))
+        return
+    codes = np.lib.format.open_memmap(out / "vectors_i8.npy", mode="w+", dtype=np.int8, shape=(n, dim))
+    scales = np.zeros(n, dtype=np.float32)
+    bits = np.lib.format.open_memmap(out / "vectors_bits.npy", mode="w+", dtype=np.uint8, shape=(n, (dim + 7) // 8))
+    for i in range(0, n, block):
+        v = np.asarray(vecs[i : i + block], dtype=np.float32)
+        s = np.abs(v).max(axis=1) / 127.0
+        s[s == 0] = 1.0
+        codes[i : i + block] = np.clip(np.rint(v / s[:, None]), -127, 127).astype(np.int8)
+        scales[i : i + block] = s
+        bits[i : i + block] = np.packbits(v > 0, axis=1)
+    np.save(out / "scales.npy", scales)
+    codes.flush(); bits.flush()
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:  # numpy < 2.0
+    _POP = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    _popcount = lambda a: _POP[a]  # noqa: E731
+
+class NumpyIndex:
+    """Búsqueda exacta: un producto matriz-vector sobre float32 contiguo + argpartition."""
+
+    def __init__(self, path: Path):
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        self.path = path
+        self.version: int = meta["version"]
+        self.space: str = meta["space"]
+        self.count: int = meta["count"]
+        # Por qué SQLite y no listas: con varios workers cada uno tendría en su heap todos los
+        # textos y metadatos; así solo se leen las k filas de cada resultado (y el mmap de
+        # SQLite comparte esas páginas entre procesos como las de vectors.npy).
+        self._rows = sqlite3.connect(f"file:{path / 'rows.sqlite3'}?mode=ro", uri=True, check_same_thread=False)
+        self._rows.execute("PRAGMA mmap_size = 268435456")
+        self._rows_lock = threading.Lock()
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self.sqnorms = np.load(path / "sqnorms.npy", mmap_mode="r")
+        # Representaciones cuantizadas (snapshots viejos pueden no tenerlas).
+        quant = (path / "vectors_i8.npy").exists()
+        self.codes = np.load(path / "vectors_i8.npy", mmap_mode="r") if quant else None
+        self.scales = np.load(path / "scales.npy") if quant else None
+        self.bits = np.load(path / "vectors_bits.npy", mmap_mode="r") if quant else None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def rows(self, idx: Sequence[int]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """(id, documento, metadatos) de las filas `idx`, en ese orden."""
+        if not len(idx):
+            return []
+        keys = [int(i) for i in idx]
+        with self._rows_lock:
+            found = {
+                i: (cid, doc, json.loads(meta))
+                for i, cid, doc, meta in self._rows.execute(
+                    f"SELECT i, id, document, metadata FROM rows WHERE i IN ({','.join('?' * len(keys))})", keys
+                )
+            }
+        return [found[i] for i in keys]
+
+    def _from_dots(self, dots: np.ndarray, sqnorms: np.ndarray, q: np.ndarray) -> np.ndarray:
+        if self.space == "cosine":
+            denom = np.sqrt(sqnorms) * float(np.linalg.norm(q))
+            return 1.0 - dots / np.maximum(denom, 1e-12)
+        if self.space == "ip":
+            return 1.0 - dots
+        # Misma métrica que Chroma "l2": distancia euclídea al cuadrado.
+        return sqnorms - 2.0 * dots + float(q @ q)
+
+    def distances(self, q: np.ndarray) -> np.ndarray:
+        return self._from_dots(self.vectors @ q, self.sqnorms, q)
+
+    def _approx_scores(self, q: np.ndarray, mode: str, block: int = 1024) -> np.ndarray:
+        """Puntaje aproximado (menor = mejor) usando solo la representación cuantizada."""
+        if mode == "binary":
+            qbits = np.packbits(q > 0)
+            return _popcount(np.bitwise_xor(self.bits, qbits)).sum(axis=1, dtype=np.int32)
+        dots = np.empty(self.count, dtype=np.float32)
+        for i in range(0, len(dots), block):  # por bloques: no materializa la matriz en float
+            dots[i : i + block] = np.asarray(self.codes[i : i + block], dtype=np.float32) @ q
+        return self._from_dots(dots * self.scales, self.sqnorms, q)
+
+    def query(
+        self, q_emb: List[float], k: int, mode: str = CFG.quantization, rerank: int = CFG.rerank_candidates
+    ) -> Dict[str, List[Any]]:
+        """`mode`: "none" (exacto), "int8" o "binary"; los cuantizados re-ordenan `rerank` candidatos en float32."""
+        n = self.count
+        if n == 0 or k <= 0:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        q = np.asarray(q_emb, dtype=np.float32)
+        k = min(k, n)
+        if mode in ("int8", "binary") and self.codes is not None and max(k, rerank) < n:
+            approx = self._approx_scores(q, mode)
+            cand = np.argpartition(approx, max(k, rerank) - 1)[: max(k, rerank)]
+            cand.sort()  # lectura secuencial de las filas float32 del mmap
+            dc = self._from_dots(self.vectors[cand] @ q, self.sqnorms[cand], q)
+            best = np.argsort(dc, kind="stable")[:k]
+            top, dsel = cand[best], dc[best]
+        else:
+            d = self.distances(q)
+            top = np.argpartition(d, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(d[top], kind="stable")]
+            dsel = d[top]
+        rows = self.rows(top)
+        return {
+            "ids": [r[0] for r in rows],
+            "documents": [r[1] for r in rows],
+            "metadatas": [r[2] for r in rows],
+            "distances": [float(x) for x in dsel],
+        }
+
+    def footprint(self) -> Dict[str, int]:
+        """Bytes por representación (lo que ocupa en RAM si se recorre entera)."""
+        out = {"float32": int(self.vectors.nbytes)}
+        if self.codes is not None:
+            out["int8"] = int(self.codes.nbytes + self.scales.nbytes)
+            out["binary"] = int(self.bits.nbytes)
+        return out
+
+_INDEXES: Dict[str, NumpyIndex] = {}
+_CHECKED: Dict[str, Tuple[float, Optional[str]]] = {}  # raíz → (monotonic de la lectura, contenido de CURRENT)
+_LOCK = threading.Lock()
+
+def snapshot_version(db_path: Path, collection: str) -> Optional[int]:
+    try:
+        return int((snapshot_root(db_path, collection) / "CURRENT").read_text(encoding="utf-8").strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def close_index(db_path: Path, collection: str) -> None:
+    key = str(snapshot_root(db_path, collection))
+    with _LOCK:
+        _INDEXES.pop(key, None)  # el mmap se libera con la última referencia
+        _CHECKED.pop(key, None)
+
+def _current(root: Path, recheck_s: float) -> Optional[str]:
+    """Contenido de CURRENT, releído como mucho cada `recheck_s` (no en cada consulta)."""
+    key, now = str(root), time.monotonic()
+    hit = _CHECKED.get(key)
+    if hit is not None and now - hit[0] < recheck_s:
+        return hit[1]
+    try:
+        current: Optional[str] = (root / "CURRENT").read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        current = None
+    _CHECKED[key] = (now, current)
+    return current
+
+def load_index(db_path: Path, collection: str, recheck_s: float = CFG.snapshot_recheck_s) -> Optional[NumpyIndex]:
+    """Índice del snapshot vigente; recarga sola si el indexador publicó otra versión
+    (otros procesos la ven a más tardar `recheck_s` después)."""
+    root = snapshot_root(db_path, collection)
+    current = _current(root, recheck_s)
+    if current is None:
+        return None
+    key = str(root)
+    idx = _INDEXES.get(key)
+    if idx is not None and str(idx.version) == current:
+        return idx
+    with _LOCK:
+        idx = _INDEXES.get(key)
+        if idx is None or str(idx.version) != current:
+            if not (root / current / "rows.sqlite3").exists():
+                return None  # snapshot de un formato anterior: Chroma hasta el próximo export
+            idx = NumpyIndex(root / current)
+            _INDEXES[key] = idx
+            log(f"Snapshot NumPy cargado: v{idx.version}, {len(idx)} vectores")
+        return idx
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .catalog import ensure_catalog
+from .config import CFG
+from .db import Store
+from .logging import log
+
+# Precalentamiento en segundo plano: el server acepta tráfico apenas arranca y, mientras
+# tanto, se abre la colección (y se pone al día su catálogo) y Ollama carga los modelos.
+# Luego se repite cada `interval_s` con keep_alive para que Ollama no los descargue entre ráfagas.
+
+def open_store(store: Store) -> None:
+    """Abre la colección y reconstruye el catálogo si quedó desalineado (bloqueante)."""
+    store.collection
+    try:
+        ensure_catalog(store)
+    except Exception as e:
+        # Por qué no falla el warm-up: sin catálogo /sources queda vacío, pero /chat funciona.
+        log(f"Catálogo: no se pudo reconstruir: {type(e).__name__}: {e}")
+
+def _load_models(embed_model: str, chat_model: str, keep_alive: str) -> None:
+    import ollama
+
+    # Por qué: embed de un texto corto y chat sin mensajes solo cargan el modelo (no generan).
+    ollama.embed(model=embed_model, input="ok", keep_alive=keep_alive)
+    ollama.chat(model=chat_model, messages=[], keep_alive=keep_alive)
+
+class Warmup:
+    def __init__(
+        self,
+        store: Store,
+        interval_s: float = CFG.warmup_interval,
+        keep_alive: str = CFG.ollama_keep_alive,
+        on_ready: Optional[Callable[[], Awaitable[Any]]] = None,
+    ):
+        self.store = store
+        self.interval_s = interval_s
+        self.keep_alive = keep_alive
+        self.on_ready = on_ready
+        self.done = False
+        self._task: Optional[asyncio.Task] = None
+        self._state: Dict[str, Any] = {"status": "pending", "store_ms": None, "models_ms": None, "pings": 0}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self._state)
+
+    async def _warm(self) -> None:
+        if self._state["store_ms"] is None:
+            t0 = time.perf_counter()
+            await asyncio.to_thread(open_store, self.store)
+            self._state["store_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        t0 = time.perf_counter()
+        await asyncio.to_thread(_load_models, CFG.embed_model, CFG.chat_model, self.keep_alive)
+        ms = round((time.perf_counter() - t0) * 1000, 1)
+        self._state["pings"] += 1
+        self._state["last_ping"] = time.time()
+        if not self.done:
+            self._state["models_ms"] = ms
+            log(f"Warm-up listo: colección {self._state['store_ms']} ms, modelos {ms} ms")
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self._warm()
+                self._state.pop("error", None)
+                self._state["status"] = "done"
+                if not self.done:
+                    self.done = True
+                    if self.on_ready:
+                        await self.on_ready()
+            except Exception as e:
+                # Ollama caído o modelo ausente: se reintenta en el próximo ciclo; readiness lo reporta.
+                self._state.update(status="error" if not self.done else "done", error=f"{type(e).__name__}: {e}")
+                log(f"Warm-up falló: {type(e).__name__}: {e}")
+            if self.interval_s <= 0 and self.done:
+                return
+            await asyncio.sleep(self.interval_s if self.interval_s > 0 else CFG.ready_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.batch import BatchItem, chat_batch  # noqa: E402
+from app.config import CFG  # noqa: E402
+from app.db import get_store  # noqa: E402
+from app.llm import chat  # noqa: E402
+from app.profiles import load_profile  # noqa: E402
+from app.prompts import build_system, build_user_prompt  # noqa: E402
+from app.retriever import retrieve  # noqa: E402
+
+QUESTIONS = [
+    "¿Qué es CSAT y cómo se calcula?",
+    "¿Cuál es la diferencia entre NPS y CSAT?",
+    "¿Qué mide el FCR?",
+    "¿Cómo reducir el AHT sin afectar la calidad?",
+    "¿Qué es un SLA en un centro de contacto?",
+    "Dame un ejemplo de escalamiento de un caso",
+]
+
+def _questions(n: int, tag: str) -> List[str]:
+    # Por qué: cada modo usa textos distintos para que el cache de embeddings no favorezca al segundo.
+    return [f"{QUESTIONS[i % len(QUESTIONS)]} ({tag} {i})" for i in range(n)]
+
+def sequential(store, questions: List[str], user_id: str) -> None:
+    """Lo que cuestan N llamadas a /chat una tras otra (sin el HTTP)."""
+    for q in questions:
+        context, _, used = retrieve(q, k=CFG.top_k, threshold=CFG.distance_threshold, store=store)
+        user_prompt = build_user_prompt(q, context)
+        if used == 0:
+            user_prompt += "\n\nNota: No se encontró contexto relevante."
+        chat(CFG.chat_model, build_system(load_profile(user_id)), user_prompt)
+
+def batched(store, questions: List[str], user_id: str, concurrency: int) -> int:
+    items = [BatchItem(user_id=user_id, message=q) for q in questions]
+    return sum(1 for r in chat_batch(items, store, concurrency) if "error" in r)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Throughput: N preguntas secuenciales vs /chat/batch (requiere Ollama).")
+    ap.add_argument("--db", default=str(CFG.db_path))
+    ap.add_argument("--collection", default=CFG.collection)
+    ap.add_argument("-n", type=int, default=24)
+    ap.add_argument("--concurrency", type=int, default=CFG.batch_concurrency)
+    ap.add_argument("--user", default="bench")
+    args = ap.parse_args()
+
+    store = get_store(Path(args.db), args.collection)
+    store.collection
+    retrieve("calentamiento", store=store)
+
+    t0 = time.perf_counter()
+    sequential(store, _questions(args.n, "sec"), args.user)
+    seq_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    errors = batched(store, _questions(args.n, "lote"), args.user, args.concurrency)
+    batch_s = time.perf_counter() - t0
+
+    print(f"preguntas={args.n} concurrencia={args.concurrency} modelo={CFG.chat_model}")
+    print(f"  secuencial: {seq_s:.2f}s ({args.n / seq_s:.2f} preg/s)")
+    print(f"        lote: {batch_s:.2f}s ({args.n / batch_s:.2f} preg/s, errores={errors})")
+    print(f"  aceleración: x{seq_s / batch_s:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.config import CFG  # noqa: E402
+from app.db import get_client, get_collection, get_store  # noqa: E402
+
+def _timeit(fn: Callable[[], object], n: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Overhead por request: abrir Chroma en cada llamada vs Store compartido.")
+    ap.add_argument("--db", default=str(CFG.db_path))
+    ap.add_argument("--collection", default=CFG.collection)
+    ap.add_argument("-n", type=int, default=200)
+    args = ap.parse_args()
+    db = Path(args.db)
+
+    def per_request() -> None:
+        # Lo que hacían /chat, /health y /sources antes: mkdir + PersistentClient + colección.
+        col = get_collection(get_client(db), args.collection)
+        col.count()
+
+    store = get_store(db, args.collection)
+    store.collection
+
+    def shared() -> None:
+        store.count()
+
+    per_request()  # calienta imports y caches de chromadb
+    for name, fn in (("per_request", per_request), ("shared_store", shared)):
+        r = _timeit(fn, args.n)
+        print(f"{name:>13}: mean={r['mean_ms']:.3f}ms p50={r['p50_ms']:.3f}ms p99={r['p99_ms']:.3f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.config import CFG  # noqa: E402
+from app.db import get_store  # noqa: E402
+from app.vector_index import export_snapshot, load_index  # noqa: E402
+from bench_search import _bench, synthetic_store  # noqa: E402
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Memoria y recall@k de los índices int8/binario frente a la búsqueda actual.")
+    ap.add_argument("--db", default=None, help="Índice existente; sin esto se genera uno sintético agrupado.")
+    ap.add_argument("--collection", default=CFG.collection)
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=8)
+    ap.add_argument("--rerank", type=int, default=CFG.rerank_candidates)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = get_store(Path(args.db), args.collection) if args.db else synthetic_store(Path(tmp), args.n, args.dim, clusters=64)
+        col = store.collection
+        export_snapshot(col, Path(tmp) / "snap", store.name, 1)
+        idx = load_index(Path(tmp) / "snap", store.name)
+        rng = np.random.default_rng(7)
+        # Consultas cerca de documentos existentes, como preguntas sobre el material.
+        rows = rng.integers(0, len(idx), args.queries)
+        queries = np.asarray(idx.vectors[rows]) + 0.05 * rng.standard_normal((args.queries, idx.vectors.shape[1])).astype(np.float32)
+
+        # Referencia: lo que devuelve hoy retrieve() (Chroma) y la búsqueda exacta.
+        chroma_ids = [
+            set(col.query(query_embeddings=[q.tolist()], n_results=args.k, include=[])["ids"][0]) for q in queries
+        ]
+        exact_ids = [set(idx.query(q.tolist(), args.k, mode="none")["ids"]) for q in queries]
+
+        print(f"vectores={len(idx)} dim={idx.vectors.shape[1]} k={args.k} rerank={args.rerank}")
+        fp = idx.footprint()
+        for mode in ("none", "int8", "binary"):
+            got = [set(idx.query(q.tolist(), args.k, mode=mode, rerank=args.rerank)["ids"]) for q in queries]
+            r_chroma = np.mean([len(g & c) / len(c) for g, c in zip(got, chroma_ids)])
+            r_exact = np.mean([len(g & e) / len(e) for g, e in zip(got, exact_ids)])
+            lat = _bench(lambda q: idx.query(q, args.k, mode=mode, rerank=args.rerank), queries)
+            scan = fp["float32"] if mode == "none" else fp[mode]
+            print(
+                f"  {mode:>6}: scan={scan / 2**20:7.2f} MiB  recall@{args.k} vs chroma={r_chroma:.3f} "
+                f"vs exacto={r_exact:.3f}  p50={lat['p50_ms']}ms p99={lat['p99_ms']}ms"
+            )
+
+if __name__ == "__main__":
+    main()
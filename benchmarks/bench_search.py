@@ -0,0 +1,90 @@
+from __future__ import annotations
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.config import CFG  # noqa: E402
+from app.db import get_store  # noqa: E402
+from app.vector_index import export_snapshot, load_index  # noqa: E402
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    s = sorted(samples_ms)
+    pick = lambda q: s[min(len(s) - 1, int(len(s) * q))]  # noqa: E731
+    return {"p50_ms": round(pick(0.50), 3), "p99_ms": round(pick(0.99), 3), "mean_ms": round(sum(s) / len(s), 3)}
+
+def _bench(fn: Callable[[List[float]], object], queries: np.ndarray) -> Dict[str, float]:
+    fn(queries[0].tolist())  # calentamiento
+    samples = []
+    for q in queries:
+        ql = q.tolist()
+        t0 = time.perf_counter()
+        fn(ql)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return percentiles(samples)
+
+def synthetic_vectors(rng: np.random.Generator, m: int, dim: int, centers: np.ndarray | None = None) -> np.ndarray:
+    """Vectores unitarios; con `centers`, agrupados alrededor de ellos (más parecido a textos reales)."""
+    if centers is None:
+        v = rng.standard_normal((m, dim)).astype(np.float32)
+    else:
+        v = centers[rng.integers(0, len(centers), m)] + rng.standard_normal((m, dim)).astype(np.float32) / np.sqrt(dim)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+def synthetic_store(db: Path, n: int, dim: int, seed: int = 0, clusters: int = 0):
+    """Colección Chroma temporal con `n` vectores unitarios aleatorios."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32) / np.sqrt(dim) if clusters else None
+    store = get_store(db, "bench")
+    col = store.collection
+    for off in range(0, n, 5000):
+        m = min(5000, n - off)
+        v = synthetic_vectors(rng, m, dim, centers)
+        col.upsert(
+            ids=[f"c{off + i}" for i in range(m)],
+            embeddings=v,
+            documents=[f"doc {off + i}" for i in range(m)],
+            metadatas=[{"source": f"s{(off + i) // 50}.pdf", "chunk": (off + i) % 50} for i in range(m)],
+        )
+    return store
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Latencia de búsqueda: Chroma (HNSW) vs snapshot NumPy exacto.")
+    ap.add_argument("--db", default=None, help="Índice existente; sin esto se genera uno sintético.")
+    ap.add_argument("--collection", default=CFG.collection)
+    ap.add_argument("--n", type=int, default=5000, help="Vectores sintéticos.")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("-k", type=int, default=8)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db:
+            store = get_store(Path(args.db), args.collection)
+        else:
+            store = synthetic_store(Path(tmp), args.n, args.dim)
+        col = store.collection
+        root = Path(tmp) / "snap"
+        export_snapshot(col, root, store.name, 1)
+        idx = load_index(root, store.name)
+        dim = idx.vectors.shape[1]
+        rng = np.random.default_rng(1)
+        queries = rng.standard_normal((args.queries, dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        chroma = _bench(
+            lambda q: col.query(query_embeddings=[q], n_results=args.k, include=["documents", "metadatas", "distances"]),
+            queries,
+        )
+        numpy_ = _bench(lambda q: idx.query(q, args.k), queries)
+        print(f"vectores={len(idx)} dim={dim} k={args.k} consultas={args.queries}")
+        print(f"  chroma: {chroma}")
+        print(f"   numpy: {numpy_}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Arranque en frío, cada medición en un proceso nuevo:
+#  - tiempo de import de server, chat.py y de las dependencias pesadas por separado;
+#  - uvicorn hasta el primer /livez 200 (acepta tráfico), hasta /readyz 200 (modelos
+#    cargados) y latencia del primer /chat. Con --fake levanta tools/fake_ollama.py.
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def import_ms(stmt: str, n: int, env: Dict[str, str]) -> Dict[str, float]:
+    code = f"import time; t = time.perf_counter(); {stmt}; print((time.perf_counter() - t) * 1000)"
+    samples: List[float] = []
+    for _ in range(n):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return {"median_ms": round(statistics.median(samples), 1), "min_ms": round(min(samples), 1)}
+
+def _wait(url: str, deadline: float, ok=lambda r: r.status_code == 200) -> Optional[float]:
+    while time.perf_counter() < deadline:
+        try:
+            if ok(requests.get(url, timeout=1)):
+                return time.perf_counter()
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    return None
+
+def startup(env: Dict[str, str], timeout: float) -> Dict[str, Optional[float]]:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = t0 + timeout
+        live = _wait(f"{base}/livez", deadline)
+        t_req = time.perf_counter()
+        r = requests.post(f"{base}/chat", json={"user_id": "ana", "message": "¿Qué es CSAT?"}, timeout=timeout)
+        first_chat = (time.perf_counter() - t_req) * 1000 if r.status_code == 200 else None
+        ready = _wait(f"{base}/readyz", deadline)
+        ms = lambda t: round((t - t0) * 1000, 1) if t else None  # noqa: E731
+        return {"livez_ms": ms(live), "readyz_ms": ms(ready), "first_chat_ms": round(first_chat, 1) if first_chat else None}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Tiempo de import y de arranque hasta el primer request.")
+    ap.add_argument("-n", type=int, default=5, help="Repeticiones por medición de import.")
+    ap.add_argument("--runs", type=int, default=3, help="Arranques completos del server.")
+    ap.add_argument("--fake", action="store_true", help="Usa tools/fake_ollama.py (perfil --profile) en lugar de Ollama.")
+    ap.add_argument("--profile", default="phi3-gpu")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    args = ap.parse_args()
+
+    env = dict(os.environ)
+    fake = None
+    tmp = tempfile.mkdtemp(prefix="asistente-startup-")
+    env.setdefault("CACHE_PATH", str(Path(tmp) / ".cache"))
+    if args.fake:
+        port = _free_port()
+        env["OLLAMA_HOST"] = f"127.0.0.1:{port}"
+        fake = subprocess.Popen(
+            [sys.executable, "tools/fake_ollama.py", "--port", str(port), "--profile", args.profile],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        _wait(f"http://127.0.0.1:{port}/api/tags", time.perf_counter() + 30)
+
+    try:
+        print("Import (proceso nuevo, mediana de", args.n, "):")
+        for label, stmt in (
+            ("server", "import server"),
+            ("chat.py", "import chat"),
+            ("chromadb", "import chromadb"),
+            ("ollama", "import ollama"),
+            ("fastapi", "import fastapi"),
+        ):
+            r = import_ms(stmt, args.n, env)
+            print(f"  {label:>9}: {r['median_ms']:>8.1f} ms (min {r['min_ms']:.1f})")
+
+        print(f"Arranque de uvicorn ({args.runs} corridas):")
+        for i in range(args.runs):
+            r = startup(env, args.timeout)
+            print(f"  #{i + 1}: /livez {r['livez_ms']} ms · /readyz {r['readyz_ms']} ms · primer /chat {r['first_chat_ms']} ms")
+    finally:
+        if fake is not None:
+            fake.terminate()
+            fake.wait(timeout=10)
+
+if __name__ == "__main__":
+    main()
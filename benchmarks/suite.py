@@ -0,0 +1,249 @@
+from __future__ import annotations
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Suite offline: Ollama se reemplaza por tools/ci_mocks/synthetic.py, así que corre en CI
+# sin modelos. Resultados en JSON; con --baseline compara y falla si algo empeoró.
+#
+#   python benchmarks/suite.py --out benchmarks/results/latest.json
+#   python benchmarks/suite.py --baseline benchmarks/results/baseline.json
+
+_BASE = (
+    "cliente satisfacción atención proceso política seguridad escalamiento ticket agente supervisor "
+    "meta indicador calidad llamada correo registro sistema cuenta alta baja reclamo respuesta tiempo "
+    "servicio acuerdo nivel primer contacto resolución encuesta CSAT NPS FCR AHT SLA capacitación "
+    "manual sesión facilitador objetivo evaluación privacidad datos equipo turno reporte semanal"
+).split()
+_SYL = "ma pe ri so tu ca de li no ra ve go ble tra cion men dad par cor gen".split()
+
+def _vocab(size: int = 5000) -> List[str]:
+    rng = np.random.default_rng(42)
+    words = list(_BASE)
+    while len(words) < size:
+        words.append("".join(rng.choice(_SYL, size=int(rng.integers(2, 5)))))
+    return words
+
+# Por qué: con un vocabulario chico cada documento contiene todos los términos y BM25
+# recorre la colección entera; Zipf sobre unas miles de palabras se parece más a texto real.
+VOCAB = _vocab()
+_ZIPF = 1.0 / np.arange(1, len(VOCAB) + 1)
+_ZIPF /= _ZIPF.sum()
+
+def synthetic_text(rng: np.random.Generator, words: int) -> str:
+    toks = rng.choice(VOCAB, size=words, p=_ZIPF)
+    # Oraciones de 8 a 20 palabras para que el chunker encuentre cortes naturales.
+    out, i = [], 0
+    while i < words:
+        n = int(rng.integers(8, 21))
+        out.append(" ".join(toks[i : i + n]).capitalize() + ".")
+        i += n
+    return " ".join(out)
+
+def bench_chunk_text(mb: float) -> Dict[str, Any]:
+    from app.chunking import chunk_text
+    from app.config import CFG
+
+    text = synthetic_text(np.random.default_rng(0), int(mb * 1e6 / 9))
+    dt = math.inf
+    for _ in range(3):  # el mejor de 3: la corrida es corta y ruidosa
+        t0 = time.perf_counter()
+        chunks = chunk_text(text, max_chars=CFG.max_chars, overlap_chars=CFG.overlap_chars)
+        dt = min(dt, time.perf_counter() - t0)
+    return {"chars": len(text), "chunks": len(chunks), "seconds": round(dt, 4),
+            "chars_per_s": round(len(text) / dt, 1), "chunks_per_s": round(len(chunks) / dt, 1)}
+
+def scaled_training_pdf(out: Path, copies: int) -> Path:
+    """El manual de generate_training_pdf.py repetido `copies` veces en un solo PDF."""
+    from pypdf import PdfReader, PdfWriter
+    import generate_training_pdf
+
+    base = out.parent / "manual_base.pdf"
+    generate_training_pdf.make_pdf(base)
+    reader = PdfReader(str(base))
+    writer = PdfWriter()
+    for _ in range(copies):
+        for page in reader.pages:
+            writer.add_page(page)
+    with open(out, "wb") as f:
+        writer.write(f)
+    return out
+
+def bench_load_pdf_text(pdf: Path) -> Dict[str, Any]:
+    from app.pdf import _page_count, load_pdf_text
+
+    pages = _page_count(pdf)
+    t0 = time.perf_counter()
+    text = load_pdf_text(pdf)
+    dt = time.perf_counter() - t0
+    return {"pages": pages, "chars": len(text), "seconds": round(dt, 4), "pages_per_s": round(pages / dt, 2)}
+
+def bench_build_index(pdf: Path, tmp: Path, files: int, workers: int) -> Dict[str, Any]:
+    from app.indexer import build_index
+
+    docs = tmp / "docs"
+    docs.mkdir()
+    for i in range(files):
+        shutil.copy(pdf, docs / f"manual_{i:02d}.pdf")
+    t0 = time.perf_counter()
+    stats = build_index(docs_path=docs, db_path=tmp / "db_index", collection="bench", workers=workers)
+    dt = time.perf_counter() - t0
+    return {"files": files, "chunks": stats.chunks, "seconds": round(dt, 3), "chunks_per_s": round(stats.chunks / dt, 1)}
+
+def _populate(db: Path, n: int, dim: int, seed: int = 0):
+    """Colección con `n` chunks sintéticos (vectores agrupados + textos para BM25), sin pasar por embeddings."""
+    from app.db import get_store
+    from app.lexical import get_lexical_index
+    from bench_search import synthetic_vectors
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((64, dim)).astype(np.float32) / np.sqrt(dim)
+    store = get_store(db, "bench")
+    lexical = get_lexical_index(db, "bench")
+    for off in range(0, n, 5000):
+        m = min(5000, n - off)
+        ids = [f"c{off + i}" for i in range(m)]
+        docs = [synthetic_text(rng, 60) for _ in range(m)]
+        metas = [{"source": f"s{(off + i) // 50}.pdf", "chunk": (off + i) % 50} for i in range(m)]
+        store.collection.upsert(ids=ids, embeddings=synthetic_vectors(rng, m, dim, centers), documents=docs, metadatas=metas)
+        if lexical:
+            lexical.add(ids, metas, docs)
+    return store
+
+def bench_retrieve(tmp: Path, n: int, dim: int, queries: int) -> Dict[str, Any]:
+    from app.config import CFG
+    from app.retriever import retrieve
+    from app.vector_index import export_snapshot
+    from bench_search import percentiles
+
+    t0 = time.perf_counter()
+    store = _populate(tmp / f"db_{n}", n, dim)
+    if CFG.search_backend == "numpy":
+        export_snapshot(store.collection, store.db_path, store.name, store.bump_version())
+    setup_s = time.perf_counter() - t0
+    rng = np.random.default_rng(1)
+    qs = [f"{synthetic_text(rng, 10)} {i}" for i in range(queries + 1)]  # únicas: sin aciertos de cache
+    retrieve(qs[0], store=store)  # calentamiento
+    samples: List[float] = []
+    for q in qs[1:]:
+        t = time.perf_counter()
+        retrieve(q, k=CFG.top_k, threshold=CFG.distance_threshold, store=store)
+        samples.append((time.perf_counter() - t) * 1000)
+    return {"chunks": n, "setup_s": round(setup_s, 2), **percentiles(samples)}
+
+def _direction(metric: str) -> int:
+    """+1 si más es mejor, -1 si menos es mejor, 0 si no se compara."""
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith("_ms"):
+        return -1
+    return 0
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for case, metrics in current["results"].items():
+        base = baseline.get("results", {}).get(case, {})
+        for metric, value in metrics.items():
+            d = _direction(metric)
+            ref = base.get(metric)
+            if not d or not isinstance(ref, (int, float)) or not ref:
+                continue
+            change = (value - ref) / ref * d  # > 0 = mejor
+            flag = "REGRESIÓN" if change < -tolerance else ""
+            print(f"  {case:>18}.{metric:<14} {ref:>12.3f} → {value:>12.3f} ({change * 100:+.1f}%) {flag}")
+            if flag:
+                regressions.append(f"{case}.{metric}")
+    return regressions
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Micro-benchmarks offline de chunking, PDF, indexado y recuperación.")
+    ap.add_argument("--out", default=str(ROOT / "benchmarks" / "results" / "latest.json"))
+    ap.add_argument("--baseline", default=None, help="JSON previo contra el cual comparar.")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento relativo tolerado (0.2 = 20%%).")
+    ap.add_argument("--sizes", default="1000,10000,100000", help="Tamaños de colección para retrieve.")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--text-mb", type=float, default=5.0)
+    ap.add_argument("--pdf-copies", type=int, default=20, help="Veces que se repite el manual en el PDF escalado.")
+    ap.add_argument("--index-files", type=int, default=4)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--embed-latency-ms", type=float, default=0.0, help="Latencia simulada por llamada de embeddings.")
+    ap.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    ap.add_argument("--only", default=None, help="Casos separados por coma (chunk_text,load_pdf_text,build_index,retrieve).")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="asistente-bench-"))
+    # Antes de importar app: CFG se arma con el entorno. DEDUP=0: el PDF escalado y los
+    # archivos de build_index son copias del mismo manual; con dedup casi todo se enlazaría
+    # y el caso dejaría de medir embeddings y upserts (y de ser comparable con el baseline).
+    os.environ.update({
+        "CACHE_PATH": str(tmp / ".cache"), "EMBED_CACHE": "0", "QUERY_CACHE_DISK": "0",
+        "SEARCH_BACKEND": args.backend, "EMBED_BUDGET_MS": "0", "DEDUP": "0",
+    })
+    sys.path.insert(0, str(ROOT / "tools" / "ci_mocks"))
+    import synthetic
+
+    fake = synthetic.install(dim=args.dim, embed_latency_ms=args.embed_latency_ms)
+    only = set(args.only.split(",")) if args.only else None
+    want = lambda name: only is None or name in only  # noqa: E731
+    results: Dict[str, Any] = {}
+    try:
+        if want("chunk_text"):
+            results["chunk_text"] = bench_chunk_text(args.text_mb)
+            print(f"chunk_text: {results['chunk_text']}")
+        pdf = None
+        if want("load_pdf_text") or want("build_index"):
+            pdf = scaled_training_pdf(tmp / "manual_scaled.pdf", args.pdf_copies)
+        if want("load_pdf_text"):
+            results["load_pdf_text"] = bench_load_pdf_text(pdf)
+            print(f"load_pdf_text: {results['load_pdf_text']}")
+        if want("build_index"):
+            results["build_index"] = bench_build_index(pdf, tmp, args.index_files, args.workers)
+            print(f"build_index: {results['build_index']}")
+        if want("retrieve"):
+            for n in (int(x) for x in args.sizes.split(",") if x):
+                results[f"retrieve_{n}"] = bench_retrieve(tmp, n, args.dim, args.queries)
+                print(f"retrieve_{n}: {results[f'retrieve_{n}']}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "mock_calls": fake.calls,
+        },
+        "results": results,
+    }
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Resultados → {out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print(f"Comparación contra {args.baseline} (tolerancia {args.tolerance:.0%}):")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"Regresiones: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
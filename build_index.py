@@ -1,6 +1,10 @@
 from __future__ import annotations
 import argparse
+from pathlib import Path
+from app.catalog import get_catalog
+from app.dedup import get_dedup_index
 from app.config import CFG
+from app.db import get_store
 from app.embeddings import ensure_ollama_ready
 from app.indexer import build_index
 from app.logging import log
@@ -12,8 +16,19 @@ def main() -> None:
     parser.add_argument("--collection", default=CFG.collection)
     parser.add_argument("--max-chars", type=int, default=CFG.max_chars)
     parser.add_argument("--overlap", type=int, default=CFG.overlap_chars)
+    parser.add_argument("--force", action="store_true", help="Ignora el manifest y reprocesa todos los PDFs.")
+    parser.add_argument("--workers", type=int, default=CFG.pdf_workers, help="Procesos para extraer PDFs (0 = en este proceso, sin límite de tiempo por página).")
+    parser.add_argument("--rebuild-catalog", action="store_true", help="Solo recalcula el catálogo de fuentes desde la colección.")
     args = parser.parse_args()
 
+    if args.rebuild_catalog:
+        db = Path(args.db)
+        store = get_store(db, args.collection)  # con blue/green, la generación vigente del alias
+        dedup = get_dedup_index(db, store.name)
+        linked = dedup.linked_by_source() if dedup else None
+        get_catalog(db, store.name).rebuild_from(store.collection, db, store.name, linked=linked)
+        return
+
     dim, chat_ok = ensure_ollama_ready(CFG.embed_model, CFG.chat_model)
     log(f"Ollama OK. dim={dim}. chat_model_ready={bool(chat_ok)}")
 
@@ -23,8 +38,19 @@ def main() -> None:
         collection=args.collection,
         max_chars=args.max_chars,
         overlap_chars=args.overlap,
+        force=args.force,
+        workers=args.workers,
+    )
+    log(
+        f"Listo ✅ PDFs={stats.files} (nuevos={stats.added}, actualizados={stats.updated}, "
+        f"sin cambios={stats.skipped}, eliminados={stats.removed}), chunks nuevos={stats.chunks}, "
+        f"chunks borrados={stats.chunks_deleted}, total en colección={stats.total_after}"
     )
-    log(f"Listo ✅ PDFs={stats.files}, chunks nuevos={stats.chunks}, total en colección={stats.total_after}")
+    if stats.dedup_chunks:
+        log(
+            f"Casi duplicados enlazados={stats.dedup_chunks} "
+            f"({stats.dedup_chunks} embeddings y {stats.dedup_bytes / 1024:.0f} KB de texto ahorrados)"
+        )
 
 if __name__ == "__main__":
     main()
@@ -1,28 +1,119 @@
 from __future__ import annotations
+import asyncio
+import json
 import os
-from typing import Any, Dict, List
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, File, Form, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, ValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
 from app.config import CFG
+from app.admission import Admission, Saturated
+from app.answer_cache import AnswerCache
+from app.batch import BatchItem, chat_batch
 from app.embeddings import ensure_ollama_ready
 from app.profiles import load_profile
-from app.retriever import retrieve
+from app.retriever import embed_query_within, normalize_query, query_cache, retrieve
 from app.prompts import build_system, build_user_prompt
-from app.llm import chat
-from app.db import get_client, get_collection
-from app.ingest_text import ingest_text  # ← este módulo/función existe en app/ingest_text.py
+from app.llm import chat, chat_stream
+from app.catalog import get_catalog
+from app.dedup import get_dedup_index
+from app.db import Store, close_stores, get_store, read_alias
+from app.generations import release_retired
+from app.jobs import Job, JobWorkers, get_job_queue
+from app.pdf import close_pdf_pool
+from app.readiness import ReadinessMonitor
+from app.warmup import Warmup, open_store
+from app.metrics import (
+    CACHE_ENTRIES, COLLECTION_CHUNKS, COLLECTION_SOURCES, ERRORS, HTTP_SECONDS, REGISTRY, STAGE_SECONDS, timed,
+    trace_request,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(f"[server] loaded: {__file__}", flush=True)
+    # Por qué: nada bloqueante antes del yield; abrir Chroma y cargar modelos corre en segundo
+    # plano y /readyz responde 503 ("pending") hasta que termina.
+    app.state.store = get_store()
+    app.state.warmup = Warmup(app.state.store, on_ready=lambda: app.state.readiness.refresh())
+
+    def extra() -> Dict[str, Any]:
+        checks: Dict[str, Any] = {"chroma": True, "chroma_count": get_store().count()}
+        if CFG.warmup:
+            checks["warm"] = app.state.warmup.done
+        return checks
+
+    app.state.readiness = ReadinessMonitor(extra=extra)
+    app.state.readiness.start()
+    if CFG.warmup:
+        app.state.warmup.start()
+    else:
+        app.state.store_open = asyncio.create_task(asyncio.to_thread(open_store, app.state.store))
+    live_catalog = lambda: get_catalog(CFG.db_path, get_store().name)  # noqa: E731 — sigue al alias
+    COLLECTION_CHUNKS.set_function(lambda: live_catalog().totals()["chunks"])
+    COLLECTION_SOURCES.set_function(lambda: live_catalog().totals()["sources"])
+    CACHE_ENTRIES.set_function(lambda: {
+        ("answer",): answer_cache.stats()["entries"], ("query",): query_cache.stats()["entries"],
+    })
+    app.state.jobs = JobWorkers(get_job_queue())
+    app.state.jobs.start()
+    try:
+        yield
+    finally:
+        await app.state.jobs.stop()
+        await app.state.warmup.stop()
+        await app.state.readiness.stop()
+        close_pdf_pool()
+        close_stores()
+
+def get_app_store(request: Request) -> Store:
+    # Por qué: se resuelve el alias en cada request; un rebuild blue/green publica una
+    # generación nueva y los requests siguientes la usan sin reiniciar el server.
+    store = get_store()
+    release_retired(store.db_path, CFG.collection, store.name)
+    return store
 
-app = FastAPI(title="Asistente de Aprendizaje")
+def _index_info(store: Store) -> Dict[str, Any]:
+    alias = read_alias(store.db_path, CFG.collection) or {}
+    return {
+        "alias": CFG.collection, "collection": store.name, "generation": alias.get("generation", 0),
+        "version": store.version(), "switched_at": alias.get("switched_at"),
+        "dedup": dedup.totals() if (dedup := get_dedup_index(store.db_path, store.name)) else None,
+    }
+
+app = FastAPI(title="Asistente de Aprendizaje", lifespan=lifespan)
+answer_cache = AnswerCache()
+admission = Admission()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=os.getenv("CORS_ORIGINS", "*").split(","),
     allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def http_metrics(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(
+        time.perf_counter() - t0,
+        method=request.method, route=getattr(route, "path", "other"), status=str(response.status_code),
+    )
+    return response
+
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 class IngestIn(BaseModel):
     source_name: str = Field(..., min_length=3)
     text: str = Field(..., min_length=50)
@@ -33,6 +124,14 @@ class ChatIn(BaseModel):
     top_k: int = Field(CFG.top_k, ge=1, le=20)
     distance_threshold: float = Field(CFG.distance_threshold, ge=0.0, le=2.0)
     temperature: float = Field(0.3, ge=0.0, le=1.0)
+    timings: bool = Field(False, description="Incluye en meta los ms por etapa de este request.")
+
+class BatchChatIn(ChatIn):
+    id: Optional[str] = None
+
+class ChatBatchIn(BaseModel):
+    items: List[BatchChatIn] = Field(..., min_length=1, max_length=CFG.batch_max_items)
+    concurrency: int = Field(CFG.batch_concurrency, ge=1, le=32)
 
 class ChatOut(BaseModel):
     answer: str
@@ -40,58 +139,352 @@ class ChatOut(BaseModel):
     used_chunks: int = 0
     meta: Dict[str, Any] = {}
 
-@app.on_event("startup")
-def _startup() -> None:
-    print(f"[server] loaded: {__file__}", flush=True)
-    ensure_ollama_ready(CFG.embed_model, CFG.chat_model)
+@app.get("/livez")
+async def livez() -> Dict[str, Any]:
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz(request: Request):
+    state = request.app.state.readiness.snapshot()
+    state["warmup"] = request.app.state.warmup.snapshot()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
 
 @app.get("/health")
-def health() -> Dict[str, Any]:
+def health(
+    request: Request,
+    deep: bool = Query(False, description="Embebe y genera de verdad (costoso); por defecto usa el estado en cache."),
+    store: Store = Depends(get_app_store),
+):
+    totals = get_catalog(store.db_path, store.name).totals()
+    if not deep:
+        state = request.app.state.readiness.snapshot()
+        body = {
+            **state, "status": "ok" if state["ready"] else state["status"],
+            "chroma_count": store.count(), "catalog": totals, "index": _index_info(store),
+        }
+        return JSONResponse(status_code=200 if state["ready"] else 503, content=body)
     dim, chat_ok = ensure_ollama_ready(CFG.embed_model, CFG.chat_model)
-    client = get_client(CFG.db_path); col = get_collection(client, CFG.collection)
-    try: cnt = col.count()
-    except Exception: cnt = len(col.get().get("ids", []))
-    return {"status": "ok", "embedding_dim": dim, "chat_model_ready": bool(chat_ok), "chroma_count": cnt}
-
-@app.get("/sources")
-def sources() -> Dict[str, Any]:
-    """Lista fuentes y cantidad de chunks por cada una."""
-    client = get_client(CFG.db_path)
-    col = get_collection(client, CFG.collection)
-    data = col.get(include=["metadatas"])
-    metas = (data or {}).get("metadatas", [])
-    counts: Dict[str, int] = {}
-    for m in metas:
-        src = m.get("source", "unk")
-        counts[src] = counts.get(src, 0) + 1
     return {
-        "sources": [{"source": s, "chunks": n} for s, n in sorted(counts.items(), key=lambda x: -x[1])],
-        "total": sum(counts.values()),
+        "status": "ok", "embedding_dim": dim, "chat_model_ready": bool(chat_ok),
+        "chroma_count": store.count(), "catalog": totals, "index": _index_info(store),
     }
 
+@app.get("/sources")
+def sources(store: Store = Depends(get_app_store)) -> Dict[str, Any]:
+    """Lista fuentes con chunks, bytes, hash y fecha de indexado (desde el catálogo, sin recorrer Chroma)."""
+    catalog = get_catalog(store.db_path, store.name)
+    totals = catalog.totals()
+    out = {"sources": [s.to_dict() for s in catalog.sources()], "total": totals["chunks"], "bytes": totals["bytes"]}
+    dedup = get_dedup_index(store.db_path, store.name)
+    if dedup:
+        # `linked` por fuente: fragmentos casi duplicados que apuntan a otro en vez de tener vector propio.
+        linked = dedup.linked_by_source()
+        for s in out["sources"]:
+            s["linked"] = linked.get(s["source"], 0)
+        out["dedup"] = dedup.totals()
+    return out
+
+async def _enqueued(request: Request, job: Job, wait: bool) -> JSONResponse:
+    """202 con el id del trabajo; con `wait`, espera a que termine (hasta INGEST_WAIT_TIMEOUT).
+
+    La cola es SQLite síncrono: cada consulta va al threadpool para no frenar el event loop.
+    """
+    queue = request.app.state.jobs.queue
+    request.app.state.jobs.notify()
+    deadline = time.monotonic() + CFG.ingest_wait_timeout
+    delay = 0.05
+    while wait and not job.finished and time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        job = await run_in_threadpool(queue.get, job.id) or job
+    if job.status == "done":
+        return JSONResponse(content={"ok": True, "job_id": job.id, **job.to_dict()["result"]})
+    if job.status == "failed":
+        return JSONResponse(status_code=400, content={"ok": False, "job_id": job.id, "error": f"Ingest falló: {job.error}"})
+    return JSONResponse(
+        status_code=202, content={"ok": True, "job_id": job.id, "status": job.status, "url": f"/jobs/{job.id}"}
+    )
+
 @app.post("/ingest_text")
-def ingest_text_ep(payload: IngestIn):
-    try:
-        res = ingest_text(payload.source_name, payload.text)
-        return {"ok": True, "source": res.source, "chunks": res.chunks, "total_after": res.total_after}
-    except ValidationError as ve:
-        return JSONResponse(status_code=422, content={"error": "payload inválido", "detail": ve.errors()})
-    except Exception as e:
-        return JSONResponse(status_code=400, content={"error": f"Ingest falló: {type(e).__name__}: {e}"})
+async def ingest_text_ep(
+    payload: IngestIn,
+    request: Request,
+    wait: bool = Query(False, description="Espera a que termine la ingesta y devuelve el resultado."),
+):
+    job = await run_in_threadpool(
+        request.app.state.jobs.queue.submit,
+        "text", payload.source_name, text=payload.text, nbytes=len(payload.text.encode("utf-8")),
+    )
+    return await _enqueued(request, job, wait)
 
-@app.post("/chat", response_model=ChatOut)
-def chat_ep(payload: ChatIn):
+_UPLOAD_TYPES = (".pdf", ".txt", ".md")
+
+@app.post("/ingest_file")
+async def ingest_file_ep(
+    request: Request,
+    file: UploadFile = File(..., description="PDF, .txt o .md"),
+    source_name: Optional[str] = Form(None, min_length=3),
+    wait: bool = Query(False, description="Espera a que termine la ingesta y devuelve el resultado."),
+):
+    name = source_name or Path(file.filename or "").name
+    suffix = Path(file.filename or name).suffix.lower()
+    if suffix not in _UPLOAD_TYPES:
+        return JSONResponse(status_code=415, content={"error": f"Tipo no soportado: {suffix or '?'} (usa {', '.join(_UPLOAD_TYPES)})"})
+    if len(name) < 3:
+        return JSONResponse(status_code=422, content={"error": "source_name inválido (min 3)."})
+    queue = request.app.state.jobs.queue
+    await run_in_threadpool(queue.uploads.mkdir, parents=True, exist_ok=True)
+    dest = queue.uploads / f"{uuid.uuid4().hex}{suffix}"
+    limit, size = int(CFG.upload_max_mb * 1024 * 1024), 0
+    # Por qué a disco y por partes: el trabajo sobrevive reinicios y un PDF grande no queda en memoria.
+    # Toda la E/S de archivo va al threadpool: este handler es async y comparte el loop con /chat.
+    out = await run_in_threadpool(dest.open, "wb")
     try:
-        profile = load_profile(payload.user_id)
-        context, sources_tags, used = retrieve(payload.message, k=payload.top_k, threshold=payload.distance_threshold)
+        while chunk := await file.read(1 << 20):
+            size += len(chunk)
+            if size > limit:
+                break
+            await run_in_threadpool(out.write, chunk)
+    finally:
+        await run_in_threadpool(out.close)
+    if size > limit:
+        await run_in_threadpool(dest.unlink, missing_ok=True)
+        return JSONResponse(status_code=413, content={"error": f"Archivo mayor a {CFG.upload_max_mb:g} MB"})
+    job = await run_in_threadpool(queue.submit, "file", name, path=dest, nbytes=size)
+    return await _enqueued(request, job, wait)
+
+@app.get("/jobs/{job_id}")
+def job_ep(job_id: str, request: Request):
+    job = request.app.state.jobs.queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"No existe el trabajo {job_id}"})
+    return job.to_dict()
+
+@app.get("/jobs")
+def jobs_ep(
+    request: Request,
+    status: Optional[str] = Query(None, pattern="^(queued|running|done|failed)$"),
+    limit: int = Query(50, ge=1, le=500),
+) -> Dict[str, Any]:
+    queue = request.app.state.jobs.queue
+    return {"counts": queue.counts(), "jobs": [j.to_dict() for j in queue.list(status, limit)]}
+
+def _answer_scope(profile: Dict[str, Any], payload: ChatIn) -> tuple:
+    return (
+        profile.get("learning_style", "visual"),
+        profile.get("level", "intermedio"),
+        int(profile.get("constraints", {}).get("max_words", CFG.max_words)),
+        round(payload.temperature, 3),
+        CFG.chat_model,
+        payload.top_k,
+        round(payload.distance_threshold, 3),
+    )
+
+@dataclass
+class _Turn:
+    """Lo que /chat y /chat/stream preparan igual: embedding con presupuesto, cache de respuestas,
+    recuperación y prompt. Con `hit` la respuesta ya estaba en el cache y no hay que generar."""
+
+    meta: Dict[str, Any]
+    hit: Optional[ChatOut] = None
+    sys_prompt: str = ""
+    user_prompt: str = ""
+    sources: List[str] = field(default_factory=list)
+    used: int = 0
+    cache_key: Optional[tuple] = None  # (scope, q_emb, version) con el cache activo
+
+    def remember(self, answer: Optional[str]) -> None:
+        if answer and self.cache_key is not None:
+            answer_cache.put(*self.cache_key, {"answer": answer, "sources": self.sources, "used": self.used})
+
+def _prepare(payload: ChatIn, store: Store, profile: Dict[str, Any]) -> _Turn:
+    with timed("query_embedding"):
+        q_emb, q_origin = embed_query_within(payload.message)
+    meta: Dict[str, Any] = {
+        "model": CFG.chat_model,
+        "query_embedding": q_origin,
+        "query_cache": query_cache.stats(),
+    }
+    use_cache = CFG.answer_cache and q_emb is not None
+    cache_key = None
+    if use_cache:
+        with timed("answer_cache"):
+            scope, version = _answer_scope(profile, payload), store.version()
+            hit = answer_cache.get(scope, q_emb, version)
+        if hit:
+            meta.update(answer_cache="hit", similarity=hit["similarity"])
+            out = ChatOut(answer=hit["answer"], sources=hit["sources"], used_chunks=hit["used"], meta=meta)
+            return _Turn(meta=meta, hit=out, sources=hit["sources"], used=hit["used"])
+        cache_key = (scope, q_emb, version)
+    info: Dict[str, Any] = {}
+    with timed("retrieve"):
+        context, sources_tags, used = retrieve(
+            payload.message, k=payload.top_k, threshold=payload.distance_threshold, store=store, q_emb=q_emb,
+            info=info, embed_budget_ms=1 if q_emb is None else None,  # el presupuesto ya se agotó arriba
+        )
+    meta["retrieval"] = info
+    with timed("prompt"):
         sys_prompt = build_system(profile)
         user_prompt = build_user_prompt(payload.message, context)
         if used == 0:
             user_prompt += "\n\nNota: No se encontró contexto relevante."
-        answer = chat(CFG.chat_model, sys_prompt, user_prompt, payload.temperature) or "Modelo no disponible."
-        return ChatOut(answer=answer, sources=sources_tags, used_chunks=used, meta={"model": CFG.chat_model})
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Fallo en /chat: {type(e).__name__}: {e}"})
+    meta["answer_cache"] = "miss" if use_cache else "off"
+    return _Turn(
+        meta=meta, sys_prompt=sys_prompt, user_prompt=user_prompt, sources=sources_tags, used=used, cache_key=cache_key
+    )
+
+def _chat(payload: ChatIn, store: Store, profile: Dict[str, Any]) -> ChatOut:
+    turn = _prepare(payload, store, profile)
+    if turn.hit is not None:
+        return turn.hit
+    answer = chat(CFG.chat_model, turn.sys_prompt, turn.user_prompt, payload.temperature)
+    turn.remember(answer)
+    return ChatOut(answer=answer or "Modelo no disponible.", sources=turn.sources, used_chunks=turn.used, meta=turn.meta)
+
+def _load_profile_timed(user_id: str) -> Dict[str, Any]:
+    with timed("profile"):
+        return load_profile(user_id)
+
+def _saturated(e: Saturated) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(e.retry_after)},
+        content={"error": str(e), "reason": e.reason, "retry_after": e.retry_after},
+    )
+
+@app.post("/chat", response_model=ChatOut)
+async def chat_ep(payload: ChatIn, store: Store = Depends(get_app_store)):
+    with trace_request() as trace:
+        try:
+            with timed("chat"):
+                profile = await run_in_threadpool(_load_profile_timed, payload.user_id)
+                # Misma pregunta, perfil y parámetros → misma respuesta: se genera una sola vez.
+                key = (normalize_query(payload.message) or payload.message, _answer_scope(profile, payload))
+
+                async def run(wait_s: float) -> ChatOut:
+                    out = await run_in_threadpool(_chat, payload, store, profile)
+                    out.meta["queue_wait_ms"] = round(wait_s * 1000, 1)
+                    return out
+
+                out, shared = await admission.run(key, run)
+        except Saturated as e:
+            return _saturated(e)
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Fallo en /chat: {type(e).__name__}: {e}"})
+    out = out.model_copy(deep=True)  # el resultado puede ser compartido: meta propio por request
+    if shared:
+        out.meta["coalesced"] = True
+    if payload.timings:
+        out.meta["timings_ms"] = trace
+    return out
+
+@app.get("/chat/queue")
+def chat_queue() -> Dict[str, Any]:
+    """Estado del control de admisión de /chat: cupos, cola, rechazos y esperas."""
+    return admission.stats()
+
+@app.get("/cache/stats")
+def cache_stats() -> Dict[str, Any]:
+    return {"answer_cache": answer_cache.stats(), "query_cache": query_cache.stats()}
+
+@app.post("/chat/batch")
+async def chat_batch_ep(payload: ChatBatchIn, store: Store = Depends(get_app_store)):
+    """Lote de preguntas; responde NDJSON, una línea por ítem en orden de finalización (con `index`).
+
+    Cada generación toma un cupo de la misma admisión que /chat: un lote no puede saltarse el
+    límite de generaciones simultáneas. Un ítem rechazado por la cola sale como línea con `error`.
+    """
+    try:
+        admission.check()
+    except Saturated as e:
+        return _saturated(e)
+    loop = asyncio.get_running_loop()
+    items = [BatchItem(**it.model_dump(exclude={"timings"})) for it in payload.items]
+    results = chat_batch(items, store, payload.concurrency, slot=lambda: admission.thread_slot(loop))
+    lines = (json.dumps(r, ensure_ascii=False) + "\n" for r in results)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+async def _stream_prompt(payload: ChatIn, store: Store) -> Tuple[_Turn, Dict[str, float]]:
+    """Perfil y `_prepare` de /chat/stream, trazados como en /chat (antes del primer evento)."""
+    with trace_request() as trace:
+        # Perfil y recuperación son E/S síncrona corta: van al threadpool; la generación es async.
+        profile = await run_in_threadpool(_load_profile_timed, payload.user_id)
+        turn = await run_in_threadpool(_prepare, payload, store, profile)
+    return turn, dict(trace)
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_ep(payload: ChatIn, store: Store = Depends(get_app_store)):
+    """Como /chat pero por Server-Sent Events: `sources`, luego `token`… y un `done` final.
+
+    Embedding de la consulta (con su presupuesto), cache de respuestas y recuperación son los
+    de /chat (`_prepare`): un acierto del cache llega como un único `token`, y una respuesta
+    generada completa se guarda para los dos endpoints.
+
+    La generación toma un cupo de la misma admisión que /chat (sin coalescing: cada cliente
+    recibe sus propios tokens). Con la cola llena responde 429 antes de abrir el stream; si
+    la espera en la cola vence ya abierto, el rechazo llega como evento `error`.
+    """
+    try:
+        admission.check()
+    except Saturated as e:
+        return _saturated(e)
+
+    async def events() -> AsyncIterator[str]:
+        # Por qué sin `timed`/`trace_request` alrededor de los yield: entre un yield y el siguiente
+        # el generador puede retomarse (o cerrarse) en otro contexto, y la traza y el timer
+        # quedarían abiertos mientras el cliente lee. Lo previo al stream se traza en
+        # `_stream_prompt`; el total se mide con marcas de tiempo explícitas.
+        t0 = time.perf_counter()
+        try:
+            turn, stages = await _stream_prompt(payload, store)
+            retrieval_ms = (time.perf_counter() - t0) * 1000
+            yield _sse("sources", {"sources": turn.sources, "used_chunks": turn.used})
+            timings: Dict[str, Any] = {"retrieval_ms": round(retrieval_ms, 1)}
+            if payload.timings:
+                timings["stages_ms"] = stages
+            if turn.hit is not None:
+                # Respuesta del cache: un solo `token` con el texto completo, sin pasar por el modelo.
+                yield _sse("token", {"content": turn.hit.answer})
+                timings["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+                yield _sse("done", {"model": CFG.chat_model, "usage": {}, "timings": timings, "meta": turn.meta})
+                return
+            first_token_ms = None
+            parts: List[str] = []
+            async with admission.slot() as wait_s:
+                async for ev in chat_stream(CFG.chat_model, turn.sys_prompt, turn.user_prompt, payload.temperature):
+                    if ev["type"] == "token":
+                        if first_token_ms is None:
+                            first_token_ms = (time.perf_counter() - t0) * 1000
+                        parts.append(ev["content"])
+                        yield _sse("token", {"content": ev["content"]})
+                    else:
+                        turn.remember("".join(parts))  # solo una respuesta completa entra al cache
+                        timings.update({
+                            "queue_wait_ms": round(wait_s * 1000, 1),
+                            "first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+                            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+                            **ev["timings"],
+                        })
+                        yield _sse(
+                            "done",
+                            {"model": CFG.chat_model, "usage": ev["usage"], "timings": timings, "meta": turn.meta},
+                        )
+        except Saturated as e:
+            yield _sse("error", {"error": str(e), "reason": e.reason, "retry_after": e.retry_after})
+        except Exception as e:
+            ERRORS.inc(where="chat_stream")
+            yield _sse("error", {"error": f"Fallo en /chat/stream: {type(e).__name__}: {e}"})
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - t0, stage="chat_stream")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 if __name__ == "__main__":
     uvicorn.run("server:app", host="0.0.0.0", port=int(os.getenv("PORT", "8000")), reload=True)
\ No newline at end of file
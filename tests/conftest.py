@@ -0,0 +1,38 @@
+from __future__ import annotations
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+# Pruebas sin Ollama: el entorno se fija antes de importar `app` (CFG se lee una sola vez)
+# y los embeddings los da tools/ci_mocks/synthetic.py.
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+_TMP = Path(tempfile.mkdtemp(prefix="rag-tests-"))
+os.environ.update(
+    DB_PATH=str(_TMP / "db"),
+    CACHE_PATH=str(_TMP / ".cache"),
+    EMBED_CACHE="0",
+    QUERY_CACHE_DISK="0",
+    ANSWER_CACHE="0",
+    WARMUP="0",
+    DEDUP="1",
+)
+
+from tools.ci_mocks.synthetic import install  # noqa: E402
+
+@pytest.fixture(scope="session")
+def fake_ollama():
+    return install()
+
+@pytest.fixture
+def db_path() -> Path:
+    return _TMP / "db"
+
+@pytest.fixture
+def collection() -> str:
+    """Nombre de colección propio de cada prueba: comparten el mismo DB_PATH."""
+    return f"t{uuid.uuid4().hex[:12]}"
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import asyncio
+
+import pytest
+
+from app.admission import Admission, Saturated
+
+def test_leader_cancelled_follower_retries():
+    async def main():
+        adm = Admission(max_active=1, max_queue=4, queue_timeout=0)
+        calls = []
+
+        async def fn(wait):
+            calls.append(wait)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        leader = asyncio.create_task(adm.run("k", fn))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(adm.run("k", fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower, calls
+
+    (result, shared), calls = asyncio.run(main())
+    assert (result, shared) == (2, False)  # generó por su cuenta en vez de propagar la cancelación
+    assert len(calls) == 2
+
+def test_follower_cancelled_leader_unaffected():
+    async def main():
+        adm = Admission(max_active=1, max_queue=4, queue_timeout=0)
+
+        async def fn(wait):
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        leader = asyncio.create_task(adm.run("k", fn))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(adm.run("k", fn))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == ("ok", False)
+
+def test_queue_full_rejects():
+    async def main():
+        adm = Admission(max_active=1, max_queue=0, queue_timeout=0)
+        gate = asyncio.Event()
+
+        async def fn(wait):
+            await gate.wait()
+            return "ok"
+
+        first = asyncio.create_task(adm.run("a", fn))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Saturated) as exc:
+            await adm.run("b", fn)
+        gate.set()
+        await first
+        return exc.value, adm
+
+    err, adm = asyncio.run(main())
+    assert err.reason == "queue_full" and err.retry_after >= 1
+    assert adm.rejected == 1 and adm.active == 0
+
+def test_identical_requests_coalesce():
+    async def main():
+        adm = Admission(max_active=2, max_queue=4, queue_timeout=0)
+        calls = []
+
+        async def fn(wait):
+            calls.append(wait)
+            await asyncio.sleep(0.05)
+            return "respuesta"
+
+        results = await asyncio.gather(adm.run("k", fn), adm.run("k", fn), adm.run("otra", fn))
+        return results, calls, adm
+
+    results, calls, adm = asyncio.run(main())
+    assert results == [("respuesta", False), ("respuesta", True), ("respuesta", False)]
+    assert len(calls) == 2  # "k" una sola vez, "otra" por su cuenta
+    assert adm.coalesced == 1 and adm.stats()["inflight_keys"] == 0
+
+def test_leader_error_reaches_followers():
+    async def main():
+        adm = Admission(max_active=1, max_queue=4, queue_timeout=0)
+
+        async def fn(wait):
+            await asyncio.sleep(0.02)
+            raise RuntimeError("ollama caído")
+
+        return await asyncio.gather(adm.run("k", fn), adm.run("k", fn), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert [type(e) for e in errors] == [RuntimeError, RuntimeError]
+
+def test_thread_slot_shares_the_limit():
+    async def main():
+        adm = Admission(max_active=1, max_queue=4, queue_timeout=0)
+        loop = asyncio.get_running_loop()
+
+        def worker():  # como una generación del pool de /chat/batch
+            with adm.thread_slot(loop) as wait:
+                return wait, adm.active
+
+        async with adm.slot():
+            fut = loop.run_in_executor(None, worker)
+            await asyncio.sleep(0.05)
+            queued = adm.waiting
+        return await fut, queued, adm
+
+    (wait, active), queued, adm = asyncio.run(main())
+    assert queued == 1 and wait >= 0.04 and active == 1
+    assert adm.active == 0 and adm.admitted == 2
+
+def test_check_rejects_before_streaming():
+    async def main():
+        adm = Admission(max_active=1, max_queue=0, queue_timeout=0)
+        adm.check()  # hay cupo
+        async with adm.slot():
+            with pytest.raises(Saturated):
+                adm.check()
+        return adm
+
+    assert asyncio.run(main()).rejected == 1
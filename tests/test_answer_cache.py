@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from app import answer_cache
+from app.answer_cache import AnswerCache
+
+SCOPE = ("agente", "llama3", 0.2)
+
+def test_similar_question_hits_within_scope():
+    cache = AnswerCache(max_entries=8, ttl_s=60, min_similarity=0.95)
+    cache.put(SCOPE, [1.0, 0.0, 0.0], version=1, value={"answer": "Escalar al supervisor."})
+    hit = cache.get(SCOPE, [0.99, 0.05, 0.0], version=1)
+    assert hit["answer"] == "Escalar al supervisor." and hit["similarity"] >= 0.95
+    assert cache.get(SCOPE, [0.0, 1.0, 0.0], version=1) is None  # otra pregunta
+    assert cache.get(("supervisor", "llama3", 0.2), [1.0, 0.0, 0.0], version=1) is None  # otro perfil
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_new_index_version_invalidates():
+    cache = AnswerCache(max_entries=8, ttl_s=60, min_similarity=0.9)
+    cache.put(SCOPE, [1.0, 0.0], version=1, value={"answer": "vieja"})
+    assert cache.get(SCOPE, [1.0, 0.0], version=2) is None
+    assert cache.stats()["entries"] == 0 and cache.invalidations == 1
+
+def test_lru_and_ttl_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(max_entries=2, ttl_s=10, min_similarity=0.99)
+    cache.put(SCOPE, [1.0, 0.0, 0.0], 1, {"answer": "a"})
+    cache.put(SCOPE, [0.0, 1.0, 0.0], 1, {"answer": "b"})
+    assert cache.get(SCOPE, [1.0, 0.0, 0.0], 1)["answer"] == "a"  # "a" pasa a ser la más reciente
+    cache.put(SCOPE, [0.0, 0.0, 1.0], 1, {"answer": "c"})
+    assert cache.get(SCOPE, [0.0, 1.0, 0.0], 1) is None  # "b" desalojada por LRU
+    now[0] += 11
+    assert cache.get(SCOPE, [1.0, 0.0, 0.0], 1) is None  # vencida por TTL
+    assert cache.evictions == 2
@@ -0,0 +1,51 @@
+from __future__ import annotations
+from contextlib import contextmanager
+
+from app import batch
+from app.batch import BatchItem, chat_batch
+from app.db import get_store
+from app.ingest_text import ingest_text
+
+def _store(db_path, collection):
+    store = get_store(db_path, collection)
+    ingest_text("bajas.txt", "Bajas de servicio: confirmar identidad, ofrecer retención y registrar el motivo. " * 3, store=store)
+    return store
+
+def test_one_result_per_item_and_errors_stay_local(fake_ollama, db_path, collection, monkeypatch):
+    store = _store(db_path, collection)
+
+    def chat(model, sys_prompt, user_prompt, temperature):
+        if "FALLA" in user_prompt:
+            raise ConnectionError("ollama caído")
+        return "respuesta"
+
+    monkeypatch.setattr(batch, "chat", chat)
+    items = [BatchItem("u1", f"¿Cómo proceso una baja? {i}", id=f"q{i}") for i in range(5)]
+    items[2] = BatchItem("u1", "FALLA", id="q2")
+    results = sorted(chat_batch(items, store=store, concurrency=3), key=lambda r: r["index"])
+    assert [r["id"] for r in results] == ["q0", "q1", "q2", "q3", "q4"]
+    assert "ollama caído" in results[2]["error"]
+    ok = [r for r in results if "error" not in r]
+    assert len(ok) == 4 and all(r["answer"] == "respuesta" and r["sources"] for r in ok)
+
+def test_generations_run_inside_slot(fake_ollama, db_path, collection, monkeypatch):
+    store = _store(db_path, collection)
+    monkeypatch.setattr(batch, "chat", lambda *a: "ok")
+    entered = []
+
+    @contextmanager
+    def slot():
+        entered.append(1)
+        yield 0.25  # segundos en cola, como admission.thread_slot
+
+    results = list(chat_batch([BatchItem("u1", "baja"), BatchItem("u1", "retención")], store=store, slot=slot))
+    assert len(entered) == 2 and all(r["meta"]["queue_wait_ms"] == 250.0 for r in results)
+
+def test_retrieval_failure_fails_every_item(monkeypatch):
+    def down(*a, **kw):
+        raise RuntimeError("colección no disponible")
+
+    monkeypatch.setattr(batch, "retrieve_many", down)
+    results = list(chat_batch([BatchItem("u1", "a", id="x"), BatchItem("u1", "b", id="y")]))
+    assert [(r["index"], r["id"]) for r in results] == [(0, "x"), (1, "y")]
+    assert all("colección no disponible" in r["error"] for r in results)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import numpy as np
+
+from benchmarks import suite
+from tools.ci_mocks.synthetic import Synthetic
+
+def _report(**results):
+    return {"results": results}
+
+def test_compare_flags_only_regressions_past_tolerance():
+    base = _report(retrieve_1000={"p50_ms": 10.0, "chunks": 1000}, chunk_text={"chars_per_s": 1000.0})
+    cur = _report(retrieve_1000={"p50_ms": 11.5, "chunks": 5}, chunk_text={"chars_per_s": 700.0})
+    assert suite.compare(cur, base, tolerance=0.2) == ["chunk_text.chars_per_s"]  # -30%; la latencia +15% se tolera
+    cur["results"]["retrieve_1000"]["p50_ms"] = 13.0
+    assert suite.compare(cur, base, tolerance=0.2) == ["retrieve_1000.p50_ms", "chunk_text.chars_per_s"]
+    assert suite.compare(cur, {}, tolerance=0.2) == []  # caso nuevo: sin referencia
+
+def test_synthetic_text_is_deterministic_and_chunkable():
+    a = suite.synthetic_text(np.random.default_rng(3), 200)
+    assert a == suite.synthetic_text(np.random.default_rng(3), 200)
+    assert a.endswith(".") and len(a.split()) == 200
+    result = suite.bench_chunk_text(0.02)
+    assert result["chunks"] > 1 and result["chars_per_s"] > 0
+
+def test_stand_in_embeddings_follow_word_overlap():
+    fake = Synthetic(dim=256)
+    q = np.array(fake.vector("plazo de reintegro del reclamo"))
+    near = np.array(fake.vector("Reclamo: plazo de reintegro del"))  # mismas palabras, otro orden
+    far = np.array(fake.vector("horario de atención telefónica"))
+    assert abs(np.linalg.norm(q) - 1) < 1e-9 and q @ near > 0.999 and q @ far < 0.5
+    out = fake.chat(messages=[{"role": "user", "content": "Contexto [a.pdf#3] y [b.pdf#0]"}])
+    assert out["message"]["content"].endswith("[a.pdf#3] [b.pdf#0]") and fake.calls["chat"] == 1
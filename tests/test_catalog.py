@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from app.catalog import Catalog, ensure_catalog, get_catalog, text_sha256
+from app.db import get_store
+from app.ingest_text import ingest_text
+
+def test_totals_follow_upserts_and_deletes(tmp_path):
+    cat = Catalog(tmp_path / "catalog.sqlite3")
+    cat.upsert("a.pdf", 10, 1000, "h1")
+    cat.upsert("b.pdf", 4, 300, "h2")
+    cat.upsert("a.pdf", 6, 800, "h3")  # reindexado: reemplaza la fila, no suma otra
+    assert cat.totals() == {"sources": 2, "chunks": 10, "bytes": 1100}
+    assert [s.source for s in cat.sources()] == ["a.pdf", "b.pdf"] and cat.get("a.pdf").content_hash == "h3"
+    cat.upsert("b.pdf", 0, 0, "h4")  # sin fragmentos = fuera de la colección
+    cat.delete("no-existe.pdf")
+    assert cat.totals() == {"sources": 1, "chunks": 6, "bytes": 800} and cat.get("b.pdf") is None
+    cat.close()
+
+def test_ensure_catalog_rebuilds_from_the_collection(fake_ollama, db_path, collection):
+    store = get_store(db_path, collection)
+    text = "Metas del trimestre: CSAT mayor a 90 y primera respuesta en menos de dos horas. " * 3
+    ingest_text("metas.txt", text, store=store)
+    catalog = get_catalog(db_path, store.name)
+    assert not ensure_catalog(store)  # ingest_text ya lo mantuvo al día
+    catalog.delete("metas.txt")  # como una colección indexada antes del catálogo
+    assert ensure_catalog(store)
+    row = catalog.get("metas.txt")
+    assert row.chunks == store.count() and catalog.totals()["chunks"] == store.count()
+    (doc,) = store.collection.get()["documents"]
+    assert row.content_hash == text_sha256(doc)  # sin el original: aproximado con los fragmentos
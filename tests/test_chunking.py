@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import pytest
+
+from app.chunking import chunk_pages, chunk_text
+
+PAGES = [
+    "Capítulo 1. " + " ".join(f"El agente registra el caso número {i} y confirma los datos." for i in range(30)),
+    "",  # página en blanco: no cuenta para los offsets
+    "Capítulo 2. " + " ".join(f"El supervisor revisa el reclamo {i} antes del cierre." for i in range(30)),
+]
+
+def test_positions_point_back_into_the_pages():
+    doc = " ".join(p.strip() for p in PAGES if p.strip())
+    chunks = list(chunk_pages(PAGES, max_chars=400, overlap_chars=80, min_tail_merge=100))
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+    for c in chunks:
+        assert doc[c.char_start : c.char_end] == c.text
+        assert c.page_start <= c.page_end and c.page_start in (1, 3) and c.page_end in (1, 3)
+        assert len(c.text) <= 400 + 100
+    assert chunks[0].page_start == 1 and chunks[-1].page_end == 3
+    assert any(c.page_start == 1 and c.page_end == 3 for c in chunks)  # un chunk cruza el salto de página
+
+def test_neighbours_overlap_and_cut_at_sentences():
+    chunks = list(chunk_pages(PAGES, max_chars=400, overlap_chars=80, min_tail_merge=100))
+    for a, b in zip(chunks, chunks[1:]):
+        assert b.char_start < a.char_end and a.text.endswith(b.text[: a.char_end - b.char_start])
+        assert a.text.endswith(".")
+        assert not b.text[0].isspace()
+
+def test_pages_are_consumed_lazily():
+    read = []
+
+    def pages():
+        for i in range(50):
+            read.append(i)
+            yield f"Página {i}: " + "texto del procedimiento vigente. " * 20
+
+    first = next(chunk_pages(pages(), max_chars=500, overlap_chars=50))
+    assert first.index == 0 and len(read) < 5  # no junta el documento entero
+
+def test_short_tail_is_merged_and_bad_params_rejected():
+    text = "Primera oración larga del manual de atención. " * 12 + "Fin."
+    chunks = chunk_text(text, max_chars=300, overlap_chars=50, min_tail_merge=100)
+    assert chunks[-1].endswith("Fin.") and len(chunks[-1]) > 100
+    with pytest.raises(ValueError):
+        chunk_text(text, max_chars=100, overlap_chars=100)
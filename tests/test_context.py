@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from app.context import Hit, estimate_tokens, pack_context
+
+OVERLAP = "Paso dos: revisar la deuda pendiente del cliente."  # lo que repite el chunker entre vecinos
+A0 = "Paso uno: verificar la identidad del titular. " + OVERLAP
+A1 = OVERLAP + " Paso tres: ofrecer el plan de pagos vigente."
+
+def test_neighbours_merge_without_repeating_overlap():
+    hits = [Hit("a.pdf", 1, A1), Hit("b.pdf", 0, "Otra fuente."), Hit("a.pdf", 0, A0), Hit("a.pdf", 1, A1)]
+    context, tags = pack_context(hits, max_tokens=0, overlap_chars=40)
+    assert tags == ["[a.pdf#0]", "[a.pdf#1]", "[b.pdf#0]"]  # bloque de a.pdf primero: tiene el mejor rango
+    block = context.split("\n\n")[0]
+    assert block == f"[a.pdf#0] {A0} [a.pdf#1] Paso tres: ofrecer el plan de pagos vigente."
+    assert context.count(OVERLAP) == 1
+
+def test_budget_keeps_most_relevant_hits():
+    hits = [Hit(f"{i}.pdf", 0, "texto de relleno " * 20) for i in range(6)]
+    info = {}
+    context, tags = pack_context(hits, max_tokens=250, info=info)
+    assert tags == ["[0.pdf#0]", "[1.pdf#0]"] and info["context_dropped"] == 4
+    assert info["context_tokens"] == estimate_tokens(context) <= 250
+
+def test_first_hit_is_truncated_when_alone_too_big():
+    context, tags = pack_context([Hit("largo.pdf", 3, "x" * 5000)], max_tokens=100)
+    assert tags == ["[largo.pdf#3]"] and estimate_tokens(context) <= 100
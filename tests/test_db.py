@@ -0,0 +1,32 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db
+from app.db import close_stores, get_store, write_alias
+
+def test_store_is_shared_and_opened_once(db_path, collection, monkeypatch):
+    opened = []
+    real = db.get_client
+    monkeypatch.setattr(db, "get_client", lambda path: opened.append(path) or real(path))
+
+    store = get_store(db_path, collection)
+    assert store._client is None  # perezoso: nada se abre hasta usar la colección
+    with ThreadPoolExecutor(8) as pool:
+        stores = list(pool.map(lambda _: get_store(db_path, collection), range(32)))
+        cols = list(pool.map(lambda s: s.collection, stores))
+    assert all(s is store for s in stores) and all(c is cols[0] for c in cols)
+    assert len(opened) == 1
+
+def test_close_stores_drops_the_shared_store(db_path, collection):
+    store = get_store(db_path, collection)
+    store.collection.add(ids=["x"], documents=["hola"], embeddings=[[0.1, 0.2]])
+    close_stores()
+    assert store._client is None and store._col is None
+    reopened = get_store(db_path, collection)
+    assert reopened is not store and reopened.count() == 1
+
+def test_alias_resolves_to_its_generation(db_path, collection):
+    assert get_store(db_path, collection).name == collection  # sin alias es la colección misma
+    write_alias(db_path, collection, f"{collection}__g2", generation=2, version=1)
+    store = get_store(db_path, collection)
+    assert store.name == f"{collection}__g2" and store is get_store(db_path, f"{collection}__g2")
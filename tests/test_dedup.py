@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from app.catalog import get_catalog, text_sha256
+from app.db import existing_ids, get_store
+from app.dedup import get_dedup_index, minhash, promote_orphans, similarity
+from app.ingest_text import ingest_text
+from app.lexical import get_lexical_index
+
+BOILERPLATE = " ".join([
+    "Aviso de confidencialidad: este material es de uso interno del centro de contacto.",
+    "No se debe compartir con clientes ni publicar fuera de la intranet de capacitación.",
+    "Ante dudas sobre privacidad de datos, consultar al supervisor de turno antes de actuar.",
+] * 4)
+
+def test_minhash_estimates_jaccard():
+    a = minhash(BOILERPLATE)
+    assert similarity(a, minhash(BOILERPLATE)) == 1.0
+    assert similarity(a, minhash(BOILERPLATE.replace("turno", "guardia", 1))) > 0.8
+    assert similarity(a, minhash("Métricas de calidad: CSAT, NPS, FCR y AHT por agente y semana.")) < 0.2
+
+def test_near_duplicates_link_and_orphans_are_promoted(fake_ollama, db_path, collection):
+    store = get_store(db_path, collection)
+    dedup = get_dedup_index(db_path, store.name)
+    first = ingest_text("a.txt", BOILERPLATE, store=store)
+    second = ingest_text("b.txt", BOILERPLATE, store=store)
+    assert first.linked == 0
+    assert second.linked == second.chunks  # todo b.txt enlazado: sin embeddings ni vectores propios
+    assert store.count() == first.chunks
+    assert dedup.linked_by_source() == {"b.txt": second.chunks}
+
+    # Se borra el canónico: los enlaces de b.txt quedan huérfanos y uno sube a la colección.
+    store.collection.delete(ids=list(existing_ids(store.collection, "a.txt")))
+    dedup.delete_source("a.txt")
+    assert len(dedup.orphans()) == second.chunks
+    promoted = promote_orphans(store.collection, dedup, get_lexical_index(db_path, store.name))
+    assert promoted >= 1
+    assert dedup.orphans() == []
+    assert len(existing_ids(store.collection, "b.txt")) == promoted
+    assert dedup.count() == store.count()
+
+TEXT = " ".join([
+    "La política de devoluciones permite reembolsos dentro de los 30 días con ticket.",
+    "El agente registra el reclamo en el sistema y escala al supervisor si no hay respuesta.",
+] * 40)
+
+def test_catalog_hash_is_document_hash_with_dedup(fake_ollama, db_path, collection):
+    store = get_store(db_path, collection)
+    res = ingest_text("politicas.txt", TEXT, store=store)
+    assert res.linked > 0  # el texto repetido genera casi duplicados
+    row = get_catalog(db_path, store.name).get("politicas.txt")
+    assert row is not None
+    assert row.content_hash == text_sha256(TEXT)
+    assert row.bytes == len(TEXT.encode("utf-8"))
+    assert row.chunks == res.chunks
@@ -0,0 +1,37 @@
+from __future__ import annotations
+import time
+
+import pytest
+
+from app import embeddings
+from app.embed_cache import EmbeddingCache
+
+@pytest.fixture
+def cache(tmp_path):
+    c = EmbeddingCache(tmp_path / "embeddings.sqlite3", max_entries=10)
+    yield c
+    c.close()
+
+def test_hits_are_per_model_and_text(cache):
+    cache.put_many("m1", ["hola", "chau"], [[1.0, 0.5], [0.25, -1.0]])
+    assert cache.get_many("m1", ["chau", "otro", "hola", "chau"]) == [[0.25, -1.0], None, [1.0, 0.5], [0.25, -1.0]]
+    assert cache.get_many("m2", ["hola"]) == [None]  # otro modelo, otro espacio de vectores
+    assert (cache.stats.hits, cache.stats.misses) == (3, 2)
+
+def test_evicts_least_recently_used(cache):
+    cache.put_many("m", [f"t{i}" for i in range(10)], [[float(i)] for i in range(10)])
+    time.sleep(0.01)
+    cache.get_many("m", ["t0"])  # recién usado: sobrevive al desalojo
+    time.sleep(0.01)
+    cache.put_many("m", ["nuevo"], [[99.0]])
+    assert cache.size() == 9 and cache.stats.evictions == 2
+    assert cache.get_many("m", ["t0", "nuevo", "t1", "t2"]) == [[0.0], [99.0], None, None]
+
+def test_embed_texts_only_sends_misses(fake_ollama, cache, monkeypatch):
+    monkeypatch.setattr(embeddings, "get_embedding_cache", lambda: cache)
+    texts = ["primer fragmento del manual", "segundo fragmento del manual"]
+    first = embeddings.embed_texts(texts, "nomic-embed-text")
+    before = fake_ollama.calls["texts"]
+    again = embeddings.embed_texts(texts + ["fragmento nuevo"], "nomic-embed-text")
+    assert fake_ollama.calls["texts"] - before == 1
+    assert all(a == pytest.approx(b, rel=1e-6) for a, b in zip(again, first))  # guardados como float32
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import pytest
+
+from app import embeddings
+from app.embeddings import embed_texts
+
+TEXTS = [f"Procedimiento {i}: verificar identidad del cliente antes de operar." for i in range(7)]
+
+def test_batches_keep_input_order(fake_ollama):
+    before = dict(fake_ollama.calls)
+    embs = embed_texts(TEXTS, "nomic-embed-text", batch_size=2, workers=3, use_cache=False)
+    assert embs == [fake_ollama.vector(t) for t in TEXTS]
+    assert fake_ollama.calls["embed"] - before["embed"] == 4  # ceil(7 / 2) lotes
+    assert fake_ollama.calls["texts"] - before["texts"] == len(TEXTS)
+
+def test_failed_batch_is_retried(fake_ollama, monkeypatch):
+    monkeypatch.setattr(embeddings.time, "sleep", lambda s: None)
+    real, fails = embeddings._embed_call, []
+
+    def flaky(batch, model):
+        if not fails:
+            fails.append(batch)
+            raise ConnectionError("reset")
+        return real(batch, model)
+
+    monkeypatch.setattr(embeddings, "_embed_call", flaky)
+    assert embed_texts(TEXTS[:3], "m", batch_size=3, retries=2, use_cache=False) == [
+        fake_ollama.vector(t) for t in TEXTS[:3]
+    ]
+    assert len(fails) == 1
+
+def test_retries_exhausted_raise(fake_ollama, monkeypatch):
+    monkeypatch.setattr(embeddings.time, "sleep", lambda s: None)
+
+    def down(batch, model):
+        raise ConnectionError("ollama caído")
+
+    monkeypatch.setattr(embeddings, "_embed_call", down)
+    with pytest.raises(RuntimeError, match="ollama caído"):
+        embed_texts(TEXTS[:2], "m", retries=1, use_cache=False)
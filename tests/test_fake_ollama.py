@@ -0,0 +1,38 @@
+from __future__ import annotations
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from tools import loadgen
+from tools.fake_ollama import Profile, create_app
+
+MESSAGES = [{"role": "system", "content": "Sos un asistente."}, {"role": "user", "content": "Contexto [m.pdf#2] ¿Qué es FCR?"}]
+
+def test_speaks_the_ollama_api():
+    client = TestClient(create_app(Profile(answer_tokens=12), dim=16))
+    assert "nomic-embed-text:latest" in [m["name"] for m in client.get("/api/tags").json()["models"]]
+    r = client.post("/api/embed", json={"model": "e", "input": ["hola", "chau"]}).json()
+    assert len(r["embeddings"]) == 2 and len(r["embeddings"][0]) == 16 and r["prompt_eval_count"] == 4
+    assert client.post("/api/embeddings", json={"model": "e", "prompt": "hola"}).json()["embedding"] == r["embeddings"][0]
+
+    lines = [json.loads(x) for x in client.post("/api/chat", json={"model": "c", "messages": MESSAGES}).text.splitlines()]
+    *tokens, final = lines
+    streamed = "".join(p["message"]["content"] for p in tokens)
+    assert final["done"] and final["eval_count"] == len(tokens) and streamed.endswith("[m.pdf#2]")
+    whole = client.post("/api/chat", json={"model": "c", "messages": MESSAGES, "stream": False}).json()
+    assert whole["message"]["content"] == streamed  # determinista: mismo prompt, misma respuesta
+    assert client.get("/fake/stats").json()["chat"] == 2
+
+def test_loadgen_mix_workload_and_summary():
+    assert loadgen.parse_mix("chat=8,sources") == [("chat", 8.0), ("sources", 1.0)]
+    with pytest.raises(SystemExit):
+        loadgen.parse_mix("chat=1,borrar=1")
+    work = loadgen.Workload([("chat", 1.0)], unique=True, top_k=4)
+    assert work.next()[0] == "chat" and work.n == 1
+
+    results = [("chat", 0.1, "200"), ("chat", 0.3, "200"), ("chat", 0.2, "429"), ("sources", 0.05, "ReadTimeout")]
+    report = loadgen.summarize(results, elapsed=2.0)
+    chat = report["endpoints"]["chat"]
+    assert (chat["requests"], chat["errors"], chat["p50_ms"], chat["max_ms"]) == (3, 1, 100.0, 300.0)
+    assert report["endpoints"]["total"]["error_rate"] == 0.5 and report["endpoints"]["sources"]["status"] == {"ReadTimeout": 1}
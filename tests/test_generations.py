@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from app import indexer
+from app.catalog import get_catalog
+from app.db import get_store, read_alias
+from app.generations import clone_generation, gc_generations, list_generations, next_generation, publish
+from app.indexer import build_index
+from app.ingest_text import ingest_text
+
+def _text(topic: str) -> str:
+    return f"Guía de {topic}: pasos, responsables y tiempos de respuesta esperados para el equipo. " * 4
+
+def test_clone_publish_and_gc(fake_ollama, db_path, collection):
+    live = get_store(db_path, collection)  # sin alias: es la generación 0
+    ingest_text("reclamos.txt", _text("reclamos"), store=live)
+    ingest_text("bajas.txt", _text("bajas"), store=live)
+    client = live.client
+
+    gen, name = next_generation(db_path, collection, client)
+    assert (gen, name) == (1, f"{collection}__g1")
+    g1 = get_store(db_path, name)
+    copied = clone_generation(live, g1, exclude={"bajas.txt"})
+    assert copied == g1.count() == get_catalog(db_path, live.name).get("reclamos.txt").chunks
+    assert [s.source for s in get_catalog(db_path, g1.name).sources()] == ["reclamos.txt"]
+    assert get_store(db_path, collection).name == collection  # nada cambia hasta publicar
+
+    g1.bump_version(floor=live.version())
+    publish(db_path, collection, g1, gen)
+    assert get_store(db_path, collection).name == name
+    assert read_alias(db_path, collection)["generation"] == 1
+    assert g1.version() > live.version()
+
+    gen2, name2 = next_generation(db_path, collection, client)
+    g2 = get_store(db_path, name2)
+    clone_generation(g1, g2, exclude=set())
+    g2.bump_version(floor=g1.version())
+    publish(db_path, collection, g2, gen2)
+    dropped = gc_generations(db_path, collection, client, keep=2)
+    assert dropped == [collection]  # se conservan la vigente y la anterior
+    assert [n for _, n in list_generations(client, collection)] == [name, name2]
+    assert not (db_path / f"{collection}.catalog.sqlite3").exists()
+
+def test_rebuilt_pdf_wins_over_ingest_during_build(fake_ollama, db_path, collection, tmp_path, monkeypatch):
+    docs = tmp_path / "materiales"
+    docs.mkdir()
+    pdf = docs / "manual.pdf"
+    pdf.write_bytes(b"v1")
+    pages = [_text("altas")]
+
+    def extract(paths, workers=0):
+        for fp in paths:
+            yield fp, iter(list(pages))
+
+    monkeypatch.setattr(indexer, "extract_pdfs", extract)
+    build_index(docs, db_path, collection, workers=0)
+
+    # Mientras se arma la generación nueva entra por /ingest_text una fuente con el mismo nombre.
+    pdf.write_bytes(b"v2 con cambios")
+    pages[:] = [_text("bajas")]
+
+    def extract_with_ingest(paths, workers=0):
+        ingest_text("manual.pdf", _text("subido a mano"), store=get_store(db_path, collection))
+        yield from extract(paths, workers)
+
+    monkeypatch.setattr(indexer, "extract_pdfs", extract_with_ingest)
+    build_index(docs, db_path, collection, workers=0)
+    store = get_store(db_path, collection)
+    docs_now = store.collection.get(where={"source": "manual.pdf"}, include=["documents"])["documents"]
+    assert docs_now and all("bajas" in d for d in docs_now)  # lo reprocesado no se pisa con el catch_up
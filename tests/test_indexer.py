@@ -0,0 +1,53 @@
+from __future__ import annotations
+from dataclasses import replace
+
+from app import indexer, pipeline
+from app.config import CFG
+from app.db import get_store
+from app.indexer import build_index
+from app.vector_index import snapshot_root, snapshot_version
+
+def _pages(name: str):
+    return [f"Sección {name}: cómo atender un reclamo, registrar el caso y escalar a tiempo. " * 6]
+
+def _fake_pdfs(tmp_path, monkeypatch, names):
+    docs = tmp_path / "materiales"
+    docs.mkdir()
+    for n in names:
+        (docs / n).write_bytes(n.encode())
+    monkeypatch.setattr(indexer, "extract_pdfs", lambda paths, workers=0: ((p, iter(_pages(p.name))) for p in paths))
+    return docs
+
+def test_incremental_then_force(fake_ollama, db_path, collection, tmp_path, monkeypatch):
+    docs = _fake_pdfs(tmp_path, monkeypatch, ["a.pdf", "b.pdf"])
+    first = build_index(docs, db_path, collection, workers=0)
+    assert (first.added, first.updated, first.skipped) == (2, 0, 0)
+    again = build_index(docs, db_path, collection, workers=0)
+    assert (again.added, again.updated, again.skipped, again.chunks) == (0, 0, 2, 0)
+
+    calls = []
+    real = pipeline.embed_texts
+    monkeypatch.setattr(pipeline, "embed_texts", lambda texts, model, **kw: calls.append(kw) or real(texts, model, **kw))
+    forced = build_index(docs, db_path, collection, workers=0, force=True)
+    assert (forced.added, forced.updated, forced.skipped) == (0, 2, 0)  # ya estaban: son actualizaciones
+    assert calls and all(kw.get("use_cache") is False for kw in calls)  # --force no lee el cache de embeddings
+
+def test_removed_pdf_is_pruned(fake_ollama, db_path, collection, tmp_path, monkeypatch):
+    docs = _fake_pdfs(tmp_path, monkeypatch, ["a.pdf", "b.pdf"])
+    build_index(docs, db_path, collection, workers=0)
+    (docs / "b.pdf").unlink()
+    stats = build_index(docs, db_path, collection, workers=0)
+    assert stats.removed == 1 and stats.chunks_deleted > 0
+    store = get_store(db_path, collection)
+    assert {m["source"] for m in store.collection.get(include=["metadatas"])["metadatas"]} == {"a.pdf"}
+
+def test_chroma_backend_exports_no_snapshot(fake_ollama, db_path, collection, tmp_path, monkeypatch):
+    docs = _fake_pdfs(tmp_path, monkeypatch, ["a.pdf"])
+    monkeypatch.setattr(indexer, "CFG", replace(CFG, search_backend="chroma"))
+    build_index(docs, db_path, collection, workers=0)
+    assert not snapshot_root(db_path, get_store(db_path, collection).name).exists()
+    monkeypatch.setattr(indexer, "CFG", replace(CFG, search_backend="numpy"))
+    (docs / "b.pdf").write_bytes(b"b")
+    build_index(docs, db_path, collection, workers=0)
+    store = get_store(db_path, collection)
+    assert snapshot_version(db_path, store.name) == store.version()
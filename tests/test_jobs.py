@@ -0,0 +1,89 @@
+from __future__ import annotations
+import time
+from pathlib import Path
+
+import pytest
+
+from app.ingest_text import IngestResult
+from app.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, run_job
+from app.pdf import PdfPool, extract_pdfs
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(tmp_path / "jobs.sqlite3", max_attempts=2)
+    yield q
+    q.close()
+
+def test_claim_oldest_and_skip_running_source(queue):
+    a = queue.submit("text", "a.txt", text="uno")
+    queue.submit("text", "a.txt", text="dos")
+    c = queue.submit("text", "c.txt", text="tres")
+    job, text = queue.claim()
+    assert (job.id, job.status, job.attempts, text) == (a.id, RUNNING, 1, "uno")
+    job2, _ = queue.claim()
+    assert job2.id == c.id  # el segundo de a.txt espera a que termine el primero
+    assert queue.claim() is None
+
+def test_retry_with_backoff_then_fail(queue):
+    queue.submit("text", "a.txt", text="x")
+    job, _ = queue.claim()
+    assert queue.fail(job, "RuntimeError: boom", retry=True, backoff_s=60)
+    assert queue.get(job.id).status == QUEUED
+    assert queue.claim() is None  # todavía en espera (run_after)
+    assert not queue.fail(job, "x", retry=True)  # ya no está "running": no se aplica
+    queue._conn.execute("UPDATE jobs SET run_after = 0")
+    job, _ = queue.claim()
+    assert job.attempts == 2
+    assert not queue.fail(job, "RuntimeError: boom", retry=True)  # sin intentos restantes
+    done = queue.get(job.id)
+    assert done.status == FAILED and done.error == "RuntimeError: boom"
+
+def test_recover_only_stale_jobs_of_other_owners(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    mine, other = JobQueue(path), JobQueue(path)
+    job = mine.submit("text", "a.txt", text="x")
+    mine.claim()
+    assert other.recover(stale_s=60) == 0  # latido reciente: sigue siendo de `mine`
+    assert other.recover(stale_s=0) == 1
+    assert other.get(job.id).status == QUEUED
+    claimed, _ = other.claim()
+    assert claimed.id == job.id
+    assert mine.heartbeat() == 0  # ya no le pertenece
+    mine.finish(claimed, IngestResult(source="a.txt", chunks=1, total_after=1))
+    assert other.get(job.id).status == RUNNING  # el resultado del dueño anterior se descarta
+
+def test_run_job_invalid_input_fails_without_retry(queue, fake_ollama):
+    job = queue.submit("text", "corto.txt", text="muy corto")
+    claimed, text = queue.claim()
+    run_job(queue, claimed, text)
+    row = queue.get(job.id)
+    assert row.status == FAILED and row.attempts == 1 and row.error.startswith("ValueError")
+
+def test_run_job_ingests_and_finishes(queue, fake_ollama):
+    text = "Procedimiento de escalamiento: el agente registra el ticket y avisa al supervisor. " * 5
+    job = queue.submit("text", "escalamiento.txt", text=text, nbytes=len(text))
+    claimed, body = queue.claim()
+    t0 = time.time()
+    run_job(queue, claimed, body)
+    row = queue.get(job.id)
+    assert row.status == DONE and row.finished_at >= t0
+    assert row.to_dict()["result"]["source"] == "escalamiento.txt"
+    assert row.chunks_done == row.chunks_total > 0
+
+def test_uploaded_pdfs_share_one_pool(tmp_path):
+    manual = Path(__file__).resolve().parents[1] / "materiales" / "manual_capacitacion.pdf"
+    pool = PdfPool(workers=1)
+    try:
+        first = [p for _, it in extract_pdfs([manual], shared=pool) for p in it]
+        executor = pool.get()
+        second = [p for _, it in extract_pdfs([manual], shared=pool) for p in it]
+        assert pool.get() is executor  # ni se cierra al terminar ni se crea otro por archivo
+        assert first == second and "Manual de Capacitación" in first[0]
+        # Otro hilo mata el pool con rangos nuestros en vuelo: se reenvían una vez al nuevo.
+        gen = extract_pdfs([manual], pages_per_task=1, shared=pool)  # uno corre, el resto espera turno
+        _, pages = next(gen)
+        pool.replace(executor)
+        assert list(pages) == first and pool.get() is not executor
+        gen.close()
+    finally:
+        pool.close()
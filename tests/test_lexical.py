@@ -0,0 +1,46 @@
+from __future__ import annotations
+from concurrent.futures import Future
+
+from app import retriever
+from app.db import get_store
+from app.ingest_text import ingest_text
+from app.lexical import LexicalHit, LexicalIndex, tokenize
+from app.retriever import _assemble, retrieve
+
+def test_tokenize_folds_accents_stopwords_and_plurals():
+    assert tokenize("Las METAS de facturación y los procesos") == ["meta", "facturacion", "proceso"]
+    assert tokenize("CSAT del mes 3") == ["csat", "mes", "3"]  # palabras cortas intactas
+
+def test_bm25_prefers_rare_terms_and_forgets_deleted(tmp_path):
+    idx = LexicalIndex(tmp_path / "bm25.sqlite3")
+    texts = {
+        "a": "Reclamo de facturación: revisar la factura y el plan del cliente.",
+        "b": "Portabilidad numérica: validar el NIP antes de iniciar el trámite.",
+        "c": "Reclamo por demora en la portabilidad: informar el plazo al cliente.",
+    }
+    idx.add(list(texts), [{"source": f"{k}.txt", "chunk": 0} for k in texts], list(texts.values()))
+    hits = idx.search("¿El NIP de la portabilidad?", k=3)
+    assert [h.id for h in hits] == ["b", "c"]  # "nip" solo aparece en b
+    assert hits[0].coverage == 1.0 and hits[1].coverage == 0.5
+    idx.delete_source("b.txt")
+    assert [h.id for h in idx.search("NIP portabilidad")] == ["c"] and idx.count() == 2
+    idx.close()
+
+def test_rrf_ranks_chunks_found_by_both_first():
+    vector = (["a", "b"], ["texto a", "texto b"], [{"source": "a.txt", "chunk": 0}, {"source": "b.txt", "chunk": 0}], [0.1, 0.2])
+    lexical = [LexicalHit("b", "b.txt", 0, "texto b", 3.0, 1.0), LexicalHit("c", "c.txt", 0, "texto c", 2.0, 1.0)]
+    info = {}
+    _, sources, _ = _assemble(vector, lexical, k=3, threshold=0.5, fallback_if_empty=True, info=info)
+    assert sources == ["[b.txt#0]", "[a.txt#0]", "[c.txt#0]"] and info["mode"] == "hybrid"
+    _, sources, _ = _assemble(vector, [], k=3, threshold=0.15, fallback_if_empty=True, info=info)
+    assert sources == ["[a.txt#0]"] and info["mode"] == "vector"  # b no pasa el umbral
+
+def test_lexical_only_when_embedding_misses_budget(fake_ollama, db_path, collection, monkeypatch):
+    store = get_store(db_path, collection)
+    ingest_text("garantia.txt", "Garantía del equipo: doce meses desde la compra, presentando la factura original.", store=store)
+    ingest_text("horario.txt", "Horario de atención telefónica: lunes a viernes de 9 a 18, sábados de 9 a 13.", store=store)
+    monkeypatch.setattr(retriever, "embed_query_future", lambda q: Future())  # el modelo nunca responde
+    info = {}
+    context, sources, _ = retrieve("garantía del equipo", store=store, info=info, embed_budget_ms=20)
+    assert info["mode"] == "lexical_only" and info["embed_timeout"]
+    assert sources == ["[garantia.txt#0]"] and "doce meses" in context
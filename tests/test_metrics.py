@@ -0,0 +1,53 @@
+from __future__ import annotations
+import asyncio
+
+import pytest
+
+from app.metrics import ERRORS, STAGE_SECONDS, Counter, Histogram, Registry, timed, trace_request
+
+def test_render_prometheus_text():
+    reg = Registry()
+    c = reg.register(Counter("t_requests_total", "Requests.", ["route"]))
+    h = reg.register(Histogram("t_seconds", "Duración.", buckets=(0.1, 1.0)))
+    c.inc(route='/chat "x"')
+    c.inc(2, route='/chat "x"')
+    for v in (0.05, 0.5, 3.0):
+        h.observe(v)
+    lines = reg.render().splitlines()
+    assert "# TYPE t_requests_total counter" in lines
+    assert 't_requests_total{route="/chat \\"x\\""} 3' in lines
+    assert [ln for ln in lines if ln.startswith("t_seconds_bucket")] == [
+        't_seconds_bucket{le="0.1"} 1', 't_seconds_bucket{le="1"} 2', 't_seconds_bucket{le="+Inf"} 3',
+    ]
+    assert "t_seconds_count 3" in lines
+    with pytest.raises(ValueError):
+        c.inc(ruta="/chat")  # etiquetas distintas de las declaradas
+
+def _count(stage: str) -> float:
+    prefix = f'asistente_stage_seconds_count{{stage="{stage}"}} '
+    return next((float(ln[len(prefix):]) for ln in STAGE_SECONDS.samples() if ln.startswith(prefix)), 0.0)
+
+def test_timed_feeds_histogram_and_request_trace():
+    def profile():
+        with timed("t.profile"):
+            pass
+
+    async def handler():
+        with trace_request() as trace:
+            await asyncio.to_thread(profile)  # el hilo hereda el contexto del request
+            with timed("t.prompt"):
+                await asyncio.sleep(0.01)
+        return trace
+
+    before = _count("t.prompt")
+    trace = asyncio.run(handler())
+    assert set(trace) == {"t.profile", "t.prompt"} and trace["t.prompt"] >= 10
+    assert _count("t.prompt") == before + 1
+    with timed("t.fuera"):  # sin traza activa solo se alimenta el histograma
+        pass
+    assert _count("t.fuera") == 1
+
+def test_timed_counts_errors():
+    with pytest.raises(RuntimeError), timed("t.falla"):
+        raise RuntimeError("boom")
+    assert 'asistente_errors_total{where="t.falla"} 1' in ERRORS.samples()
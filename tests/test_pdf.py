@@ -0,0 +1,32 @@
+from __future__ import annotations
+from pathlib import Path
+
+from app.catalog import get_catalog
+from app.db import get_store
+from app.ingest_text import ingest_file, ingest_text
+from app.manifest import file_sha256
+from app.pdf import extract_pdfs, load_pdf_pages
+
+MANUAL = Path(__file__).resolve().parents[1] / "materiales" / "manual_capacitacion.pdf"
+
+def test_pool_extraction_matches_in_process(tmp_path):
+    other = tmp_path / "copia.pdf"
+    other.write_bytes(MANUAL.read_bytes())
+    expected = load_pdf_pages(MANUAL)
+    got = [(fp.name, list(pages)) for fp, pages in extract_pdfs([MANUAL, other], workers=2, pages_per_task=1)]
+    assert got == [(MANUAL.name, expected), ("copia.pdf", expected)]  # orden de archivos y de páginas
+    assert [list(p) for _, p in extract_pdfs([MANUAL], workers=0)] == [expected]
+
+def test_content_hash_is_hash_of_the_source_as_received(fake_ollama, db_path, collection, tmp_path):
+    store = get_store(db_path, collection)
+    ingest_file(MANUAL, "manual.pdf", store=store)
+    text = "  Texto enviado por /ingest_text, con espacios al principio y al final para el hash.  \n"
+    ingest_text("nota.txt", text, store=store)
+    catalog = get_catalog(db_path, store.name)
+    assert catalog.get("manual.pdf").content_hash == file_sha256(MANUAL)  # igual que el manifest de build_index
+    assert catalog.get("manual.pdf").bytes == MANUAL.stat().st_size
+    assert catalog.get("nota.txt").content_hash == file_sha256(_write(tmp_path / "nota.txt", text))
+
+def _write(path: Path, text: str) -> Path:
+    path.write_bytes(text.encode("utf-8"))
+    return path
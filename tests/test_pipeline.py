@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import pytest
+
+from app import pipeline
+from app.db import get_store
+from app.indexer import _hash_id
+from app.pipeline import IngestPipeline
+
+def _manual(tema: str, n: int):
+    return [f"Página {i} del manual de {tema}: pasos para validar la solicitud y cerrarla. " * 8 for i in range(n)]
+
+def _run(col, docs, **kw):
+    done = []
+    stats = IngestPipeline(col, _hash_id, max_chars=400, overlap_chars=50, on_source_done=done.append, **kw).run(
+        (name, name, iter(pages)) for name, pages in docs
+    )
+    return stats, done
+
+def test_sources_flow_through_all_stages(fake_ollama, db_path, collection):
+    col = get_store(db_path, collection).collection
+    stats, done = _run(col, [("a.pdf", _manual("altas", 3)), ("b.pdf", _manual("bajas", 2))])
+    assert [r.source for r in done] == ["a.pdf", "b.pdf"]  # en orden, una vez por fuente
+    assert stats.sources == 2 and stats.embedded == stats.upserted == stats.chunks == col.count()
+    got = col.get(include=["metadatas", "embeddings"])
+    assert {m["source"] for m in got["metadatas"]} == {"a.pdf", "b.pdf"}
+    assert all(len(e) > 0 for e in got["embeddings"])
+
+def test_reuse_embeds_only_new_chunks_and_drops_stale(fake_ollama, db_path, collection, monkeypatch):
+    col = get_store(db_path, collection).collection
+    first, _ = _run(col, [("a.pdf", _manual("altas", 3))])
+    embedded = []
+    real = pipeline.embed_texts
+    monkeypatch.setattr(pipeline, "embed_texts", lambda texts, model, **kw: embedded.extend(texts) or real(texts, model, **kw))
+
+    _, (res,) = _run(col, [("a.pdf", _manual("altas", 2))])  # el manual perdió una página
+    assert res.had_previous and 0 < res.new < res.chunks < first.chunks  # solo cambia el final
+    assert len(embedded) == res.new and res.deleted > 0 and col.count() == res.chunks
+
+    embedded.clear()
+    _, (res,) = _run(col, [("a.pdf", _manual("altas", 2))], reuse=False)
+    assert res.new == res.chunks == len(embedded)  # sin reuso se re-embebe todo
+
+def test_stage_error_stops_the_run(fake_ollama, db_path, collection, monkeypatch):
+    col = get_store(db_path, collection).collection
+
+    def down(texts, model, **kw):
+        raise RuntimeError("ollama caído")
+
+    monkeypatch.setattr(pipeline, "embed_texts", down)
+    with pytest.raises(RuntimeError, match="ollama caído"):
+        _run(col, [(f"{i}.pdf", _manual("altas", 4)) for i in range(20)])
+    assert col.count() == 0
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import pytest
+
+from app import retriever
+from app.embed_cache import EmbeddingCache
+from app.retriever import QueryEmbeddingCache, normalize_query
+
+def test_normalize_query_strips_accents_and_punctuation():
+    assert normalize_query("¿Qué es  CSAT?") == normalize_query("que es csat") == "que es csat"
+    assert normalize_query("Política de ESCALAMIENTO") == "politica de escalamiento"
+
+def test_normalize_query_keeps_enye():
+    assert normalize_query("¿Qué metas hay este AÑO?") == "que metas hay este año"
+    assert normalize_query("año") != normalize_query("ano")
+
+def test_query_cache_memoizes_normalized_queries(fake_ollama):
+    cache = QueryEmbeddingCache(max_entries=4, use_disk=False)
+    before = fake_ollama.calls["texts"]
+    emb, origin = cache.get("¿Cómo escalo un reclamo?")
+    assert origin == "model" and emb == fake_ollama.vector("¿Cómo escalo un reclamo?")
+    assert cache.get("como escalo un reclamo") == (emb, "memory")
+    out = cache.get_many(["Horario de atención", "horario de atencion", "¿CÓMO escalo un reclamo?"])
+    assert [o for _, o in out] == ["model", "model", "memory"]
+    assert fake_ollama.calls["texts"] - before == 2  # las repetidas no vuelven al modelo
+    assert cache.stats()["memory_hits"] == 2 and cache.stats()["misses"] == 2
+
+def test_query_cache_falls_back_to_disk(fake_ollama, tmp_path, monkeypatch):
+    disk = EmbeddingCache(tmp_path / "embeddings.sqlite3", max_entries=10)
+    monkeypatch.setattr(retriever, "get_embedding_cache", lambda: disk)
+    emb, _ = QueryEmbeddingCache(max_entries=4, use_disk=True).get("plazo de reintegro")
+    before = fake_ollama.calls["texts"]
+    again, origin = QueryEmbeddingCache(max_entries=4, use_disk=True).get("Plazo de reintegro")
+    assert origin == "disk" and again == pytest.approx(emb, rel=1e-6)  # en disco queda como float32
+    assert fake_ollama.calls["texts"] == before
+    disk.close()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+import asyncio
+import json
+import time
+from dataclasses import replace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import readiness
+from app.catalog import get_catalog
+from app.db import get_store
+from app.ingest_text import ingest_text
+
+REPEATED = " ".join(["Antes de cerrar el caso, confirmar con el cliente que el reclamo quedó resuelto."] * 60)
+
+@pytest.fixture
+def client(fake_ollama, monkeypatch):
+    models = {"ollama": True, "embed_model": True, "chat_model": True}
+    monkeypatch.setattr(readiness, "check_models", lambda *a, **kw: dict(models))
+    import server
+
+    with TestClient(server.app) as c:
+        deadline = time.monotonic() + 10
+        while c.get("/readyz").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        yield c
+
+def test_health_reports_stored_vectors_apart_from_catalog(client):
+    store = get_store()
+    res = ingest_text("cierre.txt", REPEATED, store=store)
+    assert res.linked > 0  # fragmentos enlazados: en el catálogo, sin vector propio
+    body = client.get("/health").json()
+    assert body["status"] == "ok" and body["ready"] is True
+    assert body["chroma_count"] == store.count()
+    assert body["catalog"] == get_catalog(store.db_path, store.name).totals()
+    assert body["catalog"]["chunks"] == store.count() + res.linked
+
+def test_readiness_states(monkeypatch):
+    checks = {"ollama": True, "embed_model": True, "chat_model": False}
+    monkeypatch.setattr(readiness, "check_models", lambda *a, **kw: dict(checks))
+    monitor = readiness.ReadinessMonitor(extra=lambda: {"chroma_count": 3})
+    state = asyncio.run(monitor.refresh())
+    assert (state["ready"], state["status"], state["checks"]["chroma_count"]) == (False, "degraded", 3)
+    checks["chat_model"] = True
+    assert asyncio.run(monitor.refresh())["status"] == "ready"
+
+    def down(*a, **kw):
+        raise ConnectionError("refused")
+
+    monkeypatch.setattr(readiness, "check_models", down)
+    state = asyncio.run(monitor.refresh())
+    assert (state["ready"], state["status"]) == (False, "unavailable") and monitor.snapshot() == state
+
+def _events(body: str):
+    out = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        out.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return out
+
+def test_stream_shares_answer_cache_with_chat(client, monkeypatch):
+    import server
+
+    ingest_text("reclamos.txt", "Para registrar un reclamo se abre un caso con número y se avisa al cliente. " * 3)
+    monkeypatch.setattr(server, "CFG", replace(server.CFG, answer_cache=True))
+    generated = []
+
+    async def fake_stream(model, system_prompt, user_prompt, temperature=0.3):
+        generated.append(user_prompt)
+        for tok in ("Se abre ", "un caso."):
+            yield {"type": "token", "content": tok}
+        yield {"type": "done", "usage": {"total_tokens": 2}, "timings": {}}
+
+    monkeypatch.setattr(server, "chat_stream", fake_stream)
+    body = {"user_id": "u1", "message": "¿Cómo registro un reclamo de un cliente?", "timings": True}
+    first = _events(client.post("/chat/stream", json=body).text)
+    assert [e for e, _ in first] == ["sources", "token", "token", "done"]
+    done = first[-1][1]
+    assert done["meta"]["answer_cache"] == "miss" and "retrieval" in done["meta"]
+    assert "query_embedding" in done["timings"]["stages_ms"]
+
+    second = _events(client.post("/chat/stream", json=body).text)
+    assert [e for e, _ in second] == ["sources", "token", "done"]
+    assert second[1][1]["content"] == "Se abre un caso." and second[-1][1]["meta"]["answer_cache"] == "hit"
+    assert len(generated) == 1
+
+    out = client.post("/chat", json=body).json()  # /chat encuentra lo que generó el stream
+    assert out["answer"] == "Se abre un caso." and out["meta"]["answer_cache"] == "hit"
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.db import get_store
+from app.ingest_text import ingest_text
+from app.vector_index import export_snapshot, load_index, snapshot_root
+
+TOPICS = ["reclamos", "bajas", "facturación", "portabilidad"]
+
+def _store(db_path, collection):
+    store = get_store(db_path, collection)
+    for t in TOPICS:
+        ingest_text(f"{t}.txt", f"Procedimiento de {t}: pasos, responsables y plazos del equipo de {t}. " * 5, store=store)
+    return store
+
+def test_snapshot_matches_chroma(fake_ollama, db_path, collection):
+    store = _store(db_path, collection)
+    version = store.bump_version()
+    export_snapshot(store.collection, db_path, store.name, version)
+    idx = load_index(db_path, store.name)
+    assert idx.version == version and len(idx) == store.count()
+    q = fake_ollama.vector("plazos del equipo de bajas")
+    got = idx.query(q, 3)
+    best = store.collection.query(query_embeddings=[q], n_results=1, include=[])
+    assert got["ids"][0] == best["ids"][0][0] and got["metadatas"][0]["source"] == "bajas.txt"
+    assert got["distances"] == sorted(got["distances"])
+    # Textos y metadatos se leen de rows.sqlite3 por fila: tienen que ser los de cada id.
+    rows = store.collection.get(ids=got["ids"], include=["documents", "metadatas"])
+    by_id = dict(zip(rows["ids"], zip(rows["documents"], rows["metadatas"])))
+    assert [by_id[i] for i in got["ids"]] == list(zip(got["documents"], got["metadatas"]))
+
+def test_current_is_rechecked_at_most_every_interval(fake_ollama, db_path, collection):
+    store = _store(db_path, collection)
+    v1, v2 = store.bump_version(), store.bump_version()
+    export_snapshot(store.collection, db_path, store.name, v1)
+    export_snapshot(store.collection, db_path, store.name, v2)
+    current = snapshot_root(db_path, store.name) / "CURRENT"
+    current.write_text(str(v1))
+    assert load_index(db_path, store.name, recheck_s=60).version == v1
+    current.write_text(str(v2))  # como lo publicaría otro proceso
+    assert load_index(db_path, store.name, recheck_s=60).version == v1  # sin releer CURRENT
+    assert load_index(db_path, store.name, recheck_s=0).version == v2
+
+def test_quantized_scan_reranks_to_exact(db_path, collection):
+    rng = np.random.default_rng(7)
+    vecs = rng.standard_normal((400, 48)).astype(np.float32)
+    store = get_store(db_path, collection)
+    store.collection.add(
+        ids=[f"c{i}" for i in range(len(vecs))], embeddings=vecs.tolist(),
+        documents=[f"fragmento {i}" for i in range(len(vecs))], metadatas=[{"source": "x.txt"}] * len(vecs),
+    )
+    export_snapshot(store.collection, db_path, store.name, store.bump_version())
+    idx = load_index(db_path, store.name)
+    queries = vecs[:20] + 0.3 * rng.standard_normal((20, 48)).astype(np.float32)
+    for mode in ("int8", "binary"):
+        found = 0
+        for i, q in enumerate(queries):
+            exact = idx.query(q.tolist(), 5, mode="none")
+            approx = idx.query(q.tolist(), 5, mode=mode, rerank=120)
+            assert approx["ids"][0] == exact["ids"][0] == f"c{i}"
+            # Re-ordenado en float32: las distancias de los candidatos son las exactas.
+            assert approx["distances"] == sorted(approx["distances"])
+            found += len(set(approx["ids"]) & set(exact["ids"]))
+        assert found / (5 * len(queries)) >= 0.8, mode
+    fp = idx.footprint()
+    assert fp["int8"] < fp["float32"] / 3 and fp["binary"] < fp["float32"] / 16
@@ -0,0 +1,46 @@
+from __future__ import annotations
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+from app import warmup
+from app.db import get_store
+from app.warmup import Warmup
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def test_importing_server_skips_chroma_and_ollama():
+    code = "import sys, server; print('chromadb' in sys.modules, 'ollama' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.split()[-2:] == ["False", "False"]  # se cargan en el warm-up, no al arrancar
+
+def test_warmup_retries_until_ready(db_path, collection, monkeypatch):
+    attempts, ready = [], []
+
+    def load(embed_model, chat_model, keep_alive):
+        attempts.append(keep_alive)
+        if len(attempts) == 1:
+            raise ConnectionError("ollama todavía no arrancó")
+
+    monkeypatch.setattr(warmup, "_load_models", load)
+
+    async def main():
+        async def on_ready():
+            ready.append(1)
+
+        w = Warmup(get_store(db_path, collection), interval_s=0.01, keep_alive="5m", on_ready=on_ready)
+        w.start()
+        failed = None
+        while len(attempts) < 4:
+            if failed is None and w.snapshot()["status"] == "error":
+                failed = w.snapshot()
+            await asyncio.sleep(0.01)
+        await w.stop()
+        return w, failed
+
+    w, failed = asyncio.run(main())
+    assert "todavía no arrancó" in failed["error"] and failed["store_ms"] is not None
+    state = w.snapshot()
+    assert w.done and state["status"] == "done" and "error" not in state and state["pings"] >= 3
+    assert ready == [1] and set(attempts) == {"5m"}  # on_ready una vez; los pings siguen con keep_alive
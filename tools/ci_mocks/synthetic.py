@@ -0,0 +1,95 @@
+from __future__ import annotations
+import hashlib
+import math
+import re
+import time
+from typing import Any, Dict, List, Sequence
+
+# Sustituto determinista de Ollama para benchmarks y pruebas sin modelos:
+# embeddings por "hashing trick" sobre palabras (textos parecidos → vectores parecidos),
+# dimensión fija y latencia configurable. `install()` reemplaza las funciones de `ollama`.
+
+_WORD = re.compile(r"\w+")
+
+class Synthetic:
+    def __init__(
+        self,
+        dim: int = 768,
+        embed_latency_ms: float = 0.0,   # por llamada
+        embed_per_text_ms: float = 0.0,  # por texto dentro de la llamada
+        chat_latency_ms: float = 0.0,
+        tokens_per_s: float = 0.0,       # 0 = respuesta instantánea
+        answer_tokens: int = 0,          # largo de la respuesta en palabras (0 = solo las citas)
+    ):
+        self.dim = dim
+        self.embed_latency_ms = embed_latency_ms
+        self.embed_per_text_ms = embed_per_text_ms
+        self.chat_latency_ms = chat_latency_ms
+        self.tokens_per_s = tokens_per_s
+        self.answer_tokens = answer_tokens
+        self.calls = {"embed": 0, "embeddings": 0, "chat": 0, "texts": 0}
+
+    def vector(self, text: str) -> List[float]:
+        v = [0.0] * self.dim
+        for tok in _WORD.findall(text.casefold()):
+            h = hashlib.blake2b(tok.encode(), digest_size=8).digest()
+            idx = int.from_bytes(h[:4], "little") % self.dim
+            v[idx] += 1.0 if h[4] & 1 else -1.0
+        n = math.sqrt(sum(x * x for x in v))
+        if not n:  # texto sin palabras: vector fijo
+            v[0], n = 1.0, 1.0
+        return [x / n for x in v]
+
+    def _sleep(self, ms: float) -> None:
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    # -- API compatible con el paquete `ollama` --
+    def embed(self, model: str = "", input: str | Sequence[str] = "", **kw: Any) -> Dict[str, Any]:
+        texts = [input] if isinstance(input, str) else list(input)
+        self.calls["embed"] += 1
+        self.calls["texts"] += len(texts)
+        self._sleep(self.embed_latency_ms + self.embed_per_text_ms * len(texts))
+        return {"model": model, "embeddings": [self.vector(t) for t in texts]}
+
+    def embeddings(self, model: str = "", prompt: str = "", **kw: Any) -> Dict[str, Any]:
+        self.calls["embeddings"] += 1
+        self.calls["texts"] += 1
+        self._sleep(self.embed_latency_ms + self.embed_per_text_ms)
+        return {"embedding": self.vector(prompt)}
+
+    def answer(self, messages: List[Dict[str, str]]) -> str:
+        user = next((m for m in messages if m.get("role") == "user"), {"content": ""})
+        content = user.get("content", "")
+        tags = list(dict.fromkeys(re.findall(r"\[[^\]]+?#\d+\]", content)))
+        head = "Respuesta sintética basada en el contexto."
+        # Relleno determinista con palabras del propio prompt: mismo prompt → misma respuesta.
+        words = _WORD.findall(content) or ["contexto"]
+        seed = int.from_bytes(hashlib.blake2b(content.encode(), digest_size=4).digest(), "little")
+        n = max(0, self.answer_tokens - len(head.split()) - len(tags[:3]))
+        filler = " ".join(words[(seed + i * 7) % len(words)] for i in range(n))
+        return " ".join(p for p in (head, filler, " ".join(tags[:3])) if p)
+
+    def chat(self, model: str = "", messages: List[Dict[str, str]] | None = None, **kw: Any) -> Dict[str, Any]:
+        self.calls["chat"] += 1
+        content = self.answer(messages or [])
+        n_tokens = len(content.split())
+        self._sleep(self.chat_latency_ms + (1000 * n_tokens / self.tokens_per_s if self.tokens_per_s else 0))
+        prompt_tokens = sum(len((m.get("content") or "").split()) for m in messages or [])
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": n_tokens,
+        }
+
+def install(**kwargs: Any) -> Synthetic:
+    """Reemplaza ollama.embed/embeddings/chat por el sustituto y lo devuelve (con contadores)."""
+    import ollama
+
+    fake = Synthetic(**kwargs)
+    ollama.embed = fake.embed
+    ollama.embeddings = fake.embeddings
+    ollama.chat = fake.chat
+    return fake
@@ -1,10 +1,201 @@
-from fastapi import FastAPI
-import uvicorn
-
-app = FastAPI()
-@app.get("/api/tags")
-def tags():
-    return {"models": [{"name": "mock"}]}
-
-if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=11434, log_level="warning")
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "ci_mocks"))
+from synthetic import Synthetic  # noqa: E402
+
+# Ollama falso para pruebas de carga: /api/tags, /api/embed, /api/embeddings y /api/chat
+# (con streaming NDJSON). Salidas deterministas (tools/ci_mocks/synthetic.py) y tiempos
+# según un perfil: carga del modelo, evaluación del prompt y generación en tokens/s.
+# Como Ollama, atiende `parallel` generaciones a la vez; el resto espera en cola.
+#
+#   python tools/fake_ollama.py --profile phi3-cpu --parallel 2
+
+_CHARS_PER_TOKEN = 3.5
+
+@dataclass(frozen=True)
+class Profile:
+    load_ms: float = 0.0         # primera llamada por modelo
+    prompt_tps: float = 0.0      # tokens/s al evaluar el prompt (0 = instantáneo)
+    gen_tps: float = 0.0         # tokens/s generados (0 = instantáneo)
+    answer_tokens: int = 40
+    embed_ms: float = 0.0        # por llamada de embeddings
+    embed_per_text_ms: float = 0.0
+
+# Cifras aproximadas de phi3:mini (Q4) + nomic-embed-text en Ollama.
+PROFILES: Dict[str, Profile] = {
+    "instant": Profile(),
+    "phi3-cpu": Profile(load_ms=3000, prompt_tps=80, gen_tps=9, answer_tokens=150, embed_ms=25, embed_per_text_ms=12),
+    "phi3-gpu": Profile(load_ms=1500, prompt_tps=1800, gen_tps=70, answer_tokens=150, embed_ms=8, embed_per_text_ms=1.5),
+}
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+def _tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / _CHARS_PER_TOKEN))
+
+# /api/tags las anuncia: el chequeo de readiness del server busca ahí sus modelos.
+DEFAULT_MODELS = ["mock", "phi3:latest", "phi3:mini", "nomic-embed-text:latest"]
+
+def create_app(
+    profile: Profile = PROFILES["instant"],
+    parallel: int = 1,
+    dim: int = 768,
+    models: List[str] = DEFAULT_MODELS,
+) -> FastAPI:
+    app = FastAPI()
+    fake = Synthetic(dim=dim, answer_tokens=profile.answer_tokens)
+    slots = asyncio.Semaphore(max(1, parallel))
+    embed_slots = asyncio.Semaphore(max(1, parallel))
+    loaded: set = set()
+    stats = {"chat": 0, "embed": 0, "queued": 0, "active": 0}
+
+    async def _load(model: str) -> float:
+        if model in loaded or profile.load_ms <= 0:
+            return 0.0
+        loaded.add(model)
+        await asyncio.sleep(profile.load_ms / 1000)
+        return profile.load_ms / 1000
+
+    async def _embed(model: str, texts: List[str]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        stats["embed"] += 1
+        async with embed_slots:
+            load = await _load(model)
+            await asyncio.sleep((profile.embed_ms + profile.embed_per_text_ms * len(texts)) / 1000)
+            vecs = [fake.vector(t) for t in texts]
+        return {
+            "model": model,
+            "embeddings": vecs,
+            "total_duration": int((time.perf_counter() - t0) * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": sum(_tokens(t) for t in texts),
+        }
+
+    @app.get("/api/tags")
+    def tags():
+        return {"models": [{"name": m, "model": m} for m in models]}
+
+    @app.get("/api/version")
+    def version():
+        return {"version": "0.0.0-fake"}
+
+    @app.get("/fake/stats")
+    def fake_stats():
+        return {**stats, "profile": asdict(profile), "parallel": parallel}
+
+    @app.post("/api/embed")
+    async def embed(req: Request):
+        body = await req.json()
+        inp = body.get("input", "")
+        return await _embed(body.get("model", ""), [inp] if isinstance(inp, str) else list(inp))
+
+    @app.post("/api/embeddings")
+    async def embeddings(req: Request):
+        body = await req.json()
+        r = await _embed(body.get("model", ""), [body.get("prompt", "")])
+        return {"embedding": r["embeddings"][0]}
+
+    @app.post("/api/chat")
+    async def chat(req: Request):
+        body = await req.json()
+        model = body.get("model", "")
+        messages = body.get("messages") or []
+        stream = body.get("stream", True)  # igual que Ollama: streaming salvo que se pida lo contrario
+        answer = fake.answer(messages)
+        words = answer.split(" ")
+        prompt_tokens = sum(_tokens(m.get("content") or "") for m in messages)
+
+        async def generate() -> AsyncIterator[Dict[str, Any]]:
+            t0 = time.perf_counter()
+            stats["chat"] += 1
+            stats["queued"] += 1
+            async with slots:
+                stats["queued"] -= 1
+                stats["active"] += 1
+                try:
+                    load = await _load(model)
+                    t_prompt = prompt_tokens / profile.prompt_tps if profile.prompt_tps else 0.0
+                    await asyncio.sleep(t_prompt)
+                    t_gen0 = time.perf_counter()
+                    for i, w in enumerate(words):
+                        if profile.gen_tps:
+                            # Ritmo fijo medido desde el inicio: el sleep no acumula deriva.
+                            await asyncio.sleep(max(0.0, t_gen0 + (i + 1) / profile.gen_tps - time.perf_counter()))
+                        yield {"model": model, "created_at": _now(),
+                               "message": {"role": "assistant", "content": w if i == 0 else " " + w}, "done": False}
+                    gen_s = time.perf_counter() - t_gen0
+                finally:
+                    stats["active"] -= 1
+            yield {
+                "model": model, "created_at": _now(),
+                "message": {"role": "assistant", "content": ""},
+                "done": True, "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - t0) * 1e9),
+                "load_duration": int(load * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(t_prompt * 1e9),
+                "eval_count": len(words),
+                "eval_duration": int(gen_s * 1e9),
+            }
+
+        if stream:
+            async def ndjson() -> AsyncIterator[bytes]:
+                async for part in generate():
+                    yield (json.dumps(part, ensure_ascii=False) + "\n").encode()
+
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+        final: Dict[str, Any] = {}
+        async for part in generate():
+            final = part
+        final["message"] = {"role": "assistant", "content": answer}
+        return JSONResponse(final)
+
+    return app
+
+# Para `uvicorn tools.fake_ollama:app`: perfil y paralelismo por FAKE_OLLAMA_PROFILE / FAKE_OLLAMA_PARALLEL.
+app = create_app(
+    PROFILES[os.getenv("FAKE_OLLAMA_PROFILE", "instant")],
+    parallel=int(os.getenv("FAKE_OLLAMA_PARALLEL", "4")),
+    dim=int(os.getenv("FAKE_OLLAMA_DIM", "768")),
+    models=DEFAULT_MODELS + [m for m in (os.getenv("CHAT_MODEL"), os.getenv("EMBED_MODEL")) if m],
+)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Ollama falso con latencias configurables.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--profile", choices=sorted(PROFILES), default="instant")
+    ap.add_argument("--parallel", type=int, default=4, help="Generaciones simultáneas (OLLAMA_NUM_PARALLEL).")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--gen-tps", type=float, default=None, help="Sobrescribe los tokens/s del perfil.")
+    ap.add_argument("--answer-tokens", type=int, default=None)
+    ap.add_argument("--models", default="", help="Modelos extra para /api/tags, separados por coma.")
+    args = ap.parse_args()
+
+    profile = PROFILES[args.profile]
+    if args.gen_tps is not None:
+        profile = replace(profile, gen_tps=args.gen_tps)
+    if args.answer_tokens is not None:
+        profile = replace(profile, answer_tokens=args.answer_tokens)
+    print(f"Ollama falso en {args.host}:{args.port} perfil={args.profile} {asdict(profile)} parallel={args.parallel}")
+    models = DEFAULT_MODELS + [m for m in args.models.split(",") if m]
+    uvicorn.run(create_app(profile, args.parallel, args.dim, models), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+
+# Generador de carga para la API: mezcla /chat, /ingest_text y /sources a una concurrencia
+# fija (lazo cerrado) o a un ritmo de llegadas (--rps, lazo abierto: si el server se atrasa
+# las solicitudes se acumulan como en producción). Reporta throughput, percentiles y errores.
+#
+#   python tools/fake_ollama.py --profile phi3-cpu --parallel 2 &
+#   uvicorn server:app --port 8000 &
+#   python tools/loadgen.py --concurrency 8 --duration 30 --mix chat=8,ingest_text=1,sources=1
+
+QUESTIONS = [
+    "¿Qué es CSAT?",
+    "¿Qué mide el FCR?",
+    "¿Qué responsabilidades tiene el facilitador durante la sesión?",
+    "¿Cuándo se escala un ticket al supervisor?",
+    "¿Cómo se calcula el NPS?",
+    "¿Qué dice la política de privacidad de datos del cliente?",
+    "¿Cuál es el SLA de primera respuesta por correo?",
+    "¿Qué indicadores se revisan en el reporte semanal?",
+]
+
+Result = Tuple[str, float, str]  # (endpoint, segundos, estado: código HTTP o nombre de excepción)
+
+def _percentile(sorted_ms: List[float], p: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    i = min(len(sorted_ms) - 1, max(0, round(p / 100 * (len(sorted_ms) - 1))))
+    return round(sorted_ms[i], 1)
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        name, _, w = part.partition("=")
+        if name not in ("chat", "ingest_text", "sources"):
+            raise SystemExit(f"Endpoint desconocido en --mix: {name}")
+        mix.append((name, float(w or 1)))
+    return mix
+
+class Workload:
+    def __init__(self, mix: List[Tuple[str, float]], unique: bool, top_k: int, seed: int = 0):
+        self.names = [n for n, _ in mix]
+        self.weights = [w for _, w in mix]
+        self.unique = unique
+        self.top_k = top_k
+        self.rng = random.Random(seed)
+        self.n = 0
+
+    def next(self) -> Tuple[str, Callable[[httpx.AsyncClient], Any]]:
+        self.n += 1
+        n = self.n
+        name = self.rng.choices(self.names, self.weights)[0]
+        if name == "chat":
+            q = self.rng.choice(QUESTIONS)
+            if self.unique:  # evita el cache de respuestas: cada pregunta recorre todo el pipeline
+                q = f"{q} (caso {n})"
+            body = {"user_id": f"load{n % 50}", "message": q, "top_k": self.top_k}
+            return name, lambda c: c.post("/chat", json=body)
+        if name == "ingest_text":
+            text = " ".join(self.rng.choice(QUESTIONS).strip("¿?") + "." for _ in range(40))
+            body = {"source_name": f"loadgen_{n % 20}.txt", "text": text}
+            return name, lambda c: c.post("/ingest_text", json=body)
+        return name, lambda c: c.get("/sources")
+
+async def _call(client: httpx.AsyncClient, name: str, fn: Callable, results: List[Result]) -> None:
+    t0 = time.perf_counter()
+    try:
+        r = await fn(client)
+        status = str(r.status_code)
+    except Exception as e:
+        status = type(e).__name__
+    results.append((name, time.perf_counter() - t0, status))
+
+async def run(base_url: str, workload: Workload, duration: float, concurrency: int, rps: float, timeout: float) -> Tuple[List[Result], float]:
+    results: List[Result] = []
+    limits = httpx.Limits(max_connections=max(concurrency, 64), max_keepalive_connections=max(concurrency, 64))
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        t0 = time.perf_counter()
+        deadline = t0 + duration
+        if rps > 0:
+            pending = set()
+            i = 0
+            while (now := time.perf_counter()) < deadline:
+                target = t0 + i / rps
+                if target > now:
+                    await asyncio.sleep(target - now)
+                name, fn = workload.next()
+                task = asyncio.create_task(_call(client, name, fn, results))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                i += 1
+            if pending:
+                await asyncio.wait(pending)
+        else:
+            async def worker() -> None:
+                while time.perf_counter() < deadline:
+                    name, fn = workload.next()
+                    await _call(client, name, fn, results)
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return results, time.perf_counter() - t0
+
+def summarize(results: List[Result], elapsed: float) -> Dict[str, Any]:
+    by_ep: Dict[str, List[Result]] = defaultdict(list)
+    for r in results:
+        by_ep[r[0]].append(r)
+    report: Dict[str, Any] = {"elapsed_s": round(elapsed, 2), "endpoints": {}}
+    for name, rs in sorted(by_ep.items()) + [("total", results)]:
+        ok = sorted(dt * 1000 for _, dt, st in rs if st.isdigit() and int(st) < 400)
+        codes = Counter(st for _, _, st in rs)
+        report["endpoints"][name] = {
+            "requests": len(rs),
+            "rps": round(len(rs) / elapsed, 2) if elapsed else 0.0,
+            "errors": len(rs) - len(ok),
+            "error_rate": round((len(rs) - len(ok)) / len(rs), 4) if rs else 0.0,
+            "status": dict(codes),
+            "p50_ms": _percentile(ok, 50),
+            "p90_ms": _percentile(ok, 90),
+            "p99_ms": _percentile(ok, 99),
+            "max_ms": round(ok[-1], 1) if ok else 0.0,
+        }
+    return report
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Carga sobre /chat, /ingest_text y /sources.")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--duration", type=float, default=30.0, help="Segundos generando solicitudes.")
+    ap.add_argument("--concurrency", type=int, default=4, help="Clientes simultáneos (lazo cerrado).")
+    ap.add_argument("--rps", type=float, default=0.0, help="Llegadas por segundo (lazo abierto); ignora --concurrency.")
+    ap.add_argument("--mix", default="chat=8,ingest_text=1,sources=1", help="Pesos por endpoint.")
+    ap.add_argument("--unique", action="store_true", help="Preguntas únicas (sin aciertos del cache de respuestas).")
+    ap.add_argument("--top-k", type=int, default=8)
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", default=None, help="Guarda el reporte en este archivo.")
+    args = ap.parse_args()
+
+    workload = Workload(parse_mix(args.mix), args.unique, args.top_k, args.seed)
+    mode = f"rps={args.rps}" if args.rps > 0 else f"concurrency={args.concurrency}"
+    print(f"Carga sobre {args.url} durante {args.duration}s ({mode}, mix={args.mix})")
+    results, elapsed = asyncio.run(run(args.url, workload, args.duration, args.concurrency, args.rps, args.timeout))
+    report = summarize(results, elapsed)
+    report["args"] = vars(args)
+
+    print(f"{'endpoint':<12} {'req':>6} {'rps':>7} {'err%':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}  estados")
+    for name, s in report["endpoints"].items():
+        print(f"{name:<12} {s['requests']:>6} {s['rps']:>7} {s['error_rate'] * 100:>5.1f}% "
+              f"{s['p50_ms']:>8} {s['p90_ms']:>8} {s['p99_ms']:>8} {s['max_ms']:>8}  {s['status']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,8 @@ def chat_call(user_id: str, message: str, k: int, th: float, temp: float):
             "distance_threshold": th,
             "temperature": temp,
         }, timeout=60)
+        if r.status_code == 429:
+            return f"El servidor está ocupado; intenta de nuevo en {r.headers.get('Retry-After', 'unos')} s."
         if r.status_code != 200:
             return f"Error {r.status_code}: {r.text}"
         data = r.json()